@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+condition_variable_filter.py
+
+Compares the time taken to filter an experiment condition variable table
+using the per row eval() approach previously used by
+ExperimentDataAccessUtility.getConditionVariables(), with the vectorized
+filterConditionVariableTable() function it now uses.
+
+Run from the command line: python condition_variable_filter.py [row_count]
+"""
+import os
+import sys
+import tempfile
+import timeit
+
+import numpy as N
+from tables import openFile
+
+from iohub.datastore.util import filterConditionVariableTable, ConditionVariableRows
+
+CV_DTYPE=N.dtype([('session_id','u4'),('index_id','u4'),('block','u2'),
+                  ('trial','u4'),('condition','S16'),('soa','f8'),('rt','f8')])
+
+FILTERS=(('session equality',dict(session_id=('==',3))),
+         ('session in + block range',dict(session_id=(' in ',[1,2,3]),block=('range',(2,5)))),
+         ('condition + soa',dict(condition=('==','congruent'),soa=('>=',0.25))))
+
+def createConditionVariableTable(hubFile,row_count,session_count=10):
+    cv_rows=N.zeros(row_count,dtype=CV_DTYPE)
+    cv_rows['session_id']=N.arange(row_count)%session_count+1
+    cv_rows['index_id']=N.arange(row_count)
+    cv_rows['block']=N.arange(row_count)//100%10
+    cv_rows['trial']=N.arange(row_count)
+    cv_rows['condition']=N.where(N.arange(row_count)%2,'congruent','incongruent')
+    cv_rows['soa']=(N.arange(row_count)%4)*0.125
+    cv_rows['rt']=N.random.uniform(0.2,1.2,row_count)
+    table=hubFile.createTable(hubFile.root,'EXP_CV_1',CV_DTYPE,expectedrows=row_count)
+    table.append(cv_rows)
+    table.flush()
+    return table
+
+def evalPerRowFilter(cvTable,filter):
+    """
+    The condition variable filtering previously done by getConditionVariables().
+    """
+    def cvValue(v):
+        if isinstance(v,basestring):
+            return repr(v)
+        return v
+    return [r[:] for r in cvTable if all([eval("{0} {1} {2}".format(cvValue(r[n]),c[0],cvValue(c[1]))) 
+                for n,c in filter.iteritems()])]
+
+def evalPerRowRangeFilter(cvTable,filter):
+    # eval() has no range operator, so express it as two comparisons.
+    eval_filter=dict()
+    range_filters=[]
+    for n,(op,value) in filter.iteritems():
+        if op == 'range':
+            range_filters.append((n,value))
+        else:
+            eval_filter[n]=(op,value)
+    rows=evalPerRowFilter(cvTable,eval_filter)
+    for n,(vmin,vmax) in range_filters:
+        i=cvTable.colnames.index(n)
+        rows=[r for r in rows if vmin <= r[i] <= vmax]
+    return rows
+
+if __name__ == '__main__':
+    row_count=50000
+    if len(sys.argv) > 1:
+        row_count=int(sys.argv[1])
+
+    file_path=os.path.join(tempfile.gettempdir(),'iohub_cv_filter_benchmark.hdf5')
+    hubFile=openFile(file_path,'w')
+    try:
+        cvTable=createConditionVariableTable(hubFile,row_count)
+        print "Filtering a %d row condition variable table:"%(row_count)
+        for label,filter in FILTERS:
+            vectorized_rows=filterConditionVariableTable(cvTable,filter)
+            eval_rows=evalPerRowRangeFilter(cvTable,filter)
+            assert len(vectorized_rows) == len(eval_rows)
+
+            eval_time=min(timeit.repeat(lambda: evalPerRowRangeFilter(cvTable,filter),number=1,repeat=3))
+            vectorized_time=min(timeit.repeat(lambda: filterConditionVariableTable(cvTable,filter),number=1,repeat=3))
+            namedtuple_time=min(timeit.repeat(lambda: list(ConditionVariableRows(filterConditionVariableTable(cvTable,filter))),number=1,repeat=3))
+            print "\t%-26s rows: %6d\teval: %8.2f msec\tvectorized: %6.2f msec (%.0fx)\twith namedtuples: %6.2f msec"%(label,
+                    len(vectorized_rows),eval_time*1000.0,vectorized_time*1000.0,eval_time/vectorized_time,namedtuple_time*1000.0)
+    finally:
+        hubFile.close()
+        os.remove(file_path)
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+datastore_replay.py
+
+Replays the events saved in an existing ioHub DataStore file through an
+ioHub Server, using the Replay device, and reports the replay rate the
+ioHub Server achieved along with the maximum depth of its event queues:
+the Replay device's native event buffer, the global event buffer, and the
+events staged but not yet written to the DataStore of the replay session.
+
+Events are received by this script every 10 msec with getEvents(), as an
+experiment script would; use a speed of 0.0 to find the max. event rate the
+ioHub Server can handle for the saved event mix.
+
+The DataStore of the replay session is saved as events.hdf5 in this
+directory, so do not replay a file with that path.
+
+Run from the command line: python datastore_replay.py hdf5_file_path [speed]
+"""
+import os
+import sys
+import time
+
+from iohub.client import launchHubServer
+
+STATUS_INTERVAL=1.0
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print __doc__
+        sys.exit(1)
+
+    replay_file=os.path.abspath(sys.argv[1])
+    if replay_file == os.path.abspath(os.path.join(os.path.dirname(__file__),'events.hdf5')):
+        print "The replay session is saved to %s; replay a copy of the file instead."%(replay_file)
+        sys.exit(1)
+
+    speed=0.0
+    if len(sys.argv) > 2:
+        speed=float(sys.argv[2])
+
+    io=launchHubServer(experiment_code='replay_benchmark',session_code='S_%d'%(long(time.time())),
+                       Replay=dict(replay=dict(file=replay_file,speed=speed)))
+    replay=io.devices.replay
+
+    print "Replaying %d events from %s at speed %.1f:"%(replay.getEventCount(),replay_file,speed)
+
+    io.clearEvents('all')
+    replay.enableEventReporting(True)
+
+    received_count=0
+    max_global_depth=0
+    max_rows_pending=0
+    next_status_time=time.time()+STATUS_INTERVAL
+    status=replay.getReplayStatus()
+    while status['state'] != 'DONE' or status['native_buffer_depth'] or status['global_buffer_depth']:
+        io.wait(0.01)
+        received_count+=len(io.getEvents())
+        status=replay.getReplayStatus()
+        max_global_depth=max(max_global_depth,status['global_buffer_depth'])
+        max_rows_pending=max(max_rows_pending,status['datastore_rows_pending'])
+        if time.time() >= next_status_time:
+            print "\t%8d / %d events replayed\t%8.0f events / sec\tlag %6.3f sec"%(status['events_replayed'],
+                    status['event_count'],status['events_per_second'],status['replay_lag'])
+            next_status_time+=STATUS_INTERVAL
+
+    received_count+=len(io.getEvents())
+    datastore_stats=io.getDataStoreStats()
+    io.quit()
+
+    print "\tReplayed %d events in %.3f sec: %.0f events / sec."%(status['events_replayed'],
+            status['elapsed_time'],status['events_per_second'])
+    print "\tEvents received by this script: %d"%(received_count)
+    print "\tMax. Replay native event buffer depth: %d"%(status['max_native_buffer_depth'])
+    print "\tMax. global event buffer depth: %d"%(max_global_depth)
+    print "\tMax. DataStore rows pending: %d"%(max_rows_pending)
+    if datastore_stats:
+        print "\tDataStore writes: %d, max. write duration %.1f msec"%(datastore_stats['write_count'],
+                datastore_stats['max_write_duration']*1000.0)
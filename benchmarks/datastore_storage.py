@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+datastore_storage.py
+
+Compares ioDataStore event table storage settings (see the table_storage
+datastore setting) for a session of binocular eye samples:
+
+    * The rate samples are appended to the table, in blocks of the default
+      event staging buffer_length, including closing the file.
+    * The file size per sample.
+    * The rate a full column (time, left_gaze_x), and the full table, are
+      read back from the closed file.
+
+The 'previous' settings are those every event table was created with before
+the table_storage setting was added: no compression, and the PyTables
+default expectedrows. The table storage is created with the same
+createTableStorage() function used by the ioDataStore. Settings using a
+complib the installed PyTables does not support are skipped.
+
+The samples are simulated fixations and saccades, with noise, so they
+compress about as well as recorded eye samples.
+
+Run from the command line: python datastore_storage.py [sample_count] [sampling_rate]
+"""
+import os
+import sys
+import tempfile
+import timeit
+
+import numpy as N
+from tables import openFile
+
+from iohub.constants import EventConstants
+from iohub.devices.eyetracker.eye_events import BinocularEyeSampleEvent
+from iohub.datastore import (DEFAULT_TABLE_STORAGE, SAMPLING_RATE_EXPECTED_ROWS, createTableStorage,
+                             getEventTableDtype, getSupportedCompressionLibraries)
+
+ROWS_PER_APPEND=512
+READ_COLUMNS=('time','left_gaze_x')
+TABLE_LABEL='BINOCULAR_EYE_SAMPLE'
+
+STORAGE_SETTINGS=(('previous',dict()),
+                  ('expectedrows',dict(expectedrows=SAMPLING_RATE_EXPECTED_ROWS)),
+                  ('zlib 1 shuffle',dict(expectedrows=SAMPLING_RATE_EXPECTED_ROWS,complib='zlib',complevel=1,shuffle=True)),
+                  ('zlib 5 shuffle',dict(expectedrows=SAMPLING_RATE_EXPECTED_ROWS,complib='zlib',complevel=5,shuffle=True)),
+                  ('lzo 1 shuffle',dict(expectedrows=SAMPLING_RATE_EXPECTED_ROWS,complib='lzo',complevel=1,shuffle=True)),
+                  ('blosc 5 shuffle',dict(expectedrows=SAMPLING_RATE_EXPECTED_ROWS,complib='blosc',complevel=5,shuffle=True)),
+                  ('blosc:lz4 5 shuffle',dict(expectedrows=SAMPLING_RATE_EXPECTED_ROWS,complib='blosc:lz4',complevel=5,shuffle=True)),
+                  ('blosc:lz4hc 5 shuffle',dict(expectedrows=SAMPLING_RATE_EXPECTED_ROWS,complib='blosc:lz4hc',complevel=5,shuffle=True)))
+
+def createSamples(sample_count,sampling_rate):
+    """
+    Returns sample_count binocular eye samples, with gaze positions that
+    jump to a new fixation position every 150 - 500 msec.
+    """
+    rs=N.random.RandomState(1)
+    samples=N.zeros(sample_count,dtype=getEventTableDtype(BinocularEyeSampleEvent))
+    sample_times=N.arange(sample_count,dtype=N.float64)/sampling_rate
+    samples['experiment_id']=1
+    samples['session_id']=1
+    samples['event_id']=N.arange(1,sample_count+1)
+    samples['type']=EventConstants.BINOCULAR_EYE_SAMPLE
+    samples['device_time']=sample_times+12345.0
+    samples['logged_time']=sample_times+0.002
+    samples['time']=sample_times
+    samples['confidence_interval']=0.0005
+    samples['delay']=0.002
+
+    fixation_lengths=rs.randint(int(0.15*sampling_rate),int(0.5*sampling_rate)+1,size=sample_count//int(0.15*sampling_rate)+1)
+    fixation_index=N.repeat(N.arange(len(fixation_lengths)),fixation_lengths)[:sample_count]
+    fixation_x=rs.uniform(-500.0,500.0,len(fixation_lengths))[fixation_index]
+    fixation_y=rs.uniform(-400.0,400.0,len(fixation_lengths))[fixation_index]
+    pupil=rs.uniform(800.0,1200.0,len(fixation_lengths))[fixation_index]
+    for eye,offset in (('left',-1.5),('right',1.5)):
+        samples[eye+'_gaze_x']=fixation_x+offset+rs.normal(0.0,0.5,sample_count)
+        samples[eye+'_gaze_y']=fixation_y+rs.normal(0.0,0.5,sample_count)
+        samples[eye+'_pupil_measure1']=pupil+rs.normal(0.0,2.0,sample_count)
+        samples[eye+'_pupil_measure1_type']=1
+    return samples
+
+def timeStorage(samples,storage,file_path,repeat=3):
+    def writeSamples():
+        hub_file=openFile(file_path,'w')
+        table=hub_file.createTable(hub_file.root,'BinocularEyeSampleEvent',samples.dtype,
+                                   filters=storage['filters'],expectedrows=storage['expectedrows'],
+                                   chunkshape=storage['chunkshape'])
+        for start in xrange(0,len(samples),ROWS_PER_APPEND):
+            table.append(samples[start:start+ROWS_PER_APPEND])
+        hub_file.close()
+
+    def readColumns():
+        hub_file=openFile(file_path,'r')
+        table=hub_file.root.BinocularEyeSampleEvent
+        for name in READ_COLUMNS:
+            table.col(name)
+        hub_file.close()
+
+    def readTable():
+        hub_file=openFile(file_path,'r')
+        hub_file.root.BinocularEyeSampleEvent.read()
+        hub_file.close()
+
+    write_duration=min(timeit.repeat(writeSamples,number=1,repeat=repeat))
+    file_size=os.path.getsize(file_path)
+    hub_file=openFile(file_path,'r')
+    chunk_rows=hub_file.root.BinocularEyeSampleEvent.chunkshape[0]
+    hub_file.close()
+    column_duration=min(timeit.repeat(readColumns,number=1,repeat=repeat))/len(READ_COLUMNS)
+    table_duration=min(timeit.repeat(readTable,number=1,repeat=repeat))
+    os.remove(file_path)
+    return dict(write_duration=write_duration,file_size=file_size,chunk_rows=chunk_rows,
+                column_duration=column_duration,table_duration=table_duration)
+
+if __name__ == '__main__':
+    sample_count=1000000
+    sampling_rate=1000.0
+    if len(sys.argv) > 1:
+        sample_count=int(sys.argv[1])
+    if len(sys.argv) > 2:
+        sampling_rate=float(sys.argv[2])
+
+    samples=createSamples(sample_count,sampling_rate)
+    file_path=os.path.join(tempfile.gettempdir(),'iohub_storage_benchmark.hdf5')
+    supported_complibs=getSupportedCompressionLibraries()
+    # the session is as long as the samples.
+    session_length=sample_count/sampling_rate
+
+    print "Binocular eye sample table storage, %d samples at %.0f Hz (%d bytes / sample uncompressed):"%(sample_count,
+            sampling_rate,samples.dtype.itemsize)
+    for label,settings in STORAGE_SETTINGS:
+        table_settings=dict(DEFAULT_TABLE_STORAGE,session_length=session_length)
+        table_settings.update(settings)
+        if table_settings['complib'] not in supported_complibs:
+            print "\t%-22s skipped: complib %s is not supported by the installed PyTables"%(label,table_settings['complib'])
+            continue
+        storage=createTableStorage(table_settings,sampling_rate,TABLE_LABEL)
+        r=timeStorage(samples,storage,file_path)
+        print "\t%-22s %7d rows / chunk\twrite %9.0f samples / sec\t%6.1f bytes / sample\tread column %9.0f samples / sec\tread table %9.0f samples / sec"%(label,
+                r['chunk_rows'],sample_count/r['write_duration'],r['file_size']/float(sample_count),
+                sample_count/r['column_duration'],sample_count/r['table_duration'])
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+display_coord_transforms.py
+
+Compares the time taken to convert pixel positions to Display deg coordinates
+using the per position psychopy.misc calls previously made by the Display
+device's pix2degcoord mapping function, with the precomputed coordinate
+transform it now uses, both one position at a time (as the mouse and eye
+tracker event callbacks do) and for whole arrays of positions at once.
+
+Run from the command line: python display_coord_transforms.py [point_count]
+"""
+import sys
+import timeit
+
+import numpy as N
+from psychopy import misc, monitors
+
+from iohub.devices.display.unit_conversions import pixelToCoord, coordToPixel
+
+PIXEL_WIDTH=1920
+PIXEL_HEIGHT=1080
+
+def createMonitor():
+    monitor=monitors.Monitor('iohub_coord_benchmark',width=53.0,distance=60.0)
+    monitor.setSizePix((PIXEL_WIDTH,PIXEL_HEIGHT))
+    return monitor
+
+def miscPix2Deg(monitor,px,py):
+    """
+    The conversion previously done by Display.pix2degcoord, for a Display
+    with bounds (0,0,PIXEL_WIDTH,PIXEL_HEIGHT).
+    """
+    ppx,ppy=px-PIXEL_WIDTH/2,-py+PIXEL_HEIGHT/2
+    return misc.pix2deg(ppx,monitor),misc.pix2deg(ppy,monitor)
+
+if __name__ == '__main__':
+    point_count=1000000
+    if len(sys.argv) > 1:
+        point_count=int(sys.argv[1])
+
+    monitor=createMonitor()
+    deg_per_pixel=misc.pix2deg(1.0,monitor)
+    transform=(PIXEL_WIDTH/2.0,PIXEL_HEIGHT/2.0,deg_per_pixel,deg_per_pixel)
+
+    px=N.random.uniform(0,PIXEL_WIDTH,point_count)
+    py=N.random.uniform(0,PIXEL_HEIGHT,point_count)
+    px_list=px.tolist()
+    py_list=py.tolist()
+
+    misc_deg=N.asarray([miscPix2Deg(monitor,x,y) for x,y in zip(px_list[:1000],py_list[:1000])])
+    array_x,array_y=pixelToCoord(transform,px,py)
+    assert N.allclose(misc_deg[:,0],array_x[:1000]) and N.allclose(misc_deg[:,1],array_y[:1000])
+    rpx,rpy=coordToPixel(transform,array_x,array_y)
+    assert N.allclose(rpx,px) and N.allclose(rpy,py)
+
+    misc_time=min(timeit.repeat(lambda: [miscPix2Deg(monitor,x,y) for x,y in zip(px_list,py_list)],number=1,repeat=3))
+    scalar_time=min(timeit.repeat(lambda: [pixelToCoord(transform,x,y) for x,y in zip(px_list,py_list)],number=1,repeat=3))
+    array_time=min(timeit.repeat(lambda: pixelToCoord(transform,px,py),number=1,repeat=3))
+
+    print "Converting %d pixel positions to deg coordinates:"%(point_count)
+    print "\tper position psychopy.misc:\t%8.1f msec"%(misc_time*1000.0)
+    print "\tper position transform:\t\t%8.1f msec (%.0fx)"%(scalar_time*1000.0,misc_time/scalar_time)
+    print "\tarray transform:\t\t%8.1f msec (%.0fx)"%(array_time*1000.0,misc_time/array_time)
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+event_dispatch.py
+
+Compares the number of events / second that can be routed from a device's
+native event buffer to its event listeners using the per event dispatch
+previously done by ioServer._processDeviceEventIteration(), with the batched
+dispatch it now uses, where the native buffer is drained once per iteration,
+events are grouped by type, and each listener is handed a list of events.
+
+Input is simulated as a single device generating 2000 events / second, split
+between two event types, with the server's event processing loop running
+every 1, 5 or 20 msec (i.e. each iteration handles 2, 10 or 40 events).
+The listeners are stand-ins that do the same work as the ioServer global
+event buffer, the Device event buffer, and the DataStore staging buffers.
+
+Before timing, the Device event buffer (DeviceEventStore) is checked to
+return each event once to a cursor reader, when events of two types have
+event_ids in a different order than their times.
+
+Run from the command line: python event_dispatch.py [simulated_seconds]
+"""
+import sys
+import timeit
+from collections import deque
+from operator import itemgetter
+
+from iohub.devices import DeviceEvent, DeviceEventStore
+
+INPUT_RATE=2000
+ITERATION_INTERVALS=(0.001,0.005,0.020)
+EVENT_TYPES=(1,2)
+EVENT_LENGTH=24
+BATCH_DISPATCH_MIN_EVENTS=4
+
+class GlobalBufferListener(object):
+    # ioServer event handling prior to batched dispatch.
+    def __init__(self):
+        self.eventBuffer=deque(maxlen=2048)
+        self._pendingEvents=[]
+
+    def _handleEvent(self,event):
+        self.eventBuffer.append(event)
+
+class PendingGlobalBufferListener(GlobalBufferListener):
+    def _handleEvent(self,event):
+        self._pendingEvents.append(event)
+
+    def _handleEvents(self,events):
+        self._pendingEvents.extend(events)
+
+    def routePendingEvents(self):
+        events=self._pendingEvents
+        self._pendingEvents=[]
+        if len(events)>1:
+            events.sort(key=itemgetter(DeviceEvent.EVENT_ID_INDEX))
+        self.eventBuffer.extend(events)
+
+class DeviceBufferListener(object):
+    def __init__(self):
+        self._iohub_event_buffer=dict()
+
+    def _handleEvent(self,e):
+        etypelist=self._iohub_event_buffer.get(e[DeviceEvent.EVENT_TYPE_ID_INDEX],None)
+        if etypelist is None:
+            self._iohub_event_buffer[e[DeviceEvent.EVENT_TYPE_ID_INDEX]]=[e,]
+        else:
+            etypelist.append(e)
+
+    def _handleEvents(self,events):
+        etype=events[0][DeviceEvent.EVENT_TYPE_ID_INDEX]
+        etypelist=self._iohub_event_buffer.get(etype,None)
+        if etypelist is None:
+            self._iohub_event_buffer[etype]=list(events)
+        else:
+            etypelist.extend(events)
+
+class DataStoreListener(object):
+    def __init__(self):
+        self._staging=dict()
+
+    def _handleEvent(self,event):
+        event[DeviceEvent.EVENT_EXPERIMENT_ID_INDEX]=1
+        event[DeviceEvent.EVENT_SESSION_ID_INDEX]=1
+        self._staging.setdefault(event[DeviceEvent.EVENT_TYPE_ID_INDEX],[]).append(event)
+
+    def _handleEvents(self,events):
+        sbuffer=self._staging.setdefault(events[0][DeviceEvent.EVENT_TYPE_ID_INDEX],[])
+        for event in events:
+            event[DeviceEvent.EVENT_EXPERIMENT_ID_INDEX]=1
+            event[DeviceEvent.EVENT_SESSION_ID_INDEX]=1
+            sbuffer.append(event)
+
+class SimulatedDevice(object):
+    def __init__(self,listeners):
+        self._native_event_buffer=deque()
+        self._event_listeners=dict([(etype,listeners) for etype in EVENT_TYPES])
+
+    def _getNativeEventBuffer(self):
+        return self._native_event_buffer
+
+    def _getIOHubEventObject(self,native_event):
+        return list(native_event)
+
+    def _getEventListeners(self,forEventType):
+        return self._event_listeners.get(forEventType,[])
+
+def perEventIteration(devices):
+    for device in devices:
+        events=device._getNativeEventBuffer()
+        while len(events)>0:
+            evt=events.popleft()
+            e=device._getIOHubEventObject(evt)
+            if e is not None:
+                for l in device._getEventListeners(e[DeviceEvent.EVENT_TYPE_ID_INDEX]):
+                    l._handleEvent(e)
+
+def batchedIteration(devices):
+    for device in devices:
+        events=device._getNativeEventBuffer()
+        if not events:
+            continue
+        if len(events)<BATCH_DISPATCH_MIN_EVENTS:
+            # grouping a handful of events costs more than it saves.
+            while len(events)>0:
+                e=device._getIOHubEventObject(events.popleft())
+                if e is not None:
+                    for l in device._getEventListeners(e[DeviceEvent.EVENT_TYPE_ID_INDEX]):
+                        l._handleEvent(e)
+            continue
+
+        events_by_type=dict()
+        etype_order=[]
+        getIOHubEventObject=device._getIOHubEventObject
+        popleft=events.popleft
+        for i in xrange(len(events)):
+            e=getIOHubEventObject(popleft())
+            if e is not None:
+                etype_events=events_by_type.get(e[DeviceEvent.EVENT_TYPE_ID_INDEX])
+                if etype_events is None:
+                    events_by_type[e[DeviceEvent.EVENT_TYPE_ID_INDEX]]=[e,]
+                    etype_order.append(e[DeviceEvent.EVENT_TYPE_ID_INDEX])
+                else:
+                    etype_events.append(e)
+        for etype in etype_order:
+            etype_events=events_by_type[etype]
+            for l in device._getEventListeners(etype):
+                handleEvents=getattr(l,'_handleEvents',None)
+                if handleEvents:
+                    handleEvents(etype_events)
+                else:
+                    for e in etype_events:
+                        l._handleEvent(e)
+
+def createNativeEvents(event_count):
+    native_events=[]
+    for i in xrange(event_count):
+        e=[0]*EVENT_LENGTH
+        e[DeviceEvent.EVENT_ID_INDEX]=i+1
+        e[DeviceEvent.EVENT_TYPE_ID_INDEX]=EVENT_TYPES[i%len(EVENT_TYPES)]
+        e[DeviceEvent.EVENT_TIME_INDEX]=i/float(INPUT_RATE)
+        native_events.append(e)
+    return native_events
+
+def checkEventCursor():
+    # type 2 events are created after the type 1 events with later times,
+    # like eye tracker FixationEndEvents and samples.
+    store=DeviceEventStore(capacity=64)
+    cursor=None
+    read_ids=[]
+    for event_id,etype,time in ((1,1,0.001),(2,1,0.003),(3,2,0.002),(4,1,0.005),(5,2,0.004),(6,1,0.006)):
+        e=[0]*EVENT_LENGTH
+        e[DeviceEvent.EVENT_ID_INDEX]=event_id
+        e[DeviceEvent.EVENT_TYPE_ID_INDEX]=etype
+        e[DeviceEvent.EVENT_TIME_INDEX]=time
+        store.append(e)
+        if event_id in (1,2,4):
+            continue
+        events=store.getEvents(cursor=cursor)
+        read_ids.extend(e[DeviceEvent.EVENT_ID_INDEX] for e in events)
+        cursor=DeviceEventStore.getEventCursor(events,cursor)
+    assert sorted(read_ids) == range(1,7), read_ids
+
+def runDispatch(iteration_func,server_class,native_events,events_per_iteration):
+    server=server_class()
+    device=SimulatedDevice([server,DeviceBufferListener(),DataStoreListener()])
+    devices=[device,]
+    native_buffer=device._getNativeEventBuffer()
+    for i in xrange(0,len(native_events),events_per_iteration):
+        native_buffer.extend(native_events[i:i+events_per_iteration])
+        iteration_func(devices)
+        if server._pendingEvents:
+            server.routePendingEvents()
+
+if __name__ == '__main__':
+    simulated_seconds=10
+    if len(sys.argv) > 1:
+        simulated_seconds=int(sys.argv[1])
+
+    checkEventCursor()
+    native_events=createNativeEvents(INPUT_RATE*simulated_seconds)
+    print "Dispatching %d events (%d sec of %d Hz input) to 3 listeners:"%(len(native_events),simulated_seconds,INPUT_RATE)
+    for interval in ITERATION_INTERVALS:
+        events_per_iteration=int(round(INPUT_RATE*interval))
+        per_event_time=min(timeit.repeat(lambda: runDispatch(perEventIteration,GlobalBufferListener,native_events,events_per_iteration),number=1,repeat=5))
+        batched_time=min(timeit.repeat(lambda: runDispatch(batchedIteration,PendingGlobalBufferListener,native_events,events_per_iteration),number=1,repeat=5))
+        print "\titeration interval: %4.1f msec (%2d events)\tper event: %9.0f events/sec\tbatched: %9.0f events/sec (%.2fx)"%(interval*1000.0,
+                events_per_iteration,len(native_events)/per_event_time,len(native_events)/batched_time,per_event_time/batched_time)
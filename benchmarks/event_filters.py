@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+event_filters.py
+
+Measures the ioHub Server CPU time used by each event filter type, and by a
+HEURISTIC + VELOCITY filter chain, to filter binocular eye samples.
+
+Input is a simulated 1000 Hz binocular recording, handed to the filters in
+batches of 10 samples (i.e. a 10 msec server event processing iteration).
+
+Run from the command line: python event_filters.py [sample_count]
+"""
+import sys
+import timeit
+
+import numpy as N
+
+from iohub.constants import EventConstants
+from iohub.devices import DeviceEvent
+from iohub.devices.eyetracker.eye_events import BinocularEyeSampleEvent
+from iohub.devices.filters import EVENT_FILTER_TYPES, EventFilterChain
+
+SAMPLING_RATE=1000.0
+SAMPLES_PER_ITERATION=10
+SAMPLE_FIELDS=BinocularEyeSampleEvent.CLASS_ATTRIBUTE_NAMES
+EVENT_TYPES=['BinocularEyeSampleEvent']
+
+FILTER_SETTINGS=[('MOVING_AVERAGE',dict(window_length=5)),
+                 ('MEDIAN',dict(window_length=5,delay=2)),
+                 ('SAVITZKY_GOLAY',dict(window_length=7,polynomial_order=2)),
+                 ('VELOCITY',dict(window_length=7,delay=3)),
+                 ('HEURISTIC',dict(level=2)),
+                 ('DECIMATE',dict(factor=4))]
+
+def createSamples(sample_count):
+    x=N.cumsum(N.random.normal(0.0,1.0,sample_count))
+    y=N.cumsum(N.random.normal(0.0,1.0,sample_count))
+    samples=[]
+    for i in xrange(sample_count):
+        e=[0]*len(SAMPLE_FIELDS)
+        e[DeviceEvent.EVENT_TYPE_ID_INDEX]=EventConstants.BINOCULAR_EYE_SAMPLE
+        e[DeviceEvent.EVENT_HUB_TIME_INDEX]=i/SAMPLING_RATE
+        for eye in ('left_','right_'):
+            e[SAMPLE_FIELDS.index(eye+'gaze_x')]=x[i]
+            e[SAMPLE_FIELDS.index(eye+'gaze_y')]=y[i]
+        samples.append(e)
+    return samples
+
+def runChain(filters,samples):
+    chain=EventFilterChain(filters)
+    output=[]
+    for i in xrange(0,len(samples),SAMPLES_PER_ITERATION):
+        output.extend(chain.filterEvents([list(e) for e in samples[i:i+SAMPLES_PER_ITERATION]],0.0))
+    return output
+
+if __name__ == '__main__':
+    sample_count=100000
+    if len(sys.argv) > 1:
+        sample_count=int(sys.argv[1])
+
+    samples=createSamples(sample_count)
+    copy_time=min(timeit.repeat(lambda: runChain([],samples),number=1,repeat=3))
+
+    print "Filtering %d binocular samples, %d samples per batch (excluding %.2f usec / sample to copy the samples):"%(sample_count,
+            SAMPLES_PER_ITERATION,copy_time*1000000.0/sample_count)
+    chains=[(filter_type,[(filter_type,settings),]) for filter_type,settings in FILTER_SETTINGS]
+    chains.append(('HEURISTIC + VELOCITY',[FILTER_SETTINGS[4],FILTER_SETTINGS[3]]))
+    for label,chain_settings in chains:
+        createFilters=lambda: [EVENT_FILTER_TYPES[t](None,1<<i,t,EVENT_TYPES,**s) for i,(t,s) in enumerate(chain_settings)]
+        filter_time=min(timeit.repeat(lambda: runChain(createFilters(),samples),number=1,repeat=3))-copy_time
+        print "\t%-22s %6.2f usec / sample"%(label+':',filter_time*1000000.0/sample_count)
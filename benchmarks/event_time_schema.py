@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+event_time_schema.py
+
+Compares the float64 event time columns now used by all ioHub event types
+with the float32 columns used by earlier versions of the ioHub:
+
+    * The time resolution available at different points in a session.
+    * The per event storage size of each event type.
+    * The time taken to append 1 kHz binocular eye samples to an ioDataStore
+      style PyTables table, and the resulting file size.
+
+Run from the command line: python event_time_schema.py [sample_count]
+"""
+import os
+import sys
+import tempfile
+import timeit
+
+import numpy as N
+from tables import openFile, Filters
+
+from iohub.devices.eyetracker.eye_events import (BinocularEyeSampleEvent,
+        MonocularEyeSampleEvent, FixationEndEvent)
+from iohub.devices.keyboard import KeyboardKeyEvent
+from iohub.datastore.util import EVENT_TIME_COLUMNS
+
+
+def legacyEventDtype(np_dtype):
+    """
+    Returns np_dtype with the event time columns stored as float32.
+    """
+    fields=[]
+    for name in np_dtype.names:
+        field_dtype=np_dtype.fields[name][0]
+        if name in EVENT_TIME_COLUMNS:
+            field_dtype=N.dtype(N.float32)
+        fields.append((name,field_dtype))
+    return N.dtype(fields)
+
+def printResolution():
+    print "Time resolution (msec) at session time:"
+    for label,sec in (('1 min',60.0),('10 min',600.0),('1 hour',3600.0),('4 hours',14400.0)):
+        print "\t%-8s float32: %.6f\tfloat64: %.12f"%(label,
+                N.spacing(N.float32(sec))*1000.0,N.spacing(N.float64(sec))*1000.0)
+
+def printEventSizes():
+    print "Event storage size (bytes):"
+    for event_class in (BinocularEyeSampleEvent,MonocularEyeSampleEvent,FixationEndEvent,KeyboardKeyEvent):
+        np_dtype=event_class.NUMPY_DTYPE
+        legacy_size=legacyEventDtype(np_dtype).itemsize
+        print "\t%-24s float32: %4d\tfloat64: %4d\t(+%.1f%%)"%(event_class.__name__,
+                legacy_size,np_dtype.itemsize,(np_dtype.itemsize-legacy_size)*100.0/legacy_size)
+
+def sampleTimes(sample_count):
+    return N.arange(sample_count,dtype=N.float64)*0.001+3600.0
+
+def createSamples(np_dtype,sample_count):
+    samples=N.zeros(sample_count,dtype=np_dtype)
+    sample_times=sampleTimes(sample_count)
+    for name in ('device_time','logged_time','time'):
+        samples[name]=sample_times
+    samples['event_id']=N.arange(sample_count)
+    return samples
+
+def timeTableAppend(np_dtype,sample_count,rows_per_append=512,repeat=3):
+    samples=createSamples(np_dtype,sample_count)
+    file_path=os.path.join(tempfile.gettempdir(),'iohub_time_schema_benchmark.hdf5')
+
+    def appendSamples():
+        hubFile=openFile(file_path,'w')
+        table=hubFile.createTable(hubFile.root,'BinocularEyeSampleEvent',np_dtype,
+                                  filters=Filters(complevel=0,complib='zlib',shuffle=False,fletcher32=False),
+                                  expectedrows=sample_count)
+        for start in xrange(0,sample_count,rows_per_append):
+            table.append(samples[start:start+rows_per_append])
+        hubFile.close()
+
+    duration=min(timeit.repeat(appendSamples,number=1,repeat=repeat))
+    file_size=os.path.getsize(file_path)
+    os.remove(file_path)
+
+    # the max. error of the stored sample times
+    max_error=N.abs(samples['time'].astype(N.float64)-sampleTimes(sample_count)).max()
+    return duration,file_size,max_error
+
+def printTableAppend(sample_count):
+    print "Appending %d binocular samples (1 kHz, starting 1 hour into a session):"%(sample_count)
+    np_dtype=BinocularEyeSampleEvent.NUMPY_DTYPE
+    for label,table_dtype in (('float32',legacyEventDtype(np_dtype)),('float64',np_dtype)):
+        duration,file_size,max_error=timeTableAppend(table_dtype,sample_count)
+        print "\t%s: %.3f sec (%.0f samples / sec)\tfile size: %.2f MB\tmax time error: %.6f msec"%(label,
+                duration,sample_count/duration,file_size/(1024.0*1024.0),max_error*1000.0)
+
+if __name__ == '__main__':
+    sample_count=100000
+    if len(sys.argv) > 1:
+        sample_count=int(sys.argv[1])
+
+    printResolution()
+    print
+    printEventSizes()
+    print
+    printTableAppend(sample_count)
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+eye_event_detection.py
+
+Measures the ioHub Server CPU time used by the EyeEventDetector to create
+fixation, saccade, and blink events from binocular eye samples, for the IVT
+and IDT algorithms.
+
+Input is a simulated 1200 Hz binocular recording made of repeated
+fixation, saccade, fixation, blink sequences, handed to the detector in
+batches of 12 samples (i.e. a 10 msec server event processing iteration).
+The detected event sequence of the first repetition is printed so the
+results can be checked.
+
+Run from the command line: python eye_event_detection.py [repetitions]
+"""
+import sys
+import random
+import timeit
+
+from iohub.constants import EventConstants
+from iohub.devices import DeviceEvent
+from iohub.devices.eyetracker.eye_events import BinocularEyeSampleEvent
+from iohub.devices.eyetracker.event_detection import EyeEventDetector
+
+SAMPLING_RATE=1200.0
+SAMPLES_PER_ITERATION=12
+SAMPLE_FIELDS=BinocularEyeSampleEvent.CLASS_ATTRIBUTE_NAMES
+
+class EyeTrackerStub(object):
+    def __init__(self):
+        self.events=[]
+
+    def _addNativeEventToBuffer(self,e):
+        self.events.append(e)
+
+def createSample(t,x,y,pupil):
+    e=[0]*len(SAMPLE_FIELDS)
+    e[DeviceEvent.EVENT_TYPE_ID_INDEX]=EventConstants.BINOCULAR_EYE_SAMPLE
+    e[DeviceEvent.EVENT_DEVICE_TIME_INDEX]=t
+    e[DeviceEvent.EVENT_HUB_TIME_INDEX]=t
+    for eye in ('left_','right_'):
+        e[SAMPLE_FIELDS.index(eye+'gaze_x')]=x+random.gauss(0.0,0.01)
+        e[SAMPLE_FIELDS.index(eye+'gaze_y')]=y+random.gauss(0.0,0.01)
+        e[SAMPLE_FIELDS.index(eye+'pupil_measure1')]=pupil
+    return e
+
+def createSamples(repetitions):
+    """
+    Gaze positions are in deg, so the detector is used with a
+    degrees_per_unit of 1.0.
+    """
+    sequence=[(360,lambda i: (0.0,0.0),4.0),
+              (48,lambda i: (10.0*i/48,0.0),4.0),
+              (360,lambda i: (10.0,0.0),4.0),
+              (120,lambda i: (0.0,0.0),0.0)]
+    samples=[]
+    t=0.0
+    for r in xrange(repetitions):
+        for sample_count,position,pupil in sequence:
+            for i in xrange(sample_count):
+                x,y=position(i)
+                samples.append(createSample(t,x,y,pupil))
+                t+=1.0/SAMPLING_RATE
+    return samples
+
+def runDetector(algorithm,samples):
+    eye_tracker=EyeTrackerStub()
+    detector=EyeEventDetector(eye_tracker,algorithm=algorithm,sampling_rate=SAMPLING_RATE)
+    for i in xrange(0,len(samples),SAMPLES_PER_ITERATION):
+        detector._handleEvents(samples[i:i+SAMPLES_PER_ITERATION])
+    detector.reset()
+    return eye_tracker.events
+
+if __name__ == '__main__':
+    repetitions=20
+    if len(sys.argv) > 1:
+        repetitions=int(sys.argv[1])
+
+    samples=createSamples(repetitions)
+    event_names=dict([(getattr(EventConstants,n),n) for n in dir(EventConstants) if n.startswith(('FIXATION','SACCADE','BLINK'))])
+
+    print "Detecting eye events in %d binocular samples (%.1f sec of %d Hz data):"%(len(samples),len(samples)/SAMPLING_RATE,SAMPLING_RATE)
+    for algorithm in ('IVT','IDT'):
+        events=runDetector(algorithm,createSamples(1))
+        print "\t%s events for one sequence: %s"%(algorithm,', '.join([event_names[e[DeviceEvent.EVENT_TYPE_ID_INDEX]] for e in events]))
+        detection_time=min(timeit.repeat(lambda: runDetector(algorithm,samples),number=1,repeat=3))
+        print "\t%s:\t%6.1f usec / sample\t%5.1f %% of one CPU at %d Hz"%(algorithm,detection_time*1000000.0/len(samples),
+                detection_time*100.0*SAMPLING_RATE/len(samples),SAMPLING_RATE)
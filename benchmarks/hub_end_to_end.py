@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+"""
+hub_end_to_end.py
+
+End to end ioHub Server benchmarks. Each run starts an ioHub Server with
+launchHubServer(), drives the simulated eye tracker at a given sampling rate,
+and measures one of:
+
+    * latency: The time from an event being logged by the ioHub Server
+      (its logged_time) to it being returned by getEvents() in this
+      process, for the request / reply and the streamed event transports.
+    * getevents: The duration of a getEvents() call vs. the number of
+      events it returns.
+    * datastore: The ioDataStore write rate and queue depth for different
+      flush_interval settings.
+
+The ioHub Server CPU time used per 1000 events is reported for every run
+(psutil is needed for this; it is reported as null otherwise).
+
+Keyboard and Mouse devices are disabled, so the benchmarks can be run
+headless. The ioDataStore of the datastore runs is saved as events.hdf5 in
+this directory.
+
+Results are printed, and are also saved as JSON if --json is given, so the
+results of different versions of the ioHub can be compared run to run.
+
+Run from the command line:
+
+    python hub_end_to_end.py [latency] [getevents] [datastore] [--rates 500,1000,2000] [--duration 5.0] [--json results.json]
+"""
+import sys
+import time
+import json
+import platform
+import argparse
+
+import numpy as N
+
+from iohub.client import launchHubServer
+from iohub.devices import Computer, DeviceEvent
+
+BENCHMARKS=('latency','getevents','datastore')
+TRANSPORTS=('request','stream')
+GETEVENTS_INTERVALS=(0.0,0.001,0.002,0.005,0.01,0.02,0.05,0.1)
+FLUSH_INTERVALS=(0,32,256,4096,-1)
+PERCENTILES=(50,90,99)
+
+_session_count=[0]
+
+def startHub(sampling_rate,save_events=False,datastore_settings=None):
+    """
+    Starts an ioHub Server with a simulated binocular eye tracker sampling at
+    sampling_rate Hz. The ioDataStore is only enabled when save_events is True.
+    """
+    tracker_config=dict(save_events=save_events,stream_events=True,event_buffer_length=8192,
+                        device_timer=dict(interval=0.001,max_interval=0.001),
+                        monitor_event_types=['BinocularEyeSampleEvent'],
+                        runtime_settings=dict(sampling_rate=sampling_rate,track_eyes='BINOCULAR'),
+                        simulation=dict(gaze_source='PATH',parse_events=False))
+    kwargs={'eyetracker.hw.simulated.EyeTracker':tracker_config,
+            'Keyboard':dict(enable=False),'Mouse':dict(enable=False)}
+    if save_events:
+        _session_count[0]+=1
+        kwargs.update(experiment_code='hub_end_to_end',
+                      session_code='S_%d_%d'%(long(time.time()),_session_count[0]),
+                      datastore_settings=datastore_settings)
+    io=launchHubServer(**kwargs)
+    return io,io.devices.tracker
+
+def serverCPUTime():
+    """
+    Returns the user + system CPU sec.msec used by the ioHub Server process,
+    or None if psutil is not available.
+    """
+    p=Computer.ioHubServerProcess
+    cpu_times=getattr(p,'cpu_times',None) or getattr(p,'get_cpu_times',None)
+    if cpu_times is None:
+        return None
+    t=cpu_times()
+    return t.user+t.system
+
+def cpuPer1kEvents(start_cpu,end_cpu,event_count):
+    if start_cpu is None or end_cpu is None or event_count == 0:
+        return None
+    return (end_cpu-start_cpu)*1000.0*1000.0/event_count
+
+def getTrackerEventCount(io):
+    for stats in io.getDevicePollingStats():
+        if stats['device_name'] == 'tracker':
+            return stats['event_count']
+    return 0
+
+def summarize(values):
+    if len(values) == 0:
+        return dict(count=0)
+    values=N.asarray(values)
+    summary=dict(count=len(values),mean=float(values.mean()),min=float(values.min()),max=float(values.max()))
+    for p in PERCENTILES:
+        summary['p%d'%(p)]=float(N.percentile(values,p))
+    return summary
+
+def runLatency(sampling_rate,duration,transport,poll_interval):
+    io,tracker=startHub(sampling_rate)
+    try:
+        if transport == 'stream':
+            io.enableEventStreaming(coalesce=True)
+        io.clearEvents('all')
+        tracker.setRecordingState(True)
+        start_cpu=serverCPUTime()
+        start_count=getTrackerEventCount(io)
+        latencies=[]
+        end_time=Computer.getTime()+duration
+        while Computer.getTime() < end_time:
+            events=io.getEvents(as_type='list')
+            receive_time=Computer.getTime()
+            latencies.extend([receive_time-e[DeviceEvent.EVENT_LOGGED_TIME_INDEX] for e in events])
+            time.sleep(poll_interval)
+        tracker.setRecordingState(False)
+        event_count=getTrackerEventCount(io)-start_count
+        cpu_per_1k=cpuPer1kEvents(start_cpu,serverCPUTime(),event_count)
+    finally:
+        io.quit()
+
+    latency=summarize(N.asarray(latencies)*1000.0)
+    print "\t%-8s %5d Hz: %7d events\tlatency msec p50 %6.3f p90 %6.3f p99 %6.3f max %7.3f\tserver CPU %s msec / 1k events"%(transport,
+            sampling_rate,latency['count'],latency.get('p50',0.0),latency.get('p90',0.0),latency.get('p99',0.0),
+            latency.get('max',0.0),cpu_per_1k is None and 'n/a' or '%.2f'%(cpu_per_1k))
+    return dict(benchmark='latency',transport=transport,sampling_rate=sampling_rate,duration=duration,
+                poll_interval=poll_interval,events_generated=event_count,latency_msec=latency,
+                server_cpu_msec_per_1k_events=cpu_per_1k)
+
+def runGetEvents(sampling_rate,repetitions):
+    io,tracker=startHub(sampling_rate)
+    results=[]
+    try:
+        tracker.setRecordingState(True)
+        for interval in GETEVENTS_INTERVALS:
+            batch_sizes=[]
+            durations=[]
+            for r in xrange(repetitions):
+                io.clearEvents()
+                time.sleep(interval)
+                stime=Computer.getTime()
+                events=io.getEvents(as_type='list')
+                durations.append(Computer.getTime()-stime)
+                batch_sizes.append(len(events))
+            duration=summarize(N.asarray(durations)*1000.0)
+            batch_size=float(N.mean(batch_sizes))
+            usec_per_event=batch_size and duration['p50']*1000.0/batch_size or None
+            print "\t%5d Hz, %5.1f msec between calls: %7.1f events / call\tduration msec p50 %6.3f p90 %6.3f max %7.3f"%(sampling_rate,
+                    interval*1000.0,batch_size,duration['p50'],duration['p90'],duration['max'])
+            results.append(dict(benchmark='getevents',sampling_rate=sampling_rate,call_interval=interval,
+                                mean_batch_size=batch_size,duration_msec=duration,usec_per_event=usec_per_event))
+        tracker.setRecordingState(False)
+    finally:
+        io.quit()
+    return results
+
+def runDataStore(sampling_rate,duration,flush_interval):
+    io,tracker=startHub(sampling_rate,save_events=True,datastore_settings=dict(flush_interval=flush_interval))
+    try:
+        io.clearEvents('all')
+        start_stats=io.getDataStoreStats()
+        start_cpu=serverCPUTime()
+        start_count=getTrackerEventCount(io)
+        max_rows_pending=0
+        tracker.setRecordingState(True)
+        start_time=Computer.getTime()
+        end_time=start_time+duration
+        while Computer.getTime() < end_time:
+            io.clearEvents()
+            max_rows_pending=max(max_rows_pending,io.getDataStoreStats()['rows_pending'])
+            time.sleep(0.05)
+        tracker.setRecordingState(False)
+        stats=io.getDataStoreStats()
+        while stats['rows_pending'] > 0 and Computer.getTime() < end_time+5.0:
+            time.sleep(0.05)
+            stats=io.getDataStoreStats()
+        elapsed=Computer.getTime()-start_time
+        event_count=getTrackerEventCount(io)-start_count
+        cpu_per_1k=cpuPer1kEvents(start_cpu,serverCPUTime(),event_count)
+    finally:
+        io.quit()
+
+    rows_written=stats['rows_written']-start_stats['rows_written']
+    write_duration=stats['total_write_duration']-start_stats['total_write_duration']
+    rows_per_sec=rows_written/elapsed
+    write_rows_per_sec=write_duration and rows_written/write_duration or None
+    print "\tflush_interval %5d: %7d rows written\t%8.0f rows / sec (%s rows / sec of write time)\tmax pending %5d\tmax write %6.2f msec\tserver CPU %s msec / 1k events"%(flush_interval,
+            rows_written,rows_per_sec,write_rows_per_sec is None and 'n/a' or '%.0f'%(write_rows_per_sec),max_rows_pending,
+            stats['max_write_duration']*1000.0,cpu_per_1k is None and 'n/a' or '%.2f'%(cpu_per_1k))
+    return dict(benchmark='datastore',sampling_rate=sampling_rate,duration=duration,flush_interval=flush_interval,
+                events_generated=event_count,rows_written=rows_written,rows_per_sec=rows_per_sec,
+                write_rows_per_sec=write_rows_per_sec,max_rows_pending=max_rows_pending,
+                write_count=stats['write_count']-start_stats['write_count'],
+                max_write_duration_msec=stats['max_write_duration']*1000.0,
+                server_cpu_msec_per_1k_events=cpu_per_1k)
+
+if __name__ == '__main__':
+    parser=argparse.ArgumentParser(description="End to end ioHub Server benchmarks.")
+    parser.add_argument('benchmarks',nargs='*',help="benchmarks to run: %s; all by default"%(', '.join(BENCHMARKS)))
+    parser.add_argument('--rates',default='500,1000,2000',
+                        help="comma separated simulated eye tracker sampling rates, in Hz")
+    parser.add_argument('--duration',type=float,default=5.0,
+                        help="sec. of events to generate for each latency and datastore run")
+    parser.add_argument('--poll-interval',type=float,default=0.001,
+                        help="sec. to sleep between getEvents() calls in the latency runs")
+    parser.add_argument('--repetitions',type=int,default=100,
+                        help="getEvents() calls made for each batch size in the getevents runs")
+    parser.add_argument('--json',default=None,help="file to save the results to as JSON")
+    args=parser.parse_args()
+    for b in args.benchmarks:
+        if b not in BENCHMARKS:
+            parser.error("unknown benchmark: %s"%(b))
+
+    benchmarks=[b for b in BENCHMARKS if not args.benchmarks or b in args.benchmarks]
+    rates=[int(r) for r in args.rates.split(',')]
+
+    results=[]
+    if 'latency' in benchmarks:
+        print "Event latency, from logged_time to getEvents() return:"
+        for transport in TRANSPORTS:
+            for rate in rates:
+                results.append(runLatency(rate,args.duration,transport,args.poll_interval))
+    if 'getevents' in benchmarks:
+        print "getEvents() duration vs. events returned:"
+        for rate in rates:
+            results.extend(runGetEvents(rate,args.repetitions))
+    if 'datastore' in benchmarks:
+        print "ioDataStore writes at %d Hz vs. flush_interval:"%(max(rates))
+        for flush_interval in FLUSH_INTERVALS:
+            results.append(runDataStore(max(rates),args.duration,flush_interval))
+
+    if args.json:
+        info=dict(time=time.strftime('%Y-%m-%d %H:%M:%S'),platform=platform.platform(),
+                  python=platform.python_version(),arguments=' '.join(sys.argv[1:]))
+        f=open(args.json,'w')
+        json.dump(dict(info=info,results=results),f,indent=1)
+        f.close()
+        print "Results saved to",args.json
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+hub_startup.py
+
+Times ioHub startup with launchHubServer() for the default Keyboard, Mouse,
+and Display device config, and prints the duration of each startup phase of
+the experiment process and of the ioHub Server, as returned by
+ioHubConnection.getStartupTimes().
+
+The first launches are 'cold': the ioHub config cache file is removed before
+each of them, so every yaml config file is parsed and every device config is
+merged and validated. The following launches are 'warm', using the config
+cache saved by the launch before. 'wall' is the time taken by
+launchHubServer(), which also includes starting the python interpreter for
+the ioHub Server and importing the ioHub Server modules.
+
+Keyboard and Mouse events are monitored by the launched ioHub Servers, so a
+desktop session is needed.
+
+Run from the command line: python hub_startup.py [launch_count]
+"""
+import os
+import sys
+import timeit
+
+from iohub.client import launchHubServer
+from iohub.devices import deviceConfigValidation
+
+def launch():
+    start_time=timeit.default_timer()
+    io=launchHubServer()
+    wall_time=timeit.default_timer()-start_time
+    try:
+        startup_times=io.getStartupTimes()
+    finally:
+        io.quit()
+    return wall_time,startup_times
+
+def removeConfigCache():
+    # the cached config of this process is dropped as well.
+    cache_file_path=deviceConfigValidation.getConfigCache().cache_file_path
+    deviceConfigValidation._config_cache=None
+    if cache_file_path and os.path.exists(cache_file_path):
+        os.remove(cache_file_path)
+
+def printStartupTimes(label,wall_time,startup_times):
+    print "\t%-4s wall %8.2f msec"%(label,wall_time*1000.0)
+    for process in ('experiment','server'):
+        print "\t\t%s: %s"%(process,', '.join(["%s %.2f"%(phase,duration*1000.0)
+                                               for phase,duration in startup_times[process].iteritems()]))
+
+if __name__ == '__main__':
+    launch_count=3
+    if len(sys.argv) > 1:
+        launch_count=int(sys.argv[1])
+
+    print "ioHub startup, Keyboard, Mouse, and Display devices, msec:"
+    for label in ('cold','warm'):
+        wall_times=[]
+        for i in xrange(launch_count):
+            if label == 'cold':
+                removeConfigCache()
+            wall_time,startup_times=launch()
+            wall_times.append(wall_time)
+            printStartupTimes(label,wall_time,startup_times)
+        print "\t%-4s min wall %8.2f msec\n"%(label,min(wall_times)*1000.0)
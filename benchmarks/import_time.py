@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+import_time.py
+
+Times the import of the iohub package, and of the parts of it an experiment
+script commonly uses, each in a new python process, so no module is already
+imported. For each import statement the total import time, the number of
+modules imported, and which of the large optional dependencies (psychopy
+visual, wx, PyTables, scipy, yaml, the ioHub devices) were imported are
+printed. The modules that took the longest to import are also listed, with
+their cumulative import time (including the modules they import), similar to
+the output of 'python -X importtime' in Python 3.7+.
+
+A budget, in msec, can be given for the total import time of each statement;
+the script exits with status 1 if any statement is over budget, so it can be
+used to guard the import time of the iohub package.
+
+Run from the command line:
+
+    python import_time.py [--repeat 5] [--top 10] [--budget 'import iohub'=300]
+"""
+import sys
+import json
+import argparse
+import subprocess
+
+IMPORT_STATEMENTS=('import iohub',
+                   'from iohub.constants import EventConstants',
+                   'from iohub import launchHubServer',
+                   'import iohub.devices',
+                   'from iohub.datastore.util import ExperimentDataAccessUtility')
+
+WATCHED_MODULES=('iohub.client','iohub.devices','iohub.devices.display','iohub.datastore',
+                 'iohub.util.visualUtil','iohub.util.dialogs','psychopy.visual','wx',
+                 'tables','scipy','yaml','gevent','msgpack')
+
+# Run in the new python process: times the import statement, and the
+# cumulative import time of each module it imports.
+TIMING_SCRIPT="""
+import sys, json, timeit, __builtin__
+_import=__builtin__.__import__
+_module_times=dict()
+def timedImport(name,*args,**kwargs):
+    old_modules=set(sys.modules)
+    start_time=timeit.default_timer()
+    try:
+        return _import(name,*args,**kwargs)
+    finally:
+        duration=timeit.default_timer()-start_time
+        # the imported module; relative imports are matched by name suffix.
+        new_modules=[m for m in set(sys.modules)-old_modules if sys.modules[m] is not None]
+        for m in new_modules:
+            if m == name or m.endswith('.'+name):
+                _module_times.setdefault(m,duration)
+                break
+__builtin__.__import__=timedImport
+start_time=timeit.default_timer()
+exec sys.argv[1]
+duration=timeit.default_timer()-start_time
+__builtin__.__import__=_import
+json.dump(dict(duration=duration,modules=sorted(m for m in sys.modules if sys.modules[m] is not None),
+               module_times=_module_times),sys.stdout)
+"""
+
+def timeImport(statement):
+    output=subprocess.check_output([sys.executable,'-c',TIMING_SCRIPT,statement])
+    return json.loads(output)
+
+def runStatement(statement,repeat):
+    results=[timeImport(statement) for r in xrange(repeat)]
+    best=min(results,key=lambda r: r['duration'])
+    modules=set(best['modules'])
+    watched=[m for m in WATCHED_MODULES if m in modules]
+    return dict(statement=statement,duration_msec=best['duration']*1000.0,
+                module_count=len(modules),imported_watched_modules=watched,
+                module_times_msec=dict([(m,t*1000.0) for m,t in best['module_times'].iteritems()]))
+
+def parseBudgets(budget_args,parser):
+    budgets=dict()
+    for b in budget_args:
+        statement,sep,msec=b.rpartition('=')
+        if not sep or statement not in IMPORT_STATEMENTS:
+            parser.error("budgets are given as '<import statement>=<msec>', for one of: %s"%(', '.join(IMPORT_STATEMENTS)))
+        budgets[statement]=float(msec)
+    return budgets
+
+if __name__ == '__main__':
+    parser=argparse.ArgumentParser(description="iohub package import times.")
+    parser.add_argument('--repeat',type=int,default=5,help="imports timed for each statement; the fastest is reported")
+    parser.add_argument('--top',type=int,default=10,help="number of slowest imported modules listed for each statement")
+    parser.add_argument('--budget',action='append',default=[],help="'<import statement>=<msec>' import time budget")
+    parser.add_argument('--json',default=None,help="file to save the results to as JSON")
+    args=parser.parse_args()
+    budgets=parseBudgets(args.budget,parser)
+
+    results=[]
+    over_budget=[]
+    print "iohub import times, best of %d new python processes:"%(args.repeat)
+    for statement in IMPORT_STATEMENTS:
+        result=runStatement(statement,args.repeat)
+        results.append(result)
+        budget=budgets.get(statement)
+        budget_text=''
+        if budget is not None:
+            budget_text='\tbudget %.1f msec: %s'%(budget,result['duration_msec'] <= budget and 'OK' or 'OVER')
+            if result['duration_msec'] > budget:
+                over_budget.append(statement)
+        print "\t%-64s %8.1f msec\t%4d modules%s"%(statement,result['duration_msec'],result['module_count'],budget_text)
+        print "\t\timported: %s"%(', '.join(result['imported_watched_modules']) or 'none of the watched modules')
+        slowest=sorted(result['module_times_msec'].iteritems(),key=lambda mt: mt[1],reverse=True)[:args.top]
+        for m,t in slowest:
+            print "\t\t%8.1f msec  %s"%(t,m)
+
+    if args.json:
+        f=open(args.json,'w')
+        json.dump(results,f,indent=1)
+        f.close()
+        print "Results saved to",args.json
+
+    if over_budget:
+        print "Over budget: %s"%(', '.join(over_budget))
+        sys.exit(1)
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+keyboard_char_events.py
+
+Compares the time taken by the ioHub Keyboard device to create
+KeyboardCharEvents from press and release events, using the previous
+implementation, where every keyboard event re-read all the press and release
+events in the device event buffer, with the current one, where each press
+and release event updates the pressed key state as it is handled.
+
+Input is simulated typing: each keystroke is a press followed by a release
+of one of 40 keys, with none of the device's events being read, so the
+device event buffer keeps growing (as with the previous, unbounded, device
+event buffer). The previous implementation is quadratic in the number of
+unread events, so by default it is only timed up to 2500 keystrokes.
+
+Run from the command line: python keyboard_char_events.py [max_previous_keystrokes]
+"""
+import sys
+import timeit
+
+from iohub.constants import EventConstants
+from iohub.devices import Computer, DeviceEvent
+from iohub.devices.keyboard import ioHubKeyboardDevice, KeyboardInputEvent, KeyboardCharEvent
+
+KEYSTROKE_COUNTS=(1000,2500,5000,10000)
+KEY_COUNT=40
+EVENT_FIELDS=KeyboardInputEvent.CLASS_ATTRIBUTE_NAMES
+KEY_ID_INDEX=EVENT_FIELDS.index('key_id')
+
+class PreviousKeyboardStandIn(object):
+    # Keyboard char event creation prior to the incremental key state.
+    def __init__(self):
+        self._iohub_event_buffer=dict()
+        self._key_states=dict()
+        self._lastProcessedEventID=0
+        self.char_events=[]
+
+    def getEvents(self,event_type_id):
+        return list(self._iohub_event_buffer.get(event_type_id,[]))
+
+    def _handleEvent(self,e):
+        self._iohub_event_buffer.setdefault(e[DeviceEvent.EVENT_TYPE_ID_INDEX],[]).append(e)
+        self.char_events.extend(self._getCharEvents())
+
+    def _getCharEvents(self):
+        press_events=[e for e in self.getEvents(EventConstants.KEYBOARD_PRESS) if e[DeviceEvent.EVENT_ID_INDEX] > self._lastProcessedEventID]
+        release_events=[e for e in self.getEvents(EventConstants.KEYBOARD_RELEASE) if e[DeviceEvent.EVENT_ID_INDEX] > self._lastProcessedEventID]
+
+        keypress_events=[]
+        keyrelease_events=[]
+        if len(press_events)>0:
+            i=-1
+            while press_events[i][DeviceEvent.EVENT_ID_INDEX] > self._lastProcessedEventID:
+                self._lastProcessedEventID=press_events[i][DeviceEvent.EVENT_ID_INDEX]
+                keypress_events.insert(0,press_events[i])
+                if i+len(press_events)==0:
+                    break
+                i-=1
+
+        if len(release_events)>0:
+            i=-1
+            while release_events[i][DeviceEvent.EVENT_ID_INDEX] > self._lastProcessedEventID:
+                self._lastProcessedEventID=release_events[i][DeviceEvent.EVENT_ID_INDEX]
+                keyrelease_events.insert(0,release_events[i])
+                if i+len(release_events)==0:
+                    break
+                i-=1
+
+        charEvents=[]
+        for e in keypress_events:
+            if e[KEY_ID_INDEX] not in self._key_states.keys():
+                self._key_states[e[KEY_ID_INDEX]]=[e,0]
+            else:
+                self._key_states[e[KEY_ID_INDEX]][1]+=1
+        for e in keyrelease_events:
+            if e[KEY_ID_INDEX] in self._key_states.keys():
+                key_press=self._key_states.pop(e[KEY_ID_INDEX])[0]
+                charEvent=list(e)
+                charEvent[DeviceEvent.EVENT_TYPE_ID_INDEX]=KeyboardCharEvent.EVENT_TYPE_ID
+                charEvent[DeviceEvent.EVENT_ID_INDEX]=Computer._getNextEventID()
+                charEvent.append(tuple(key_press))
+                charEvent.append(e[DeviceEvent.EVENT_HUB_TIME_INDEX]-key_press[DeviceEvent.EVENT_HUB_TIME_INDEX])
+                charEvents.append(charEvent)
+        return charEvents
+
+def createKeyboard(keystroke_count):
+    config=dict([(n,None) for n in ioHubKeyboardDevice.CLASS_ATTRIBUTE_NAMES])
+    config.update(name='keyboard',event_buffer_length=max(keystroke_count,256),auto_report_events=True)
+    return ioHubKeyboardDevice(**config)
+
+def createKeyEvent(etype,t,key_id):
+    e=[0]*len(EVENT_FIELDS)
+    e[DeviceEvent.EVENT_ID_INDEX]=Computer._getNextEventID()
+    e[DeviceEvent.EVENT_TYPE_ID_INDEX]=etype
+    e[DeviceEvent.EVENT_HUB_TIME_INDEX]=t
+    e[KEY_ID_INDEX]=key_id
+    return e
+
+def createKeystrokes(keystroke_count):
+    events=[]
+    t=0.0
+    for i in xrange(keystroke_count):
+        key_id=i%KEY_COUNT
+        events.append(createKeyEvent(EventConstants.KEYBOARD_PRESS,t,key_id))
+        events.append(createKeyEvent(EventConstants.KEYBOARD_RELEASE,t+0.08,key_id))
+        t+=0.1
+    return events
+
+def runPrevious(events):
+    keyboard=PreviousKeyboardStandIn()
+    for e in events:
+        keyboard._handleEvent(e)
+    return len(keyboard.char_events)
+
+def runCurrent(events):
+    keyboard=createKeyboard(len(events)//2)
+    for e in events:
+        keyboard._handleEvent(e)
+    return len(keyboard._getNativeEventBuffer())
+
+if __name__ == '__main__':
+    max_previous=2500
+    if len(sys.argv) > 1:
+        max_previous=int(sys.argv[1])
+
+    print "KeyboardCharEvent creation, no events read from the device event buffer:"
+    for keystroke_count in KEYSTROKE_COUNTS:
+        events=createKeystrokes(keystroke_count)
+        for label,run in (('previous',runPrevious),('current',runCurrent)):
+            if label == 'previous' and keystroke_count > max_previous:
+                continue
+            char_count=run(events)
+            duration=min(timeit.repeat(lambda: run(events),number=1,repeat=3))
+            print "\t%-8s %6d keystrokes: %6d char events\t%8.2f usec / keystroke\t%8.3f sec total"%(label,
+                    keystroke_count,char_count,duration*1000000.0/keystroke_count,duration)
@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""
+mc_daq_decoding.py
+
+Compares the time taken by the Measurement Computing AnalogInput device to
+decode the scans read from the driver sample buffer into
+MultiChannelAnalogInputEvents, using the previous implementation, where
+each value was copied one at a time through a ctypes struct, with the
+current one, where the new values are read through a numpy view of the
+driver memory and reshaped to (scans, channels) in one step. The current
+implementation is timed creating one MultiChannelAnalogInputEvent per scan
+('current'), and one MultiChannelAnalogInputBlockEvent per poll ('block').
+The msgpack packed size of the events, as sent by the ioHub Server, is 
+reported per scan.
+
+No MC hardware or driver is needed; FakeMCDLL stands in for cbw32.dll, and
+each cbGetStatus call 'receives' the number of scans the device would
+record at the channel sampling rate in one poll interval. The previous
+implementation only supported 8 channels, so it is only timed for 8
+channels.
+
+Run from the command line: python mc_daq_decoding.py [poll_interval_sec]
+"""
+import sys
+import timeit
+from ctypes import c_uint16, c_uint32, addressof, byref, cast, POINTER
+
+import numpy as N
+import msgpack
+
+from iohub.devices import Computer, DeviceEvent
+from iohub.devices.daq import MultiChannelAnalogInputEvent, MultiChannelAnalogInputBlockEvent
+from iohub.devices.daq.hw.mc import AnalogInput
+from iohub.devices.daq.hw.mc.constants import RUNNING
+
+CHANNEL_COUNTS=(1,8,16)
+SAMPLING_RATES=(1000,10000)
+POLL_COUNT=2000
+SAMPLE_COUNT_INDEX=MultiChannelAnalogInputBlockEvent.CLASS_ATTRIBUTE_NAMES.index('sample_count')
+
+class FakeMCDLL(object):
+    """
+    Stand-in for the MC Universal Library functions used by the AnalogInput
+    device. The sample buffer is filled with values once, when the scan is
+    started, so only the decoding done by the device is timed.
+    """
+    def __init__(self,a2d_resolution=16):
+        self.a2d_resolution=a2d_resolution
+        self.scans_per_status=0
+        self._buffers=dict()
+        self._buffer_size=0
+        self._channel_count=0
+        self._index=0
+        self._received=0
+
+    def cbDeclareRevision(self,version):
+        return 0
+
+    def cbErrHandling(self,report,handling):
+        return 0
+
+    def cbGetConfig(self,info_type,board,device,config_item,config_value):
+        config_value._obj.value=self.a2d_resolution
+        return 0
+
+    def cbWinBufAlloc(self,count):
+        sample_buffer=(c_uint16*count.value)()
+        address=addressof(sample_buffer)
+        self._buffers[address]=sample_buffer
+        return address
+
+    def cbWinBufFree(self,handle):
+        self._buffers.pop(handle,None)
+        return 0
+
+    def cbAInScan(self,board,low_channel,high_channel,count,rate,gain,handle,options):
+        self._channel_count=high_channel.value-low_channel.value+1
+        self._buffer_size=count.value
+        values=N.frombuffer(self._buffers[handle],dtype=N.uint16)
+        values[:]=N.arange(self._buffer_size)%4096
+        self._index=0
+        self._received=0
+        return 0
+
+    def cbGetStatus(self,board,status,count,index):
+        value_count=self.scans_per_status*self._channel_count
+        self._index=(self._index+value_count)%self._buffer_size
+        self._received+=value_count
+        status._obj.value=RUNNING
+        count._obj.value=self._received
+        index._obj.value=self._index
+        return 0
+
+    def cbStopBackground(self,board):
+        return 0
+
+class PreviousDecodingStandIn(object):
+    # MC scan decoding prior to the numpy view of the driver buffer.
+    def __init__(self,device):
+        self.device=device
+        size=device._input_sample_buffer_size
+        self.values=(c_uint32*size)()
+        self.indexes=(c_uint32*size)()
+        self.sample_data_buffer=cast(device._memory_handle,POINTER(c_uint16))
+        self.last_index=0
+        self.count_created=0
+
+    def poll(self):
+        device=self.device
+        device._DLL.cbGetStatus(device.device_number,byref(device._device_status),
+                                byref(device._samples_received_count),byref(device._current_sample_buffer_index))
+        logged_time=Computer.currentSec()
+        current_index=device._current_sample_buffer_index.value
+        last_index=self.last_index
+        if last_index != current_index:
+            self.last_index=current_index
+            if last_index > current_index:
+                for v in xrange(last_index,device._input_sample_buffer_size):
+                    self.saveScannedEvent(logged_time,v)
+                last_index=0
+            for v in xrange(last_index,current_index):
+                self.saveScannedEvent(logged_time,v)
+
+    def saveScannedEvent(self,logged_time,sample_index):
+        channel_count=self.device.input_channel_count
+        sample_channel=self.count_created%channel_count
+        self.values[sample_index]=self.sample_data_buffer[sample_index]
+        self.indexes[sample_index]=self.count_created/channel_count
+        if sample_channel == channel_count-1:
+            self.device._addNativeEventToBuffer(self.createMultiChannelEventList(logged_time,sample_index-sample_channel))
+        self.count_created+=1
+
+    def createMultiChannelEventList(self,logged_time,index):
+        device=self.device
+        values=self.values
+        device_time=float(self.indexes[index])/float(device.channel_sampling_rate.value)
+        time=device_time+device._last_start_recording_time_post
+        confidence_interval=device._last_start_recording_time_post-device._last_start_recording_time_pre
+        return [0,0,0,Computer._getNextEventID(),MultiChannelAnalogInputEvent.EVENT_TYPE_ID,
+                device_time,logged_time,time,confidence_interval,logged_time-time,0,
+                float(values[index]),float(values[index+1]),float(values[index+2]),float(values[index+3]),
+                float(values[index+4]),float(values[index+5]),float(values[index+6]),float(values[index+7])]
+
+def createAnalogInput(fake_dll,channel_count,sampling_rate,event_buffer_length):
+    AnalogInput._DLL=fake_dll
+    dconfig=dict([(n,None) for n in AnalogInput.CLASS_ATTRIBUTE_NAMES])
+    dconfig.update(name='analog_input',model_name='USB-1616FS',device_number=0,gain='BIP10VOLTS',
+                   options=0,input_channel_count=channel_count,channel_sampling_rate=sampling_rate,
+                   event_buffer_length=event_buffer_length,auto_report_events=False)
+    device=AnalogInput(dconfig=dconfig)
+    device.enableEventReporting(True)
+    return device
+
+def runCurrent(device,poll_count):
+    event_count=0
+    native_buffer=device._native_event_buffer
+    for i in xrange(poll_count):
+        device._poll()
+        event_count+=len(native_buffer)
+        native_buffer.clear()
+    return event_count
+
+def runBlocks(device,poll_count):
+    device._block_events,device._scan_events=True,False
+    try:
+        scan_count=0
+        native_buffer=device._native_event_buffer
+        for i in xrange(poll_count):
+            device._poll()
+            for e in native_buffer:
+                scan_count+=e[SAMPLE_COUNT_INDEX]
+            native_buffer.clear()
+        return scan_count
+    finally:
+        device._block_events,device._scan_events=False,True
+
+def packedBytesPerScan(device,label):
+    # the packed size of the events created by one poll.
+    device._block_events,device._scan_events=label == 'block',label != 'block'
+    try:
+        native_buffer=device._native_event_buffer
+        native_buffer.clear()
+        device._poll()
+        events=list(native_buffer)
+        native_buffer.clear()
+    finally:
+        device._block_events,device._scan_events=False,True
+    if label == 'block':
+        scan_count=sum([e[SAMPLE_COUNT_INDEX] for e in events])
+    else:
+        scan_count=len(events)
+    return len(msgpack.packb(events))/float(scan_count)
+
+def runPrevious(device,poll_count):
+    previous=PreviousDecodingStandIn(device)
+    event_count=0
+    native_buffer=device._native_event_buffer
+    for i in xrange(poll_count):
+        previous.poll()
+        event_count+=len(native_buffer)
+        native_buffer.clear()
+    return event_count
+
+def checkEvents(device,fake_dll):
+    # the first decoded scan holds the values 0 - channel count-1, and the
+    # unused channels of every event are 0.
+    device._native_event_buffer.clear()
+    device._poll()
+    e=device._native_event_buffer[0]
+    channel_count=device.input_channel_count
+    channels=e[DeviceEvent.EVENT_FILTER_ID_INDEX+1:]
+    assert len(channels) == MultiChannelAnalogInputEvent.MAX_CHANNEL_COUNT
+    assert channels[:channel_count] == [float(c) for c in xrange(channel_count)]
+    assert not any(channels[channel_count:])
+    device._native_event_buffer.clear()
+
+if __name__ == '__main__':
+    poll_interval=0.001
+    if len(sys.argv) > 1:
+        poll_interval=float(sys.argv[1])
+
+    print "MC AnalogInput scan decoding, %.1f msec poll interval:"%(poll_interval*1000.0)
+    for channel_count in CHANNEL_COUNTS:
+        for sampling_rate in SAMPLING_RATES:
+            fake_dll=FakeMCDLL()
+            fake_dll.scans_per_status=max(1,int(sampling_rate*poll_interval))
+            if fake_dll.scans_per_status >= AnalogInput._SAMPLE_BLOCK_TRANSFER_SIZE['USB-1616FS']:
+                print "\tskipping %d Hz: more scans per poll than the driver buffer holds"%(sampling_rate)
+                continue
+            device=createAnalogInput(fake_dll,channel_count,sampling_rate,fake_dll.scans_per_status*2)
+            checkEvents(device,fake_dll)
+            for label,run in (('previous',runPrevious),('current',runCurrent),('block',runBlocks)):
+                if label == 'previous' and channel_count != 8:
+                    continue
+                scan_count=[0]
+                def timedRun():
+                    scan_count[0]=run(device,POLL_COUNT)
+                duration=min(timeit.repeat(timedRun,number=1,repeat=3))
+                packed_size=label != 'previous' and '%6.1f'%(packedBytesPerScan(device,label)) or '   n/a'
+                print "\t%-8s %2d channels %5d Hz: %6d scans\t%8.2f usec / scan\t%8.2f usec / poll\t%s packed bytes / scan"%(label,
+                        channel_count,sampling_rate,scan_count[0],duration*1000000.0/scan_count[0],
+                        duration*1000000.0/POLL_COUNT,packed_size)
+            device.enableEventReporting(False)
@@ -20,8 +20,8 @@ from collections import namedtuple,Iterable
 from timebase import psychopy_available, MonotonicClock, monotonicClock
 from util import (fix_encoding,OrderedDict,convertCamelToSnake,win32MessagePump,
                   print2err,printExceptionDetailsToStdErr,ioHubError,createErrorResult,
-                  DeviceEventTrigger, ClearScreen, InstructionScreen,
-                  getCurrentDateTimeString,FullScreenWindow)
+                  getCurrentDateTimeString)
+from util.lazy_import import installLazyImportModule
 
 
 fix_encoding.fix_encoding()
@@ -76,7 +76,17 @@ def isIterable(o):
 
 RectangleBorder=namedtuple('RectangleBorderClass', 'left top right bottom')
 
-from client import launchHubServer,ioHubExperimentRuntime
 import constants
 from constants import (DeviceConstants, EventConstants, KeyboardConstants, 
-                       MouseConstants, EyeTrackerConstants)
\ No newline at end of file
+                       MouseConstants, EyeTrackerConstants)
+
+# The ioHub client (and so the ioHub devices), and the psychopy.visual based
+# util classes, are imported the first time they are accessed, so scripts
+# that only use the ioHub constants, or the ioDataStore, do not import them.
+installLazyImportModule(__name__,dict(client='iohub.client',
+                                      launchHubServer='iohub.client',
+                                      ioHubExperimentRuntime='iohub.client',
+                                      DeviceEventTrigger='iohub.util.visualUtil',
+                                      ClearScreen='iohub.util.visualUtil',
+                                      InstructionScreen='iohub.util.visualUtil',
+                                      FullScreenWindow='iohub.util.visualUtil'))
\ No newline at end of file
@@ -13,19 +13,14 @@ Distributed under the terms of the GNU General Public License (GPL version 3 or
 
 import os,sys
 import time
+import socket
 import subprocess
 from collections import deque
 import json
 import signal
+import threading
+from operator import itemgetter
 
-try:
-    from yaml import load, dump
-    from yaml import CLoader as Loader, CDumper as Dumper
-except ImportError:
-#    print "*** Using Python based YAML Parsing"
-    from yaml import Loader, Dumper
-
-from psychopy import  core as core, gui
 import psychopy.logging as psycho_logging
     
 if sys.platform != 'darwin':
@@ -33,11 +28,12 @@ if sys.platform != 'darwin':
     _psutil_available=True
 
 from . import IO_HUB_DIRECTORY,isIterable
-from .devices import Computer, DeviceEvent,import_device
+from .devices import Computer, DeviceEvent, EventQuery, import_device, eventListsToArrays, unpackEventArrays, mergeEventArrays
+from .devices.deviceConfigValidation import getConfigCache
 from .devices.experiment import MessageEvent,LogEvent
 from .constants import DeviceConstants,EventConstants
-from .util import updateDict,MessageDialog, print2err,printExceptionDetailsToStdErr,ioHubError,win32MessagePump, ioHubConnectionException, ioHubServerError
-from .net import UDPClientConnection
+from .util import OrderedDict,updateDict, print2err,printExceptionDetailsToStdErr,ioHubError,win32MessagePump, ioHubConnectionException, ioHubServerError
+from .net import UDPClientConnection, UDPEventStreamConnection, SharedEventRingBuffer
 
 currentSec= Computer.currentSec
 
@@ -57,17 +53,36 @@ class DeviceRPC(object):
     _log_text_index=LogEvent.CLASS_ATTRIBUTE_NAMES.index('text')
     _log_level_index=LogEvent.CLASS_ATTRIBUTE_NAMES.index('log_level')
     
-    def __init__(self,sendToHub,device_class,method_name):
+    def __init__(self,sendToHub,device_class,method_name,submitToHub=None):
         self.device_class=device_class
         self.method_name=method_name
         self.sendToHub=sendToHub
+        self.submitToHub=submitToHub
 
     def __call__(self, *args,**kwargs):
         r = self.sendToHub(('EXP_DEVICE','DEV_RPC',self.device_class,self.method_name,args,kwargs))
+        return self._processReply(r,kwargs)
+
+    def submit(self,*args,**kwargs):
+        """
+        Send the device method call to the ioHub Process without waiting for
+        the reply. An ioHubRequestTicket is returned, whose result() method
+        returns the same value the device method call would have. Several 
+        device method calls can be submitted before any of the results are
+        requested, so the calls only cost about one round trip to the 
+        ioHub Process in total.
+        """
+        return self.submitToHub(('EXP_DEVICE','DEV_RPC',self.device_class,self.method_name,args,kwargs),
+                                lambda r: self._processReply(r,kwargs))
+
+    def _processReply(self,r,kwargs):
         r=r[1:]
         if len(r)==1:
             r=r[0]
 
+        if self.method_name == 'getEvents' and kwargs.get('asType') == 'numpy':
+            return unpackEventArrays(r)
+
         if r and self.method_name == 'getEvents':
             asType='namedtuple'
             if 'asType' in kwargs:
@@ -139,7 +154,7 @@ class ioHubDeviceView(object):
             if name in self._preRemoteMethodCallFunctions:
                 f,ka=self._preRemoteMethodCallFunctions[name]
                 f(ka)
-            r = DeviceRPC(self.hubClient._sendToHubServer,self.device_class,name)
+            r = DeviceRPC(self.hubClient._sendToHubServer,self.device_class,name,self.hubClient._submitToHubServer)
             if name in self._postRemoteMethodCallFunctions:
                 f,ka=self._postRemoteMethodCallFunctions[name]
                 f(ka)
@@ -194,6 +209,118 @@ class ioHubDeviceView(object):
         return self._methods
 
 
+class ioHubRequestTicket(object):
+    """
+    Represents a request that has been sent to the ioHub Process, but whose
+    reply may not have been received yet. Returned by DeviceRPC.submit().
+    
+    Each request is sent with a ticket id, which the ioHub Process includes
+    in the reply, so replies are matched to the right request even when
+    several requests are pending, and late or duplicate replies are ignored.
+    """
+    def __init__(self,hubClient,ticket_id,message,result_handler=None):
+        self.hubClient=hubClient
+        self.ticket_id=ticket_id
+        self.message=message
+        self._result_handler=result_handler
+        self._reply=None
+        self._done=False
+        self._bytes_sent=0
+        self._send_time=0.0
+        self._send_count=0
+
+    def done(self):
+        """
+        Returns True if the reply for the request has been received.
+        """
+        return self._done
+
+    def result(self,timeout=None):
+        """
+        Returns the result of the request, waiting for the reply if it has not
+        been received yet. If the reply is an ioHub error, it is raised.
+        
+        Args:
+            timeout (float): The maximum sec.msec to wait for the reply. None (the default) waits until the reply is received, or until the request has been retransmitted RPC_MAX_RETRANSMITS times without the ioHub Process replying.
+        
+        Returns:
+            object: The request result.
+        
+        Raises:
+            ioHubConnectionException: if no reply is received.
+        """
+        if self._done is False:
+            self.hubClient._waitForTicket(self,timeout)
+        errorReply=self.hubClient._isErrorReply(self._reply)
+        if errorReply:
+            raise errorReply
+        if self._result_handler:
+            return self._result_handler(self._reply)
+        return self._reply
+
+    def _setReply(self,reply):
+        self._reply=reply
+        self._done=True
+
+class ioHubEventStreamReceiver(threading.Thread):
+    """
+    Background thread used by the ioHubConnection when event streaming is
+    enabled. Events pushed by the ioHub Process are added to the event_queue
+    as they are received.
+    """
+    def __init__(self,stream_connection,event_queue):
+        threading.Thread.__init__(self)
+        self.daemon=True
+        self.connection=stream_connection
+        self.event_queue=event_queue
+        self.running=False
+
+    def run(self):
+        self.running=True
+        while self.running is True:
+            try:
+                result,address=self.connection.receiveWithTimeout(0.05)
+                if result is None:
+                    continue
+                if result[0] == 'EVENT_STREAM':
+                    self.event_queue.extend(result[1])
+                elif result[0] == 'UNSUBSCRIBE_EVENTS_RESULT':
+                    self.running=False
+            except:
+                if self.running is True:
+                    printExceptionDetailsToStdErr()
+                    self.running=False
+
+class ioHubTriggerReceiver(threading.Thread):
+    """
+    Background thread used by the ioHubConnection once an event trigger has
+    been registered. Each trigger notification sent by the ioHub Process is
+    added to the fired_triggers deque of the trigger as an 
+    (event, fired_time) tuple.
+    """
+    def __init__(self,trigger_connection,fired_triggers):
+        threading.Thread.__init__(self)
+        self.daemon=True
+        self.connection=trigger_connection
+        self.fired_triggers=fired_triggers
+        self.running=False
+
+    def run(self):
+        self.running=True
+        while self.running is True:
+            try:
+                result,address=self.connection.receiveWithTimeout(0.05)
+                if result is None:
+                    continue
+                if result[0] == 'TRIGGER_FIRED':
+                    fired=self.fired_triggers.get(result[1])
+                    if fired is not None:
+                        fired.append((result[2],result[3]))
+            except:
+                if self.running is True:
+                    printExceptionDetailsToStdErr()
+                    self.running=False
+
 class ioHubDevices(object):
     """
     ioHubDevices is a PsychoPy Process side class that contains one attribute 
@@ -326,6 +453,17 @@ class ioHubConnection(object):
         
     """
     _replyDictionary=dict()
+
+    # Requests are sent to the ioHub Process with a ticket id. If no reply
+    # has been received for a request after RPC_RETRANSMIT_INTERVAL sec.msec,
+    # the request is sent again, up to RPC_MAX_RETRANSMITS times. The ioHub
+    # Process only handles a ticket once, resending the saved reply for
+    # retransmitted requests, or replying TICKET_PENDING if the request is
+    # still being handled, which restarts the retransmit count. A request
+    # that has no reply RPC_RETRANSMIT_INTERVAL after its last retransmit
+    # raises an ioHubConnectionException.
+    RPC_RETRANSMIT_INTERVAL=0.5
+    RPC_MAX_RETRANSMITS=4
     def __init__(self,ioHubConfig=None,ioHubConfigAbsPath=None):        
         if ioHubConfig:
             if not isinstance(ioHubConfig,dict):
@@ -333,6 +471,8 @@ class ioHubConnection(object):
             
         # udp port setup
         self.udp_client = None
+        self._lastTicketID=0
+        self._pendingTickets=dict()
 
         # the dynamically generated object that contains an attribute for
         # each device registed for monitoring with the ioHub server so
@@ -363,6 +503,29 @@ class ioHubConnection(object):
         self._experimentMetaData=None
         self._sessionMetaData=None
         
+        # Used when event streaming has been enabled: events pushed by the
+        # ioHub Process are received by the stream receiver thread into the
+        # streamed events deque, and handed out by getEvents().
+        self._eventStreamReceiver=None
+        self._streamedEvents=None
+
+        # Used when the shared memory event transport is enabled in the ioHub
+        # config: event type id -> SharedEventRingBuffer reader. Events of
+        # the types in _unsharedEventTypes (i.e. block events) have no ring,
+        # and are still requested from the ioHub Server global event buffer.
+        self._sharedEventBuffers=None
+        self._unsharedEventTypes=()
+
+        # Used once an event trigger has been registered: trigger notifications
+        # pushed by the ioHub Process are received by the trigger receiver
+        # thread into a deque for each trigger_id.
+        self._triggerReceiver=None
+        self._firedTriggers=dict()
+
+        # sec.msec duration of each experiment process side ioHub startup
+        # phase, in the order the phases were run.
+        self._startupTimes=OrderedDict()
+
         self._shutdown_attempted=False
         self._startServer(ioHubConfig, ioHubConfigAbsPath)
 
@@ -425,7 +588,7 @@ class ioHubConnection(object):
         """
         return self._experimentMetaData
         
-    def getEvents(self,device_label=None,as_type ='namedtuple'):
+    def getEvents(self,device_label=None,as_type ='namedtuple',query=None):
         """
         Retrieve any events that have been collected by the ioHub Process from 
         monitored devices since the last call to getEvents() or clearEvents().
@@ -448,28 +611,42 @@ class ioHubConnection(object):
 		* 'astuple': Each event is converted to a namedtuple object. Event attributes are accessed using natural naming style (dot name style), or by the index of the event attribute for the event type. The namedtuple class definition is created once for each Event type at the start of the experiment, so memory overhead is almost the same as the event value list, and conversion from the event list to the namedtuple is very fast. This is the default, and normally most useful, event representation type.
 		* 'dict': Each event converted to a dict object, keys equaling the event attribute names, values being, well the attribute values for the event.
 		* 'object': Each event is converted into an instance of the ioHub DeviceEvent subclass based on the event's type. This conversion process can take a bit of time if the number of events returned is large, and currently there is no real benefit converting events into DeviceEvent Class instances vs. the default namedtuple object type. Therefore this option should be used rarely.
+		* 'numpy': Events are returned as a dict with one numpy structured array per event type, keyed by event type id. Each array uses the NUMPY_DTYPE of the event type's DeviceEvent class and is ordered by event time. The arrays are built by the ioHub Process and sent as raw array data, so no per event conversion is done in the PsychoPy Process. This is the most efficient option when a large number of events, such as eye tracker samples, are being retrieved.
                 
         Args:
             device_label (str): Indicates what device to retrieve events for. If None ( the default ) returns device events from all devices.            
             
 			as_type (str): Indicates how events should be represented when they are returned to the user. Default: 'namedtuple'.
 
+            query (dict): If given, only events matching the query conditions are returned, and only those events are removed from the event buffer; other events are kept for later getEvents() calls. The conditions that can be used are described in iohub.devices.EventQuery; for example query=dict(event_types=['KeyboardPressEvent'],attributes=dict(key=['q','space'])). When events are retrieved by request, the query is evaluated by the ioHub Process, so events that do not match are not sent to the PsychoPy Process.
+
         Returns:
-            tuple: A tuple of event objects, where the event object type is defined by the 'as_type' parameter.
+            tuple: A tuple of event objects, where the event object type is defined by the 'as_type' parameter. When as_type is 'numpy', a dict of event type id -> numpy array is returned instead.
         """
+        if as_type == 'numpy':
+            return self._getEventArrays(device_label,query)
 
         r=None
         if device_label is None:
-            events=self._getEvents()
-            if events is None:
-                r=self.allEvents    
+            if self._sharedEventBuffers:
+                events=self._getSharedMemoryEvents()
+            elif self._eventStreamReceiver:
+                events=self._getStreamedEvents()
             else:
+                events=self._getEvents(query)
+            if events is not None:
                 self.allEvents.extend(events)
+            if query:
+                r,self.allEvents=EventQuery(query).split(self.allEvents)
+            else:
                 r=self.allEvents
-            self.allEvents=[]
+                self.allEvents=[]
         else:
             d=self.deviceByLabel[device_label]
-            r=d.getEvents()
+            if query:
+                r=d.getEvents(query=query)
+            else:
+                r=d.getEvents()
   
         if r:
             if as_type == 'list':
@@ -517,6 +694,11 @@ class ioHubConnection(object):
         if device_label is None or device_label.lower() == 'all':
             self._sendToHubServer(('RPC','clearEventBuffer'))
             self.allEvents=[]
+            if self._streamedEvents:
+                self._streamedEvents.clear()
+            if self._sharedEventBuffers:
+                for ring in self._sharedEventBuffers.itervalues():
+                    ring.clear()
             if device_label and device_label.lower() == 'all':
                 [self.deviceByLabel[label].clearEvents() for label in self.deviceByLabel]
             return True
@@ -571,9 +753,10 @@ class ioHubConnection(object):
                     time.sleep(remainingSec)
                 else:
                     time.sleep(check_hub_interval)
-                    events=self.getEvents()
-                    if events:
-                        self.allEvents.extend(events)
+                    if self._eventStreamReceiver is None and not self._sharedEventBuffers:
+                        events=self.getEvents()
+                        if events:
+                            self.allEvents.extend(events)
                     win32MessagePump()
                 
                 remainingSec=targetEndTime-Computer.currentTime()
@@ -587,6 +770,155 @@ class ioHubConnection(object):
                 
         return Computer.currentTime()-stime
 
+    def enableEventStreaming(self,coalesce=True):
+        """
+        Subscribe to the ioHub Process event stream. Instead of the PsychoPy
+        Process having to request new events from the ioHub Process each
+        time getEvents() is called, events received by the ioHub Process
+        are pushed to the PsychoPy Process as soon as they are available.
+        A background thread receives the pushed events and stores them 
+        until getEvents() is called, so getEvents() no longer requires a 
+        request / reply with the ioHub Process. The wait() method also no 
+        longer needs to check the ioHub Process for events.
+
+        Only events from the ioHub *Global Event Buffer* are streamed; device
+        level getEvents() calls are unaffected.
+        
+        Args:
+            coalesce (bool): If True (the default), events received by the ioHub Process during each iteration of its event processing loop (about 1 msec) are sent together. If False, each event is sent as soon as it is received.
+            
+        Returns:
+            bool: True if event streaming is enabled.
+        """
+        if self._eventStreamReceiver:
+            return True
+
+        if self._streamedEvents is None:
+            self._streamedEvents=deque(maxlen=getattr(self.allEvents,'maxlen',None) or 2048)
+            
+        stream_connection=UDPEventStreamConnection(remote_port=self.udp_client._remote_port)
+        stream_connection.sendTo(('SUBSCRIBE_EVENTS',coalesce))
+        result,address=stream_connection.receiveWithTimeout(1.0)
+        if result is None:
+            stream_connection.close()
+            raise ioHubConnectionException("ioHub Server did not reply to the event stream subscription request.")
+        errorReply=self._isErrorReply(result)
+        if errorReply:
+            stream_connection.close()
+            raise errorReply
+
+        self._eventStreamReceiver=ioHubEventStreamReceiver(stream_connection,self._streamedEvents)
+        self._eventStreamReceiver.start()
+        return True
+
+    def disableEventStreaming(self):
+        """
+        Unsubscribe from the ioHub Process event stream, returning to the 
+        default request / reply based event retrieval. Any events that were
+        streamed but not yet retrieved are returned by the next getEvents() call.
+        
+        Args:
+            None
+            
+        Returns:
+            bool: True if event streaming was enabled, False otherwise.
+        """
+        receiver=self._eventStreamReceiver
+        if receiver is None:
+            return False
+        self._eventStreamReceiver=None
+        try:
+            receiver.connection.sendTo(('UNSUBSCRIBE_EVENTS',))
+            receiver.join(1.0)
+        finally:
+            receiver.running=False
+            receiver.connection.close()
+        if self._streamedEvents:
+            self.allEvents.extend(self._getStreamedEvents())
+        return True
+
+    def isEventStreamingEnabled(self):
+        """
+        Returns True if events are being pushed from the ioHub Process (see
+        enableEventStreaming()), False if events are retrieved by request.
+        """
+        return self._eventStreamReceiver is not None
+
+    def registerEventTrigger(self,device_label,query):
+        """
+        Registers an event trigger with the ioHub Process. The ioHub Process
+        checks each event of the device against the trigger's query as the
+        event is processed, and sends a notification for every event that 
+        matches. Notifications are received by a background thread, so
+        getTriggeredEvents() does not need to communicate with the ioHub 
+        Process, and the time between an event being received by the ioHub
+        Process and the trigger firing does not depend on how often the 
+        PsychoPy Process checks for events.
+        
+        Registering a trigger does not change the events returned by 
+        getEvents().
+        
+        Args:
+            device_label (str): The name of the device whose events are checked.
+            
+            query (dict): The event conditions of the trigger. See iohub.devices.EventQuery for the conditions that can be used.
+            
+        Returns:
+            int: The trigger_id of the new trigger.
+        """
+        if self._triggerReceiver is None:
+            trigger_connection=UDPEventStreamConnection(remote_port=self.udp_client._remote_port)
+            self._triggerReceiver=ioHubTriggerReceiver(trigger_connection,self._firedTriggers)
+            self._triggerReceiver.start()
+        notify_address=self._triggerReceiver.connection.sock.getsockname()
+
+        r=self._sendToHubServer(('RPC','registerEventTrigger',(device_label,query,notify_address)))
+        trigger_id=r[2]
+        self._firedTriggers.setdefault(trigger_id,deque(maxlen=256))
+        return trigger_id
+
+    def unregisterEventTrigger(self,trigger_id):
+        """
+        Removes an event trigger registered with registerEventTrigger(). Any
+        trigger notifications not yet retrieved are discarded.
+        
+        Args:
+            trigger_id (int): The id returned by registerEventTrigger().
+            
+        Returns:
+            bool: True if the trigger was registered, False otherwise.
+        """
+        self._firedTriggers.pop(trigger_id,None)
+        r=self._sendToHubServer(('RPC','unregisterEventTrigger',(trigger_id,)))
+        return r[2]
+
+    def getTriggeredEvents(self,trigger_id):
+        """
+        Returns the events that have fired a trigger since the last call, 
+        as a list of (event, fired_time) tuples in the order the trigger fired.
+        Events are namedtuples; fired_time is the ioHub time the trigger was 
+        evaluated, so fired_time - event.logged_time is the trigger latency
+        within the ioHub Process.
+        
+        No request is sent to the ioHub Process.
+        
+        Args:
+            trigger_id (int): The id returned by registerEventTrigger().
+            
+        Returns:
+            list: (event, fired_time) tuples; empty if the trigger has not fired.
+        """
+        fired=self._firedTriggers.get(trigger_id)
+        if not fired:
+            return []
+        popleft=fired.popleft
+        toNamedTuple=self._eventListToNamedTuple
+        triggered_events=[]
+        for i in xrange(len(fired)):
+            e,fired_time=popleft()
+            triggered_events.append((toNamedTuple(e),fired_time))
+        return triggered_events
+
     def sendMessageEvent(self,text,prefix='',offset=0.0,sec_time=None):
         """
         Create and send an Experiment MessageEvent to the ioHub Server Process 
@@ -775,6 +1107,106 @@ class ioHubConnection(object):
         r=self._sendToHubServer(('RPC','flushIODataStoreFile'))
         print "flushIODataStoreFile: ",r[2]
         return r[2]
+
+    def getDataStoreStats(self):
+        """
+        Returns the event staging statistics of the ioDataStore, as a dict with
+        the following keys:
+            
+        * rows_staged: The number of events given to the ioDataStore to be saved.
+        * rows_written: The number of events that have been appended to the hdf5 file tables.
+        * rows_pending: The number of events currently staged and waiting to be written.
+        * rows_dropped: The number of staged events that were dropped because their table could not be written to (i.e. the disk was full).
+        * write_count: The number of bulk table writes that have been performed.
+        * last_write_duration, max_write_duration, mean_write_duration: sec.msec duration of the bulk table writes.
+
+        Args:
+            None
+        
+        Returns:
+            dict: The ioDataStore statistics, or False if the ioDataStore is not enabled.
+        """
+        r=self._sendToHubServer(('RPC','getDataStoreStats'))
+        return r[2]
+        
+    def getEventArrays(self):
+        """
+        Returns the events received by the ioHub Process since the last call 
+        to getEvents(), getEventArrays(), or clearEvents(), as a dict of numpy
+        structured arrays, keyed by event type id. Each array uses the 
+        NUMPY_DTYPE of the event type's DeviceEvent class.
+
+        getEventArrays() can only be used when the shared memory event 
+        transport is enabled in the ioHub config file 
+        (shared_memory_transport: enable: True). In that case the arrays are
+        normally views of the memory shared with the ioHub Process, so no data
+        is copied when events are retrieved. A view is only valid until the 
+        ioHub Process has received another event_buffer_length events of the 
+        same type, so copy any array that needs to be kept longer than that.
+        
+        Event types with object fields, such as 
+        MultiChannelAnalogInputBlockEvent, have no shared memory buffer and 
+        are not returned by getEventArrays(); use getEvents() for them.
+        
+        Args:
+            None
+            
+        Returns:
+            dict: event type id -> numpy array of events. Event types with no new events are not included.
+        """
+        if not self._sharedEventBuffers:
+            raise ioHubConnectionException("getEventArrays() requires the shared memory event transport to be enabled.")
+        event_arrays=dict()
+        for event_type_id,ring in self._sharedEventBuffers.iteritems():
+            events=ring.read()
+            if events is not None:
+                event_arrays[event_type_id]=events
+        return event_arrays
+        
+    def getDevicePollingStats(self):
+        """
+        Returns the polling statistics of each device that the ioHub Process
+        polls for new events (devices with a device_timer setting). The ioHub
+        Process polls a device every device_timer.interval sec.msec while the
+        device is returning events, and backs off to device_timer.max_interval
+        while the device is idle.
+        
+        Each device's statistics are given as a dict with the following keys:
+            
+        * device_name: The name of the polled device.
+        * poll_count: The number of times the device has been polled.
+        * active_poll_count: The number of polls that returned new events.
+        * event_count: The number of native events returned by the polls.
+        * events_per_poll: event_count / poll_count.
+        * mean_poll_duration, max_poll_duration: sec.msec duration of the device polls.
+        * mean_poll_jitter, max_poll_jitter: sec.msec that polls started later than scheduled.
+        * min_interval, max_interval, current_interval: The polling interval range and the current polling interval.
+
+        Args:
+            None
+        
+        Returns:
+            list: A dict of polling statistics for each polled device.
+        """
+        r=self._sendToHubServer(('RPC','getDevicePollingStats'))
+        return r[2]
+
+    def getStartupTimes(self):
+        """
+        Returns the sec.msec duration of each phase of the ioHub startup, as a
+        dict with the following keys:
+
+        * experiment: An OrderedDict of the experiment process startup phases: config (loading the ioHub config), server_start (from starting the ioHub Process until it is ready), device_list (creating the device views), and total.
+        * server: An OrderedDict of the ioHub Process startup phases: config, datastore, device.[device class name] for each device, event_filters, shared_event_buffers, config_cache_save, start_services, and total. total does not include the time taken to start the python interpreter and import the ioHub Server modules.
+
+        Args:
+            None
+
+        Returns:
+            dict: The experiment process and ioHub Process startup phase durations.
+        """
+        r=self._sendToHubServer(('RPC','getStartupTimes'))
+        return dict(experiment=OrderedDict(self._startupTimes),server=OrderedDict([tuple(p) for p in r[2]]))
         
     def shutdown(self):
         """
@@ -806,10 +1238,12 @@ class ioHubConnection(object):
         """
         experiment_info=None
         session_info=None
-        
+        startup_start_time=phase_start_time=Computer.currentSec()
+
         rootScriptPath = os.path.dirname(sys.argv[0])
 
-        hub_defaults_config=load(file(os.path.join(IO_HUB_DIRECTORY,'default_config.yaml'),'r'), Loader=Loader)
+        config_cache=getConfigCache()
+        hub_defaults_config=config_cache.loadYamlFile(os.path.join(IO_HUB_DIRECTORY,'default_config.yaml'))
 
 
         if ioHubConfigAbsPath is None and ioHubConfig is None:
@@ -829,7 +1263,7 @@ class ioHubConnection(object):
                     sys.exit(1)   
                     
         elif ioHubConfigAbsPath  is not None and ioHubConfig is None:
-            ioHubConfig=load(file(ioHubConfigAbsPath,u'r'), Loader=Loader)
+            ioHubConfig=config_cache.loadYamlFile(ioHubConfigAbsPath)
         else:        
             print2err("ERROR: Both a ioHubConfig dict object AND a path to an ioHubConfig file can not be provided.")
             sys.exit(1)
@@ -854,8 +1288,14 @@ class ioHubConnection(object):
             
         self.udp_client=UDPClientConnection(remote_port=ioHubConfig.get('udp_port',9000))
 
+        # The ioHub Process sends its ready state to this socket as soon as
+        # it can receive requests.
+        ready_socket=socket.socket(socket.AF_INET,socket.SOCK_DGRAM)
+        ready_socket.bind(('127.0.0.1',0))
+
         run_script=os.path.join(IO_HUB_DIRECTORY,'server.py')
-        subprocessArgList=[sys.executable,run_script,"%.6f"%Computer.globalClock.getLastResetTime(),rootScriptPath,ioHubConfigAbsPath]
+        subprocessArgList=[sys.executable,run_script,"%.6f"%Computer.globalClock.getLastResetTime(),rootScriptPath,
+                           ioHubConfigAbsPath,str(ready_socket.getsockname()[1])]
 
         # check for existing ioHub Process based on process if saved to file
         iopFileName=os.path.join(rootScriptPath ,'.iohpid')
@@ -885,52 +1325,24 @@ class ioHubConnection(object):
         if sys.platform == 'darwin':
             self._osxKillAndFreePort()
 
+        config_cache.save()
+        self._startupTimes['config']=Computer.currentSec()-phase_start_time
+
         # start subprocess, get pid, and get psutil process object for affinity and process priority setting
-        self._server_process = subprocess.Popen(subprocessArgList,stdout=subprocess.PIPE)
+        phase_start_time=Computer.currentSec()
+        self._server_process = subprocess.Popen(subprocessArgList)
         Computer.ioHubServerProcessID = self._server_process.pid
         if sys.platform != 'darwin':
             Computer.ioHubServerProcess=psutil.Process(Computer.ioHubServerProcessID)
         else:
             Computer.ioHubServerProcess=self._server_process             
 
-        hubonline=False
-
-        if Computer.system == 'win32':
-            #print 'IOSERVER STARTING UP....'
-            # wait for server to send back 'IOHUB_READY' text over stdout, indicating it is running
-            # and ready to receive network packets
-            server_output='hi there'
-            ctime = Computer.globalClock.getTime
-
-            timeout_time=ctime()+10.0 # timeout if ioServer does not reply in 10 seconds
-            while server_output and ctime()<timeout_time:
-                isDataAvail=self._serverStdOutHasData()
-                if isDataAvail is True:
-                    server_output=self._readServerStdOutLine().next()
-                    if server_output.rstrip() == 'IOHUB_READY':
-                        hubonline=True
-                        #print "Ending Serving connection attempt due to timeout...."
-                        break
-                    elif server_output.rstrip() == 'IOHUB_FAILED':
-                        print "ioHub Failed to start, exiting...."
-                        time.sleep(0.25)
-                        sys.exit(1)
+        try:
+            hubonline=self._waitForServerReady(ready_socket,ioHubConfig.get('server_start_timeout',30.0))
+        finally:
+            ready_socket.close()
+        self._startupTimes['server_start']=Computer.currentSec()-phase_start_time
 
-                        
-                else:
-                    time.sleep(0.0001)
-        else:
-            r="hi"
-            while r:
-                r=self._server_process.stdout.readline()
-                if r and r.rstrip().strip() == 'IOHUB_READY':
-                    hubonline=True
-                    break
-                elif r and r.rstrip().strip() == 'IOHUB_FAILED':
-                    print "ioHub sent IOHUB_FAILED, exiting...."
-                    time.sleep(0.25)
-                    sys.exit(1)
-        
         # If ioHub server did not repond correctly, terminate process and exit the program.
         if hubonline is False:
             print "ioHub could not be contacted, exiting...."
@@ -970,56 +1382,49 @@ class ioHubConnection(object):
         # device if the default name was being used.
         #print 'Creating Experiment Process Device List.......'
         
+        phase_start_time=Computer.currentSec()
         try:
             self._createDeviceList(ioHubConfig['monitor_devices'])
         except Exception as e:
             print "Errror in _createDeviceList: ",str(e)  
+        self._startupTimes['device_list']=Computer.currentSec()-phase_start_time
+
+        if ioHubConfig.get('shared_memory_transport',{}).get('enable',False) is True:
+            try:
+                self._openSharedEventBuffers()
+            except:
+                print2err("Error opening shared memory event buffers.")
+                printExceptionDetailsToStdErr()
+                self._sharedEventBuffers=None
+        self._startupTimes['total']=Computer.currentSec()-startup_start_time
         #print 'Created Experiment Process Device List'
                     
-    def _get_maxsize(self, maxsize):
-        """
-        Used by _startServer pipe reader code.
-        """
-        if maxsize is None:
-            maxsize = 1024
-        elif maxsize < 1:
-            maxsize = 1
-        return maxsize
-
-
-    def _serverStdOutHasData(self, maxsize=256):
-        """
-        Used by _startServer pipe reader code. Allows for async check for data on pipe in windows.
-        """
-        if Computer.system == 'win32':        
-            #  >> WIN32_ONLY
-            import msvcrt
-            from win32pipe import PeekNamedPipe
-    
-            maxsize = self._get_maxsize(maxsize)
-            conn=self._server_process.stdout
-    
-            if conn is None:
-                return False
+    def _waitForServerReady(self,ready_socket,timeout):
+        """
+        Used by _startServer. Waits for the ioHub Process to send its ready
+        state to ready_socket. Returns True when IOHUB_READY is received, and
+        False if the ioHub Process exits, or has not replied within timeout
+        sec.msec. Exits the program if IOHUB_FAILED is received.
+        """
+        ctime = Computer.globalClock.getTime
+        timeout_time=ctime()+timeout
+        # the socket timeout sets how often the ioHub Process is checked
+        # for having exited without sending its ready state.
+        ready_socket.settimeout(0.05)
+        while ctime()<timeout_time:
             try:
-                x = msvcrt.get_osfhandle(conn.fileno())
-                (read, nAvail, nMessage) = PeekNamedPipe(x, 0)
-                if maxsize < nAvail:
-                    nAvail = maxsize
-                if nAvail > 0:
-                    return True
-            # << WIN32_ONLY
-            except Exception as e:
-                raise ioHubConnectionException(e)
-        else:
-            return True
-            
-    def _readServerStdOutLine(self):
-        """
-        Used by _startServer pipe reader code. Reads a line from the ioHub server stdout. This is blocking.
-        """
-        for line in iter(self._server_process.stdout.readline, ''):
-            yield line
+                ready_state=ready_socket.recv(64).strip()
+            except socket.timeout:
+                if self._server_process.poll() is not None:
+                    return False
+                continue
+            if ready_state == 'IOHUB_READY':
+                return True
+            elif ready_state == 'IOHUB_FAILED':
+                print "ioHub sent IOHUB_FAILED, exiting...."
+                time.sleep(0.25)
+                sys.exit(1)
+        return False
 
     def _createDeviceList(self,monitor_devices_config):
         """
@@ -1090,45 +1495,102 @@ class ioHubConnection(object):
         the PsychoPy Process to the ioHub Process, and then wait for the reply
         from the ioHub Process before returning.
 
-        The ioHubConnection currently blocks until the request is fulfilled and
-        and a response is received from the ioHub server.
+        The message is sent using _submitToHubServer(), so it has a ticket id
+        and is retransmitted if the request or reply datagram is lost.
+
+        Args:
+            messageList (tuple): ioHub Server Message to send.
 
-        TODO: An aysnc. version could be added if desired. 
+        Return (object): the message response from the ioHub Server process.
+        """
+        return self._submitToHubServer(ioHubMessage).result()
 
-        Instead of using callbacks, I prefer the idea of the client sending a
-        request and getting a request ticket # back from the ioHub server
-        right away, indicating that the job has been submitted for processing.
-        The ioHubConnection can then ask the ioHub Server for the status of the
-        job ticket based on ticket number.
+    def _submitToHubServer(self,ioHubMessage,result_handler=None):
+        """
+        Send a message to the ioHub Process without waiting for the reply.
         
-        When the ticket number result is ready, it is sent back as the reply to
-        the status request. This **aysnc. mode will be necessary** when the 
-        worker process is added to the ioHub framework to handle long running 
-        job requests from the PsychoPy process; for example to load an image
-        into a shared memory space, perform long running computations, etc.
+        The message is sent as ('TICKET', ticket_id, message), and the ioHub
+        Process replies with ('TICKET_RESULT', ticket_id, reply).
 
         Args:
             messageList (tuple): ioHub Server Message to send.
+            
+            result_handler (callable): Optional function called with the reply by ioHubRequestTicket.result().
 
-        Return (object): the message response from the ioHub Server process.
+        Return (ioHubRequestTicket): the ticket for the request.
         """
+        self._lastTicketID+=1
+        ticket=ioHubRequestTicket(self,self._lastTicketID,ioHubMessage,result_handler)
+        self._pendingTickets[ticket.ticket_id]=ticket
+        self._sendTicket(ticket)
+        return ticket
 
-        # send request to host, return is # bytes sent.
-        bytes_sent=self.udp_client.sendTo(ioHubMessage)
-
-        # wait for response from ioHub server, return is result ( decoded already ), and Hub address (ip4,port).
-        result,address=self.udp_client.receive()
+    def getRequestResults(self,tickets,timeout=None):
+        """
+        Returns the results of a list of ioHubRequestTickets, as returned by
+        DeviceRPC.submit(), in the same order as the tickets.
 
-        # store result received in an address based dictionary (incase we ever support multiple ioHub Servers)
-        ioHubConnection._addResponseToHistory(result,bytes_sent,address)
+        Args:
+            tickets (list): The ioHubRequestTickets to get the results of.
+            
+            timeout (float): The maximum sec.msec to wait for all the replies. None (the default) waits until they are received.
 
-        # check if the reply is an error or not. If it is, raise the error.
-        errorReply=self._isErrorReply(result)
-        if errorReply:
-            raise errorReply
+        Returns:
+            list: The result of each request.
+        """
+        if timeout is not None:
+            end_time=Computer.getTime()+timeout
+            return [t.result(max(end_time-Computer.getTime(),0.0)) for t in tickets]
+        return [t.result() for t in tickets]
+
+    def _sendTicket(self,ticket):
+        ticket._bytes_sent=self.udp_client.sendTo(('TICKET',ticket.ticket_id,ticket.message))
+        ticket._send_time=Computer.getTime()
+        ticket._send_count+=1
+
+    def _waitForTicket(self,ticket,timeout=None):
+        """
+        Receive replies from the ioHub Process until the reply for ticket has
+        been received, retransmitting any pending requests that have not had
+        a reply within RPC_RETRANSMIT_INTERVAL. Raises an
+        ioHubConnectionException if timeout sec.msec pass, or if ticket has
+        been retransmitted RPC_MAX_RETRANSMITS times, without a reply.
+        """
+        start_time=Computer.getTime()
+        while ticket._done is False:
+            wait_time=self.RPC_RETRANSMIT_INTERVAL
+            if timeout is not None:
+                remaining=timeout-(Computer.getTime()-start_time)
+                if remaining <= 0.0:
+                    raise ioHubConnectionException("No reply received from the ioHub Server for request %d within %.3f sec."%(ticket.ticket_id,timeout))
+                wait_time=min(wait_time,remaining)
+
+            result,address=self.udp_client.receiveWithTimeout(wait_time)
+            if result is None:
+                self._retransmitPendingTickets()
+                if (ticket._send_count > self.RPC_MAX_RETRANSMITS and
+                        Computer.getTime()-ticket._send_time >= self.RPC_RETRANSMIT_INTERVAL):
+                    self._pendingTickets.pop(ticket.ticket_id,None)
+                    raise ioHubConnectionException("No reply received from the ioHub Server for request %d after %d retransmits."%(ticket.ticket_id,self.RPC_MAX_RETRANSMITS))
+            elif result[0] == 'TICKET_PENDING':
+                # the ioHub Process is still handling the request.
+                pending_ticket=self._pendingTickets.get(result[1])
+                if pending_ticket:
+                    pending_ticket._send_time=Computer.getTime()
+                    pending_ticket._send_count=1
+            elif result[0] == 'TICKET_RESULT':
+                replied_ticket=self._pendingTickets.pop(result[1],None)
+                if replied_ticket:
+                    ioHubConnection._addResponseToHistory(result[2],replied_ticket._bytes_sent,address)
+                    replied_ticket._setReply(result[2])
+            else:
+                print2err("Warning: ioHubConnection received a reply without a ticket id: ",result)
 
-        #Otherwise return the result
-        return result
+    def _retransmitPendingTickets(self):
+        resend_time=Computer.getTime()-self.RPC_RETRANSMIT_INTERVAL
+        for ticket in self._pendingTickets.values():
+            if ticket._send_time <= resend_time and ticket._send_count <= self.RPC_MAX_RETRANSMITS:
+                self._sendTicket(ticket)
 
     @classmethod
     def _addResponseToHistory(cls,result,bytes_sent,address):
@@ -1199,20 +1661,128 @@ class ioHubConnection(object):
         self._sessionMetaData=sessionInfoDict
         return sessionInfoDict['session_id']
         
-    def _getEvents(self):
+    def _getEvents(self,query=None):
         """
         Sends a request to the ioHub Server for any new device events from the global server event buffer.
-        The events are returned and the global ioHub server event buffer is cleared.
+        The events are returned and the global ioHub server event buffer is cleared. If a query
+        is given, only the events matching the query are returned and removed from the buffer.
 
-        Args: None
+        Args: 
+            query (dict): optional EventQuery conditions.
         Return(tuple): list of events, or empty list if no events have occurred since last call
               to getEvents() or clearEvents(). Each event in the list is a tuple containing the ordered
               attributes of the event constructor.
         """
-        r = self._sendToHubServer(('GET_EVENTS',))
+        if query:
+            r = self._sendToHubServer(('GET_EVENTS','list',query))
+        else:
+            r = self._sendToHubServer(('GET_EVENTS',))
         return r[1]
 
 
+    def _openSharedEventBuffers(self):
+        """
+        Opens a reader for each of the shared memory event buffers created
+        by the ioHub Server.
+        """
+        r=self._sendToHubServer(('RPC','getSharedEventBufferInfo'))
+        ring_info,unshared_event_types=r[2]
+        shared_buffers=dict()
+        for event_type_id,file_path in ring_info:
+            event_class=EventConstants.getClass(event_type_id)
+            shared_buffers[event_type_id]=SharedEventRingBuffer(file_path,event_class.NUMPY_DTYPE)
+        # any events received before the shared buffers were activated are
+        # still in the ioHub Server global event buffer.
+        events=self._getEvents()
+        if events:
+            self.allEvents.extend(events)
+        self._unsharedEventTypes=tuple(unshared_event_types)
+        self._sharedEventBuffers=shared_buffers
+
+    def _closeSharedEventBuffers(self):
+        shared_buffers=self._sharedEventBuffers
+        self._sharedEventBuffers=None
+        if shared_buffers:
+            for ring in shared_buffers.itervalues():
+                ring.close()
+
+    def _getSharedMemoryEvents(self):
+        """
+        Returns any events written to the shared memory event buffers by the
+        ioHub Server since the last call, and any events of monitored types
+        that have no shared buffer, which are requested from the ioHub Server,
+        as event value lists ordered by event_id. Returns None if there are
+        no new events.
+        """
+        events=[]
+        if self._unsharedEventTypes:
+            events.extend(self._getEvents() or [])
+        for event_arrays in self.getEventArrays().itervalues():
+            events.extend(list(e) for e in event_arrays.tolist())
+        if not events:
+            return None
+        events.sort(key=itemgetter(DeviceEvent.EVENT_ID_INDEX))
+        return events
+
+    def _getEventArrays(self,device_label=None,query=None):
+        """
+        Implements getEvents(as_type='numpy').
+        """
+        if device_label is not None:
+            if query:
+                return self.deviceByLabel[device_label].getEvents(asType='numpy',query=query)
+            return self.deviceByLabel[device_label].getEvents(asType='numpy')
+
+        event_arrays=dict()
+        if query:
+            events=None
+            if self._sharedEventBuffers:
+                events=self._getSharedMemoryEvents()
+            elif self._eventStreamReceiver:
+                events=self._getStreamedEvents()
+            else:
+                r=self._sendToHubServer(('GET_EVENTS','numpy',query))
+                event_arrays=unpackEventArrays(r[1])
+            if events:
+                self.allEvents.extend(events)
+            # events already held locally are older than the ones just retrieved.
+            matched,self.allEvents=EventQuery(query).split(self.allEvents)
+            if matched:
+                event_arrays=mergeEventArrays(eventListsToArrays(matched),event_arrays)
+            return event_arrays
+
+        if self._sharedEventBuffers:
+            if self._unsharedEventTypes:
+                r=self._sendToHubServer(('GET_EVENTS','numpy'))
+                event_arrays=unpackEventArrays(r[1])
+            event_arrays=mergeEventArrays(event_arrays,self.getEventArrays())
+        elif self._eventStreamReceiver:
+            events=self._getStreamedEvents()
+            if events:
+                self.allEvents.extend(events)
+        else:
+            r=self._sendToHubServer(('GET_EVENTS','numpy'))
+            event_arrays=unpackEventArrays(r[1])
+
+        if self.allEvents:
+            # events already held locally are older than the ones just retrieved.
+            event_arrays=mergeEventArrays(eventListsToArrays(self.allEvents),event_arrays)
+            self.allEvents=[]
+        return event_arrays
+
+    def _getStreamedEvents(self):
+        """
+        Returns any events that have been pushed by the ioHub Server since
+        the last call, removing them from the streamed events deque.
+        Returns None if no events have been received.
+        """
+        streamed_events=self._streamedEvents
+        event_count=len(streamed_events)
+        if event_count == 0:
+            return None
+        popleft=streamed_events.popleft
+        return [popleft() for i in xrange(event_count)]
+
     @staticmethod
     def _eventListToObject(eventValueList):
         """
@@ -1267,6 +1837,15 @@ class ioHubConnection(object):
                 TimeoutError=psutil.TimeoutExpired
                 
             try:
+                self._closeSharedEventBuffers()
+                if self._eventStreamReceiver:
+                    self._eventStreamReceiver.running=False
+                    self._eventStreamReceiver.connection.close()
+                    self._eventStreamReceiver=None
+                if self._triggerReceiver:
+                    self._triggerReceiver.running=False
+                    self._triggerReceiver.connection.close()
+                    self._triggerReceiver=None
                 self.udp_client.sendTo(('STOP_IOHUB_SERVER',))
                 self.udp_client.close()
                 if Computer.ioHubServerProcess:
@@ -1342,6 +1921,7 @@ def launchHubServer(**kwargs):
     * experiment_code: The label being used for the experiment being run.
     * session_code: A unique session code for the current run of the experiment.
     * psychopy_monitor_name: The name of the PsychoPy Monitor settings file that should be used to define physical characteristics of the ioHub Display device being created.
+    * datastore_settings: A dict of ioHub DataStore settings, such as flush_interval, that should be changed from the DataStore defaults. Only used when the DataStore is enabled.
     * Any valid ioHub Device class names: Each class name would be given as a kwarg label, and the value of the kwarg must be a dict object containing the Device Configuration Settings that need to be changed from ioHub Device type defaults. 
     
     Device class name kwarg value dictionaries must be properly formatted and contain valid
@@ -1483,6 +2063,8 @@ def launchHubServer(**kwargs):
     if psychopy_monitor_name:
         del kwargs['psychopy_monitor_name']
 
+    datastore_settings=kwargs.pop('datastore_settings',None)
+
     device_dict=kwargs
     
     device_list=[]
@@ -1521,7 +2103,7 @@ def launchHubServer(**kwargs):
     
     # Add remaining defined devices to the device list.
     for class_name,device_config in device_dict.iteritems():
-        device_list.append(dict(class_name=device_config))
+        device_list.append({class_name:device_config})
 
     # Create an ioHub configuration dictionary.
     ioConfig=dict(monitor_devices=device_list)
@@ -1530,6 +2112,8 @@ def launchHubServer(**kwargs):
         # Enable saving of all keyboard and mouse events to the 'ioDataStore'
         ioConfig['data_store']=dict(enable=True,experiment_info=dict(code=experiment_code),
                                             session_info=dict(code=session_code))
+        if datastore_settings:
+            ioConfig['data_store'].update(datastore_settings)
     
     # Start the ioHub Server
     return ioHubConnection(ioConfig)
@@ -1610,7 +2194,7 @@ class ioHubExperimentRuntime(object):
 
         # load the experiment config settings from the experiment_config.yaml file.
         # The file must be in the same directory as the experiment script.
-        self.configuration=load(file( os.path.join(self.configFilePath,self.configFileName),u'r'), Loader=Loader)
+        self.configuration=getConfigCache().loadYamlFile(os.path.join(self.configFilePath,self.configFileName))
 
         import random
         random.seed(Computer.getTime()*1000.123)
@@ -1827,8 +2411,9 @@ class ioHubExperimentRuntime(object):
         Merges two iohub configuration files into one and saves it to a file 
         using the path/file name in merged_save_to_path.
         """        
-        base_config=load(file(base_config_file_path,'r'), Loader=Loader)
-        update_from_config=load(file(update_from_config_file_path,'r'), Loader=Loader)
+        config_cache=getConfigCache()
+        base_config=config_cache.loadYamlFile(base_config_file_path)
+        update_from_config=config_cache.loadYamlFile(update_from_config_file_path)
 
 
         def merge(update, base):
@@ -1848,6 +2433,11 @@ class ioHubExperimentRuntime(object):
             return update
             
         import copy        
+        from yaml import dump
+        try:
+            from yaml import CDumper as Dumper
+        except ImportError:
+            from yaml import Dumper
         merged=merge(copy.deepcopy(update_from_config),base_config)        
         dump(merged,file(merged_save_to_path,'w'), Dumper=Dumper)
 
@@ -1933,6 +2523,7 @@ class ioHubExperimentRuntime(object):
                         display_id=0
                         if display_device:
                             display_id=display_device.getIndex()
+                        from .util.dialogs import MessageDialog
                         msg_dialog=MessageDialog(
                                         "Session Code {0} is already in use by the experiment.\nPlease enter a new Session Code".format(tempdict['code']),
                                         "Session Code In Use",
@@ -2020,6 +2611,7 @@ class ioHubExperimentRuntime(object):
         #print 'self.experimentConfig:', self.experimentConfig
         #print 'self._experimentConfigKeys:',self._experimentConfigKeys
 
+        from psychopy import gui
         experimentDlg=gui.DlgFromDict(self.experimentConfig, 'Experiment Launcher', self._experimentConfigKeys, self._experimentConfigKeys, {})
         if experimentDlg.OK:
             result= False
@@ -2036,6 +2628,7 @@ class ioHubExperimentRuntime(object):
         attributes that have been defined in the experiment configuration file. If OK is selected in the dialog,
         the experiment logic continues, otherwise the experiment session is terminated.
         """      
+        from psychopy import gui
         sessionDlg=gui.DlgFromDict(allSessionDialogVariables, 'Experiment Session Settings', [], sessionVariableOrder)
         result=None        
         if sessionDlg.OK:
@@ -2050,6 +2643,7 @@ class ioHubExperimentRuntime(object):
         if self.hub:
             self.hub._shutDownServer()
         # terminate psychopy
+        from psychopy import core
         core.quit()
 
     def __del__(self):
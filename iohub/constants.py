@@ -123,6 +123,7 @@ try:
         GAMEPAD_DISCONNECT=82
     
         MULTI_CHANNEL_ANALOG_INPUT=122
+        MULTI_CHANNEL_ANALOG_INPUT_BLOCK=123
     
         MESSAGE=151
         LOG=152
@@ -190,6 +191,9 @@ try:
         
             #: Constant for an Eight Channel Analog Input Sample Event.
             MULTI_CHANNEL_ANALOG_INPUT=122
+
+            #: Constant for a Multi Channel Analog Input Block Event.
+            MULTI_CHANNEL_ANALOG_INPUT_BLOCK=123
         
             #: Constant for an Experiment Message Event.
             MESSAGE=151
@@ -256,6 +260,7 @@ try:
         EXPERIMENT = 150
         DISPLAY = 190
         COMPUTER = 200
+        REPLAY = 210
 
         def __init__(self):
             # just so Sphinx will doc the class attributes. ;(
@@ -288,6 +293,9 @@ try:
 
             #: Constant for a Computer Device.
             COMPUTER = 200
+
+            #: Constant for a Replay Device.
+            REPLAY = 210
     
             
         @classmethod
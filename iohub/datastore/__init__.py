@@ -13,6 +13,9 @@ Distributed under the terms of the GNU General Public License (GPL version 3 or
 """
 import os, atexit
 
+import gevent
+from gevent import Greenlet
+
 import tables
 from tables import *
 from tables import parameters
@@ -23,6 +26,7 @@ from iohub import printExceptionDetailsToStdErr, print2err, ioHubError
 import iohub.devices as D
 from iohub.devices import  DeviceEvent, Computer
 from iohub.constants import EventConstants
+from iohub.datastore.util import BLOCK_SAMPLES_ARRAY_SUFFIX, BLOCK_SAMPLE_INDEX_COLUMN, getBlockSamplesArray
 
 parameters.MAX_NUMEXPR_THREADS=None
 """The maximum number of threads that PyTables should use internally in
@@ -40,6 +44,18 @@ cores in your machine or, when your machine has many of them (e.g. > 4),
 perhaps one less than this.  < S. Simpson Note: These are 'not' GIL bound
 threads and therefore actually improve performance > """
 
+# Event table columns that are indexed when the ioDataStore file is closed.
+INDEXED_EVENT_COLUMNS=('session_id','type','time')
+
+# The storage settings of an event table that are not given in the 
+# table_storage datastore settings, for the table or as the default.
+DEFAULT_TABLE_STORAGE=dict(complib='zlib',complevel=0,shuffle=False,fletcher32=False,
+                           expectedrows=10000,samples_expectedrows=1000000,
+                           chunkshape=None,session_length=3600.0)
+# expectedrows setting value that sets the expected rows of a table to the
+# sampling rate of the device * the session_length setting.
+SAMPLING_RATE_EXPECTED_ROWS='sampling_rate'
+
 DATA_FILE_TITLE="ioHub Experiment Data File"
 FILE_VERSION = '0.7.0 Beta'
 SCHEMA_AUTHORS='Sol Simpson'
@@ -60,9 +76,28 @@ class ioHubpyTablesFile():
         
         self.flushCounter=self.settings.get('flush_interval',32)
         self._eventCounter=0
+
+        # Events are staged in a preallocated numpy array per event table
+        # and appended to the table in bulk by the DataStoreWriter greenlet,
+        # instead of one table.append() per event on the event processing path.
+        staging_settings=self.settings.get('event_staging',{})
+        self._stagingBufferLength=staging_settings.get('buffer_length',512)
+        self._stagingWriteInterval=staging_settings.get('write_interval',0.025)
+        self._stagingBuffers=dict()
+        self._stagingStats=dict(rows_staged=0,rows_written=0,rows_dropped=0,write_count=0,
+                                last_write_duration=0.0,max_write_duration=0.0,
+                                total_write_duration=0.0)
+        self._writer=None
+
+        # Event tables written to during the session get column indexes on
+        # the INDEXED_EVENT_COLUMNS when the file is closed.
+        self._indexEventTables=self.settings.get('index_event_tables',True)
         
         self.TABLES=dict()
         self._eventGroupMappings=dict()
+        # table label -> storage settings of the event table; see
+        # getTableStorage().
+        self._tableStorage=dict()
         self.emrtFile = openFile(self.filePath, mode = fmode)
                
         atexit.register(close_open_data_files, False)
@@ -72,24 +107,52 @@ class ioHubpyTablesFile():
             self.flush()
         else:
             self.loadTableMappings()
+
+        if self._stagingWriteInterval > 0.0:
+            self._writer=DataStoreWriter(self,self._stagingWriteInterval)
+            self._writer.start()
     
     def updateDataStoreStructure(self,device_instance,event_class_dict):
-        dfilter = Filters(complevel=0, complib='zlib', shuffle=False, fletcher32=False)
-        
         def eventTableLabel2ClassName(event_table_label):
             tokens=str(event_table_label[0]+event_table_label[1:].lower()+'Event').split('_') 
             return ''.join([t[0].upper()+t[1:] for t in tokens])
 
+        sampling_rate=getDeviceSamplingRate(device_instance.getConfiguration())
         for event_cls_name,event_cls in event_class_dict.iteritems():
             if event_cls.IOHUB_DATA_TABLE:
                 event_table_label=event_cls.IOHUB_DATA_TABLE
+                if event_table_label not in self._tableStorage:
+                    self._tableStorage[event_table_label]=self.getTableStorage(event_table_label,sampling_rate)
                 if event_table_label not in self.TABLES:
-                    self.TABLES[event_table_label]=self.emrtFile.createTable(self._eventGroupMappings[event_table_label],eventTableLabel2ClassName(event_table_label),event_cls.NUMPY_DTYPE, title="%s %s Data"%(device_instance.__class__.__name__,eventTableLabel2ClassName(event_table_label)),filters=dfilter.copy())
+                    storage=self._tableStorage[event_table_label]
+                    self.TABLES[event_table_label]=self.emrtFile.createTable(self._eventGroupMappings[event_table_label],eventTableLabel2ClassName(event_table_label),getEventTableDtype(event_cls), title="%s %s Data"%(device_instance.__class__.__name__,eventTableLabel2ClassName(event_table_label)),
+                                                                            filters=storage['filters'],expectedrows=storage['expectedrows'],chunkshape=storage['chunkshape'])
                     self.flush()
     
                 self.addClassMapping(event_cls,self.TABLES[event_table_label])
 
 
+    def getTableStorage(self,event_table_label,sampling_rate=None):
+        """
+        Returns the storage settings used to create the event table with the
+        event_table_label, from the table_storage datastore settings, as a 
+        dict with the following keys:
+
+        * filters: The tables.Filters (compression) of the table.
+        * expectedrows: The number of rows the table is expected to hold; PyTables picks the table chunk size from it.
+        * samples_expectedrows: The number of rows the samples array of a block event table is expected to hold.
+        * chunkshape: The number of rows per table chunk, or None to let PyTables choose.
+
+        Expected rows settings of 'sampling_rate' are the sampling_rate of the
+        device (in Hz) * session_length; if the device has no sampling_rate,
+        the DEFAULT_TABLE_STORAGE value is used.
+        """
+        table_storage=self.settings.get('table_storage') or {}
+        settings=dict(DEFAULT_TABLE_STORAGE)
+        settings.update(table_storage.get('default') or {})
+        settings.update(table_storage.get(event_table_label) or {})
+        return createTableStorage(settings,sampling_rate,event_table_label)
+
     def loadTableMappings(self):
         # create meta-data tables
         
@@ -143,6 +206,12 @@ class ioHubpyTablesFile():
             # Just means the table for this event type has not been created as the event type is not being recorded
             pass
 
+        try:
+            self.TABLES['MULTI_CHANNEL_ANALOG_INPUT_BLOCK']=self.emrtFile.root.data_collection.events.analog_input.MultiChannelAnalogInputBlockEvent
+        except:
+            # Just means the table for this event type has not been created as the event type is not being recorded
+            pass
+
         try:
             self.TABLES['MONOCULAR_EYE_SAMPLE']=self.emrtFile.root.data_collection.events.eyetracker.MonocularEyeSampleEvent
         except:
@@ -232,6 +301,7 @@ class ioHubpyTablesFile():
         self._eventGroupMappings['MOUSE_INPUT']=self.emrtFile.root.data_collection.events.mouse
         self._eventGroupMappings['GAMEPAD_STATE_CHANGE']=self.emrtFile.root.data_collection.events.gamepad
         self._eventGroupMappings['MULTI_CHANNEL_ANALOG_INPUT']=self.emrtFile.root.data_collection.events.analog_input
+        self._eventGroupMappings['MULTI_CHANNEL_ANALOG_INPUT_BLOCK']=self.emrtFile.root.data_collection.events.analog_input
         self._eventGroupMappings['MESSAGE']=self.emrtFile.root.data_collection.events.experiment
         self._eventGroupMappings['LOG']=self.emrtFile.root.data_collection.events.experiment
         self._eventGroupMappings['MONOCULAR_EYE_SAMPLE']=self.emrtFile.root.data_collection.events.eyetracker
@@ -374,14 +444,11 @@ class ioHubpyTablesFile():
 #            print2err("*** ",DeviceEvent.EVENT_TYPE_ID_INDEX, '_handleEvent: ',etype,' : event list: ',event)
             eventClass=EventConstants.getClass(etype)
                 
-            etable=self.TABLES[eventClass.IOHUB_DATA_TABLE]
             event[DeviceEvent.EVENT_EXPERIMENT_ID_INDEX]=self.active_experiment_id
             event[DeviceEvent.EVENT_SESSION_ID_INDEX]=self.active_session_id
 
-            np_array= N.array([tuple(event),],dtype=eventClass.NUMPY_DTYPE)
-            etable.append(np_array)
-
-            self.bufferedFlush()
+            self._getStagingBuffer(eventClass).append(event)
+            self._stagingStats['rows_staged']+=1
 
         except:
             print2err("Error saving event: ",event)
@@ -401,26 +468,98 @@ class ioHubpyTablesFile():
             etype=event[DeviceEvent.EVENT_TYPE_ID_INDEX]
             #ioHub.print2err("etype: ",etype)
             eventClass=EventConstants.getClass(etype)
-            etable=self.TABLES[eventClass.IOHUB_DATA_TABLE]
-            #ioHub.print2err("eventClass: etable",eventClass,etable)
+            sbuffer=self._getStagingBuffer(eventClass)
 
-            np_events=[]
             for event in events:
                 event[DeviceEvent.EVENT_EXPERIMENT_ID_INDEX]=self.active_experiment_id
                 event[DeviceEvent.EVENT_SESSION_ID_INDEX]=self.active_session_id
-                np_events.append(tuple(event))
+                sbuffer.append(event)
 
-            np_array= N.array(np_events,dtype=eventClass.NUMPY_DTYPE)
-            #ioHub.print2err('np_array:',np_array)
-            etable.append(np_array)
-
-            self.bufferedFlush(len(np_events))
+            self._stagingStats['rows_staged']+=len(events)
 
         except ioHubError, e:
             print2err(e)
         except:
             printExceptionDetailsToStdErr()
 
+    def _getStagingBuffer(self,eventClass):
+        table_label=eventClass.IOHUB_DATA_TABLE
+        sbuffer=self._stagingBuffers.get(table_label)
+        if sbuffer is None:
+            # Stage rows using the dtype of the existing table, so events can
+            # still be appended to files created before the event time
+            # columns were changed to float64, or before the 
+            # MultiChannelAnalogInputEvent channel count was increased to 16.
+            etable=self.TABLES[table_label]
+            if etable.dtype != getEventTableDtype(eventClass):
+                print2err("WARNING: ioDataStore table %s does not use the current event schema; "
+                          "event times may be saved with reduced precision, and event fields "
+                          "missing from the table are not saved. "
+                          "See iohub.datastore.util.upgradeEventTimeColumns()."%(table_label))
+            if self._indexEventTables:
+                # indexes are updated once when the file is closed, not on
+                # every staged write; see _indexEventTables().
+                etable.autoIndex=False
+            block_field=getattr(eventClass,'IOHUB_BLOCK_FIELD',None)
+            if block_field is None:
+                sbuffer=EventTableBuffer(self,etable,
+                                         etable.dtype,
+                                         self._stagingBufferLength)
+            else:
+                storage=self._tableStorage.get(table_label) or self.getTableStorage(table_label)
+                sbuffer=EventBlockTableBuffer(self,etable,
+                                              etable.dtype,
+                                              self._stagingBufferLength,
+                                              eventClass.CLASS_ATTRIBUTE_NAMES.index(block_field),
+                                              storage['samples_expectedrows'])
+            self._stagingBuffers[table_label]=sbuffer
+        return sbuffer
+
+    def writeStagedEvents(self):
+        """
+        Append all events currently staged in the event table buffers to
+        their hdf5 tables, and flush the file based on the flush_interval
+        setting. Returns the number of rows written.
+        """
+        row_count=self._writeStagingBuffers()
+        if row_count > 0:
+            self.bufferedFlush(row_count)
+        return row_count
+
+    def _writeStagingBuffers(self):
+        if not self._stagingBuffers:
+            return 0
+        stime=Computer.getTime()
+        row_count=0
+        for sbuffer in self._stagingBuffers.itervalues():
+            row_count+=sbuffer.write()
+        if row_count > 0:
+            self._updateWriteStats(row_count,Computer.getTime()-stime)
+        return row_count
+
+    def _updateWriteStats(self,row_count,duration):
+        stats=self._stagingStats
+        stats['rows_written']+=row_count
+        stats['write_count']+=1
+        stats['last_write_duration']=duration
+        stats['total_write_duration']+=duration
+        if duration > stats['max_write_duration']:
+            stats['max_write_duration']=duration
+
+    def getStagingStats(self):
+        """
+        Returns a dict of the event staging counters: rows_staged, rows_written,
+        rows_pending, rows_dropped, write_count, and the last, max, and mean write durations
+        in sec.msec.
+        """
+        stats=dict(self._stagingStats)
+        stats['rows_pending']=sum([len(b) for b in self._stagingBuffers.itervalues()])
+        if stats['write_count'] > 0:
+            stats['mean_write_duration']=stats['total_write_duration']/stats['write_count']
+        else:
+            stats['mean_write_duration']=0.0
+        return stats
+
     def bufferedFlush(self,eventCount=1):
         # if flushCounter threshold is >=0 then do some checks. If it is < 0, then
         # flush only occurs when command is sent to ioHub, so do nothing here.
@@ -439,6 +578,7 @@ class ioHubpyTablesFile():
     def flush(self):
         try:
             if self.emrtFile:
+                self._writeStagingBuffers()
                 self.emrtFile.flush()
         except ClosedFileError:
             pass
@@ -446,18 +586,252 @@ class ioHubpyTablesFile():
             printExceptionDetailsToStdErr()
 
     def close(self):
+        if self._writer:
+            self._writer.running=False
+            self._writer=None
         self.flush()
+        if self._indexEventTables:
+            self.indexEventTables()
         self._activeRunTimeConditionVariableTable=None
         self.emrtFile.close()
         
+    def indexEventTables(self):
+        """
+        Create (or update) the column indexes of the event tables that
+        events were saved to during the session.
+        """
+        for sbuffer in self._stagingBuffers.itervalues():
+            etable=sbuffer.table
+            try:
+                for column_name in INDEXED_EVENT_COLUMNS:
+                    column=getattr(etable.cols,column_name)
+                    if column.is_indexed is False:
+                        column.createIndex()
+                etable.reIndexDirty()
+                etable.flush()
+            except:
+                print2err("Error creating indexes for ioDataStore table: ",etable._v_pathname)
+                printExceptionDetailsToStdErr()
+
     def __del__(self):
         try:
             self.close()
         except:
             pass    
 
+class EventTableBuffer(object):
+    """
+    A preallocated numpy structured array, using the dtype of the table,
+    that events for one DataStore table are copied into until the
+    DataStoreWriter appends the staged rows to the table in a single call.
+    If the buffer becomes full before the next scheduled write, the staged
+    rows are written to the table right away. If that write fails (i.e. the
+    disk is full), the error is logged and the oldest half of the staged 
+    rows is dropped when the next event is appended, so later events can
+    still be staged, and written once the table can be written to again.
+    """
+    def __init__(self,datastore,table,np_dtype,length):
+        self.datastore=datastore
+        self.table=table
+        self._rows=N.zeros(length,dtype=np_dtype)
+        self._length=length
+        self._count=0
+        # the number of event fields the table has; events with more fields
+        # (i.e. 16 channel analog input events saved to a table created with
+        # 8 channels) are truncated to fit it, events with fewer fields (i.e.
+        # replayed 8 channel analog input events) are padded with 0 values.
+        self._field_count=len(self._rows.dtype)
+        self._padding_values=N.zeros(1,dtype=np_dtype)[0].tolist()
+
+    def append(self,event):
+        if self._count == self._length:
+            # the write of the full buffer failed.
+            self._dropOldestRows()
+        if len(event) > self._field_count:
+            event=event[:self._field_count]
+        elif len(event) < self._field_count:
+            event=tuple(event)+self._padding_values[len(event):]
+        self._rows[self._count]=tuple(event)
+        self._count+=1
+        if self._count == self._length:
+            stime=Computer.getTime()
+            try:
+                row_count=self.write()
+            except Exception, e:
+                print2err("Error writing staged events to ioDataStore table %s: %s"%(self.table._v_pathname,e))
+                return
+            self.datastore._updateWriteStats(row_count,Computer.getTime()-stime)
+
+    def _dropOldestRows(self):
+        drop_count=max(1,self._count//2)
+        self._rows[:self._count-drop_count]=self._rows[drop_count:self._count].copy()
+        self._count-=drop_count
+        self.datastore._stagingStats['rows_dropped']+=drop_count
+        print2err("WARNING: %d staged events for ioDataStore table %s were dropped."%(drop_count,self.table._v_pathname))
+
+    def write(self):
+        row_count=self._count
+        if row_count > 0:
+            # table.append copies the rows, so the staging array can be reused.
+            self.table.append(self._rows[:row_count])
+            self._count=0
+        return row_count
+
+    def __len__(self):
+        return self._count
+
+class EventBlockTableBuffer(EventTableBuffer):
+    """
+    EventTableBuffer for event classes that have an IOHUB_BLOCK_FIELD. The 
+    block of samples of each event is staged separately from the event, and 
+    appended to the 2-D samples array of the table when the staged rows are
+    written; the event row gets the samples array row of the block's first
+    sample. The samples array is created when the first block is staged, 
+    with one column per channel of that block, and the compression of the 
+    table. Blocks with fewer channels are padded with 0.0, blocks with more
+    channels are truncated. The sample blocks of event rows dropped after a
+    failed write are still written, so the sample_index of the other rows
+    stays valid.
+    """
+    def __init__(self,datastore,table,np_dtype,length,block_field_index,
+                 samples_expectedrows=DEFAULT_TABLE_STORAGE['samples_expectedrows']):
+        EventTableBuffer.__init__(self,datastore,table,np_dtype,length)
+        self._block_field_index=block_field_index
+        self._samples_expectedrows=samples_expectedrows
+        self._samples=getBlockSamplesArray(table)
+        self._sample_blocks=[]
+        # the samples array row the next staged block starts at.
+        self._sample_index=0
+        if self._samples is not None:
+            self._sample_index=self._samples.nrows
+
+    def append(self,event):
+        block=event[self._block_field_index]
+        # the event list is shared with the other event listeners.
+        event=list(event)
+        event[self._block_field_index]=self._sample_index
+        if block:
+            block=N.asarray(block,dtype=N.float32)
+            if self._samples is None:
+                self._samples=self._createSamplesArray(block.shape[1])
+            column_count=self._samples.shape[1]
+            if block.shape[1] != column_count:
+                resized=N.zeros((len(block),column_count),dtype=N.float32)
+                resized[:,:min(column_count,block.shape[1])]=block[:,:column_count]
+                block=resized
+            self._sample_blocks.append(block)
+            self._sample_index+=len(block)
+        EventTableBuffer.append(self,event)
+
+    def write(self):
+        if self._sample_blocks:
+            self._samples.append(N.concatenate(self._sample_blocks))
+            self._sample_blocks=[]
+        return EventTableBuffer.write(self)
+
+    def _createSamplesArray(self,column_count):
+        table=self.table
+        return self.datastore.emrtFile.createEArray(table._v_parent,table._v_name+BLOCK_SAMPLES_ARRAY_SUFFIX,
+                                                    Float32Atom(),(0,column_count),
+                                                    title="%s Samples"%(table._v_name),
+                                                    filters=table.filters,expectedrows=self._samples_expectedrows)
+
+class DataStoreWriter(Greenlet):
+    """
+    Greenlet that periodically appends the events staged by the
+    ioHubpyTablesFile to the hdf5 file, every write_interval sec.msec.
+    """
+    def __init__(self, datastore, write_interval):
+        Greenlet.__init__(self)
+        self.datastore = datastore
+        self.write_interval=write_interval
+        self.running=False
+
+    def _run(self):
+        self.running = True
+        while self.running is True:
+            gevent.sleep(self.write_interval)
+            if self.running is True:
+                try:
+                    self.datastore.writeStagedEvents()
+                except:
+                    print2err("Error in DataStoreWriter:")
+                    printExceptionDetailsToStdErr()
+
 ## -------------------- Utility Functions ------------------------ ##
 
+def getEventTableDtype(event_cls):
+    """
+    Returns the numpy dtype of the DataStore table of an event class. The 
+    IOHUB_BLOCK_FIELD of block event classes is saved to a separate samples
+    array, so the table has a BLOCK_SAMPLE_INDEX_COLUMN in its place.
+    """
+    block_field=getattr(event_cls,'IOHUB_BLOCK_FIELD',None)
+    if block_field is None:
+        return event_cls.NUMPY_DTYPE
+    return N.dtype([(name,dtype) if name != block_field else (BLOCK_SAMPLE_INDEX_COLUMN,N.uint64) for name,dtype in event_cls._dataType])
+
+def getSupportedCompressionLibraries():
+    """
+    Returns the complib names, as used by tables.Filters, of the compression
+    libraries the installed PyTables supports. Blosc compressors other than
+    the default blosclz are given as 'blosc:<compressor>', i.e. 'blosc:lz4',
+    and need PyTables 3.0 or later.
+    """
+    complibs=list(getattr(tables.filters,'all_complibs',('zlib','lzo','bzip2','blosc')))
+    blosc_compressors=getattr(tables,'blosc_compressor_list',lambda: [])()
+    supported=[]
+    for complib in complibs:
+        library,_sep,compressor=complib.partition(':')
+        if tables.whichLibVersion(library) is None:
+            continue
+        if compressor and compressor not in blosc_compressors:
+            continue
+        supported.append(complib)
+    return supported
+
+def getDeviceSamplingRate(device_config):
+    """
+    Returns the sampling rate, in Hz, given in a device configuration; the
+    runtime_settings sampling_rate of eye trackers, or the channel_sampling_rate
+    of analog input devices. Returns None if the device has no numeric
+    sampling rate.
+    """
+    runtime_settings=device_config.get('runtime_settings') or {}
+    for sampling_rate in (runtime_settings.get('sampling_rate'),device_config.get('channel_sampling_rate')):
+        try:
+            sampling_rate=float(sampling_rate)
+        except (TypeError,ValueError):
+            continue
+        if sampling_rate > 0.0:
+            return sampling_rate
+    return None
+
+def createTableStorage(settings,sampling_rate=None,table_label=''):
+    """
+    Creates the table storage dict returned by 
+    ioHubpyTablesFile.getTableStorage() from a table's table_storage settings.
+    An unsupported complib is replaced by zlib, with a warning.
+    """
+    complib=settings['complib']
+    if complib not in getSupportedCompressionLibraries():
+        print2err("WARNING: ioDataStore table %s: complib %s is not supported by the installed PyTables; "
+                  "using zlib. Supported: %s"%(table_label,complib,', '.join(getSupportedCompressionLibraries())))
+        complib='zlib'
+    filters=Filters(complevel=int(settings['complevel']),complib=complib,
+                    shuffle=bool(settings['shuffle']),fletcher32=bool(settings['fletcher32']))
+
+    storage=dict(filters=filters,chunkshape=settings['chunkshape'])
+    for rows_setting in ('expectedrows','samples_expectedrows'):
+        expected_rows=settings[rows_setting]
+        if expected_rows == SAMPLING_RATE_EXPECTED_ROWS:
+            if sampling_rate:
+                expected_rows=sampling_rate*float(settings['session_length'])
+            else:
+                expected_rows=DEFAULT_TABLE_STORAGE[rows_setting]
+        storage[rows_setting]=max(1,int(expected_rows))
+    return storage
+
 def close_open_data_files(verbose):
     open_files = tables.file._open_files
     are_open_files = len(open_files) > 0
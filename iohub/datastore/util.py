@@ -14,6 +14,7 @@ from tables import *
 import os
 from collections import namedtuple
 import json
+import numpy as N
 
 import iohub
 
@@ -29,6 +30,352 @@ def openHubFile(filepath,filename,mode):
     hubFile=openFile(os.path.join(filepath,filename), mode)
     _hubFiles.append(hubFile)
     return hubFile       
+
+########### Event Time Column Compatibility #################
+
+# Event table columns that hold sec.msec-usec times or durations. DataStore
+# files created before these columns were changed to float64 store them as
+# float32, which only gives about 0.5 msec resolution after an hour of
+# session time.
+EVENT_TIME_COLUMNS=('device_time','logged_time','time','confidence_interval','delay','duration','msg_offset')
+
+def getUpgradedEventDtype(np_dtype):
+    """
+    Returns the numpy dtype to use for an event table with the given dtype, 
+    with any float32 event time columns changed to float64, including the
+    time columns of nested event columns (i.e. the KeyboardCharEvent
+    press_event and release_event). Returns None if the dtype does not have
+    any float32 event time columns.
+    """
+    upgraded=False
+    fields=[]
+    for name in np_dtype.names:
+        field_dtype=np_dtype.fields[name][0]
+        if field_dtype.names:
+            nested_dtype=getUpgradedEventDtype(field_dtype)
+            if nested_dtype is not None:
+                field_dtype=nested_dtype
+                upgraded=True
+        elif name in EVENT_TIME_COLUMNS and field_dtype == N.float32:
+            field_dtype=N.dtype(N.float64)
+            upgraded=True
+        fields.append((name,field_dtype))
+    if upgraded:
+        return N.dtype(fields)
+    return None
+
+def upgradeEventArray(event_array,event_dtype=None):
+    """
+    Returns a copy of a numpy array of events read from a DataStore event
+    table, with any float32 event time columns converted to float64. The 
+    array is returned unchanged if no conversion is needed, so code reading
+    both old and new DataStore files always gets float64 event times.
+
+    If event_dtype, the NUMPY_DTYPE of the event class of the table, is 
+    given and has fields that the table does not (i.e. the AI_8 - AI_15 
+    channels of MultiChannelAnalogInputEvents saved when only 8 channels 
+    were supported), the events are returned using event_dtype, with the 
+    missing fields set to 0. Tables with fields that event_dtype does not
+    have (i.e. block event tables) are not changed.
+    """
+    upgraded_dtype=getUpgradedEventDtype(event_array.dtype)
+    if upgraded_dtype is not None:
+        event_array=event_array.astype(upgraded_dtype)
+    if event_dtype is None or event_array.dtype == event_dtype:
+        return event_array
+    names=event_array.dtype.names
+    if set(names) < set(event_dtype.names):
+        padded_array=N.zeros(len(event_array),dtype=event_dtype)
+        for name in names:
+            padded_array[name]=event_array[name]
+        return padded_array
+    return event_array
+
+def upgradeEventColumn(column_name,values):
+    """
+    Returns the values read from a single event table column, converted to
+    float64 if the column is a float32 event time column. Nested columns
+    can be given by their path, i.e. 'press_event/time', and nested event
+    column values are upgraded like an event array.
+    """
+    if values.dtype.names:
+        return upgradeEventArray(values)
+    if column_name.rsplit('/',1)[-1] in EVENT_TIME_COLUMNS and values.dtype == N.float32:
+        return values.astype(N.float64)
+    return values
+
+def upgradeEventTimeColumns(hdfFilePath,hdfFileName,outputFileName,chunk_size=100000):
+    """
+    Creates a copy of a DataStore file with every event table that uses
+    float32 event time columns rewritten to use float64 columns. The
+    original file is not modified. Note that float32 times that have 
+    already lost precision can not be recovered; the upgrade allows the 
+    file to be appended to, and read, using the current event schema.
+
+    Args:
+        hdfFilePath (str): The path of the directory the DataStore HDF5 file is in.
+        
+        hdfFileName (str): The name of the DataStore HDF5 file to upgrade.
+        
+        outputFileName (str): The name of the upgraded file to create in hdfFilePath.
+        
+        chunk_size (int): The number of rows to convert at a time.
+        
+    Returns:
+        list: The paths of the tables that were upgraded.
+    """
+    output_path=os.path.join(hdfFilePath,outputFileName)
+    copyFile(os.path.join(hdfFilePath,hdfFileName),output_path)
+
+    upgraded_tables=[]
+    hubFile=openFile(output_path,'a')
+    try:
+        event_tables=list(hubFile.walkNodes(hubFile.root.data_collection.events,classname='Table'))
+        for table in event_tables:
+            upgraded_dtype=getUpgradedEventDtype(table.dtype)
+            if upgraded_dtype is None:
+                continue
+
+            table_name=table.name
+            new_table=hubFile.createTable(table._v_parent,table_name+'_upgraded',upgraded_dtype,
+                                          title=table.title,filters=table.filters,
+                                          expectedrows=max(table.nrows,1))
+            for start in xrange(0,table.nrows,chunk_size):
+                new_table.append(table.read(start,start+chunk_size).astype(upgraded_dtype))
+            new_table.flush()
+
+            table.remove()
+            new_table.move(newname=table_name)
+            upgraded_tables.append(new_table._v_pathname)
+        hubFile.flush()
+    finally:
+        hubFile.close()
+    return upgraded_tables
+
+########### Event Position Columns #################
+
+def getEventPositionColumns(np_dtype):
+    """
+    Returns the (x,y) column name pairs of an event dtype that hold a
+    position in Display coordinates; the mouse x_position, y_position
+    columns, and the eye event *gaze_x, *gaze_y columns.
+    """
+    names=np_dtype.names or ()
+    position_columns=[]
+    if 'x_position' in names and 'y_position' in names:
+        position_columns.append(('x_position','y_position'))
+    for n in names:
+        if n.endswith('gaze_x') and n[:-1]+'y' in names:
+            position_columns.append((n,n[:-1]+'y'))
+    return position_columns
+
+def convertEventPositions(event_array,from_transform,to_transform,position_columns=None):
+    """
+    Returns a copy of event_array with the Display position columns 
+    converted from one Display coordinate type to another, i.e. for
+    analysing events saved using pix coordinates in degrees. Whole columns
+    are converted at once using the unit_conversions.convertCoord function.
+
+    Args:
+        event_array (ndarray): numpy structured array of events.
+        from_transform (tuple): the Display.getCoordinateTransform() used when the events were saved.
+        to_transform (tuple): the coordinate transform to convert the positions to.
+        position_columns (list): (x,y) column name pairs to convert. None (the default) converts all the columns returned by getEventPositionColumns.
+
+    Returns:
+        (ndarray): the events with converted position columns.
+    """
+    from iohub.devices.display.unit_conversions import convertCoord
+    if position_columns is None:
+        position_columns=getEventPositionColumns(event_array.dtype)
+    event_array=event_array.copy()
+    for xcol,ycol in position_columns:
+        event_array[xcol],event_array[ycol]=convertCoord(from_transform,to_transform,event_array[xcol],event_array[ycol])
+    return event_array
+
+########### Block Event Samples #################
+
+# Block events (i.e. MultiChannelAnalogInputBlockEvent) save the samples of 
+# each event to a 2-D array in the same group as the event table, named 
+# after the table with BLOCK_SAMPLES_ARRAY_SUFFIX added. The event table 
+# saves the samples array row of each block's first sample in the 
+# BLOCK_SAMPLE_INDEX_COLUMN.
+BLOCK_SAMPLES_ARRAY_SUFFIX='Samples'
+BLOCK_SAMPLE_INDEX_COLUMN='sample_index'
+
+def getBlockSamplesArray(event_table):
+    """
+    Returns the 2-D samples array of a block event table, or None if no
+    block samples have been saved for the table.
+    """
+    try:
+        return event_table._v_parent._f_getChild(event_table._v_name+BLOCK_SAMPLES_ARRAY_SUFFIX)
+    except NoSuchNodeError:
+        return None
+
+class EventBlockSamples(object):
+    """
+    The samples of a set of block events, read from a DataStore file, as one
+    sequence of samples ordered by time. Samples are only read from the 
+    samples array, and their times only calculated, for the sample positions
+    asked for; the time of sample i of a block is the block event time + 
+    i * the block sample_interval.
+
+    The block events are available as the blocks attribute, a numpy 
+    structured array sorted by time.
+    """
+    def __init__(self,blocks,samples_array):
+        self.blocks=blocks
+        self._samples_array=samples_array
+        # the position of the first sample of each block, and the sample count.
+        self._offsets=N.concatenate(([0],N.cumsum(blocks['sample_count'],dtype=N.int64)))
+
+    def __len__(self):
+        return int(self._offsets[-1])
+
+    def _getBlockIndexes(self,positions):
+        return N.searchsorted(self._offsets,positions,'right')-1
+
+    def getTimes(self,start=0,stop=None):
+        """
+        Returns the times of the samples from position start to stop as a 
+        float64 numpy array.
+        """
+        start,stop,step=slice(start,stop).indices(len(self))
+        positions=N.arange(start,stop,dtype=N.int64)
+        b=self._getBlockIndexes(positions)
+        blocks=self.blocks
+        return blocks['time'][b]+(positions-self._offsets[b])*blocks['sample_interval'][b]
+
+    def getSamples(self,start=0,stop=None):
+        """
+        Returns the samples from position start to stop as a 2-D numpy array,
+        one row per sample and one column per channel. Blocks that were saved
+        one after the other are read from the samples array in one read.
+        """
+        start,stop,step=slice(start,stop).indices(len(self))
+        if start >= stop:
+            column_count=self._samples_array is not None and self._samples_array.shape[1] or 0
+            return N.zeros((0,column_count),dtype=N.float32)
+        offsets=self._offsets
+        sample_indexes=self.blocks[BLOCK_SAMPLE_INDEX_COLUMN]
+        reads=[]
+        for b in xrange(self._getBlockIndexes(start),self._getBlockIndexes(stop-1)+1):
+            first=int(sample_indexes[b]+max(start,offsets[b])-offsets[b])
+            last=int(sample_indexes[b]+min(stop,offsets[b+1])-offsets[b])
+            if reads and reads[-1][1] == first:
+                reads[-1][1]=last
+            else:
+                reads.append([first,last])
+        return N.concatenate([self._samples_array[first:last] for first,last in reads])
+
+    def getTimePositions(self,start_time,end_time):
+        """
+        Returns the (start, stop) sample positions of the samples with a time 
+        >= start_time and < end_time.
+        """
+        return self._getTimePosition(start_time),self._getTimePosition(end_time)
+
+    def _getTimePosition(self,t):
+        # the position of the first sample with a time >= t.
+        blocks=self.blocks
+        b=N.searchsorted(blocks['time'],t,'right')-1
+        if b < 0:
+            return 0
+        # the small offset keeps a t equal to a sample time, give or take
+        # float rounding, from skipping that sample.
+        i=int(N.ceil((t-blocks['time'][b])/blocks['sample_interval'][b]-1e-6))
+        return int(self._offsets[b]+min(i,blocks['sample_count'][b]))
+
+    def getTimeRange(self,start_time,end_time):
+        """
+        Returns the (times, samples) of the samples with a time >= start_time
+        and < end_time.
+        """
+        start,stop=self.getTimePositions(start_time,end_time)
+        return self.getTimes(start,stop),self.getSamples(start,stop)
+
+########### Condition Variable Filtering #################
+
+_CV_TABLE_OPERATORS=('==','!=','<','<=','>','>=')
+
+def filterConditionVariableTable(cvTable,filter):
+    """
+    Returns the rows of a condition variable table that match every entry of
+    a condition variable filter dict (see 
+    ExperimentDataAccessUtility.getConditionVariables), as a numpy 
+    structured array.
+
+    Comparison and range filters are combined into a single PyTables 
+    readWhere() condition, so they are evaluated in-kernel over the whole
+    table; filter values are passed as condition variables rather than being
+    formatted into the condition string. 'in' and 'not in' filters are then
+    applied to the rows read using numpy boolean masks.
+    """
+    conditions=[]
+    condvars=dict()
+    membership_filters=[]
+    for cv_name,(cv_operator,value) in filter.iteritems():
+        if cv_name not in cvTable.colnames:
+            raise ExperimentDataAccessException("Condition variable filter: %s is not a condition variable name."%(cv_name))
+        cv_operator=cv_operator.strip()
+        if cv_operator in _CV_TABLE_OPERATORS:
+            vname='filter_value_%d'%(len(condvars))
+            condvars[vname]=value
+            conditions.append("({0} {1} {2})".format(cv_name,cv_operator,vname))
+        elif cv_operator == 'range':
+            vmin='filter_value_%d'%(len(condvars))
+            condvars[vmin]=value[0]
+            vmax='filter_value_%d'%(len(condvars))
+            condvars[vmax]=value[1]
+            conditions.append("(({0} >= {1}) & ({0} <= {2}))".format(cv_name,vmin,vmax))
+        elif cv_operator in ('in','not in'):
+            membership_filters.append((cv_name,cv_operator=='in',value))
+        else:
+            raise ExperimentDataAccessException("Condition variable filter: unsupported operator '%s' for %s."%(cv_operator,cv_name))
+
+    if conditions:
+        cvrows=cvTable.readWhere(' & '.join(conditions),condvars=condvars)
+    else:
+        cvrows=cvTable.read()
+
+    if membership_filters and len(cvrows)>0:
+        mask=N.ones(len(cvrows),dtype=N.bool_)
+        for cv_name,is_in,value in membership_filters:
+            if isinstance(value,basestring) or not hasattr(value,'__iter__'):
+                value=[value,]
+            in_values=N.in1d(cvrows[cv_name],N.asarray(list(value)))
+            if is_in:
+                mask&=in_values
+            else:
+                mask&=~in_values
+        cvrows=cvrows[mask]
+    return cvrows
+
+class ConditionVariableRows(object):
+    """
+    Sequence of condition variable rows, backed by the numpy structured array 
+    returned by filterConditionVariableTable(). Each row is converted to a 
+    ConditionSetInstance namedtuple when it is accessed. The structured 
+    array itself is available as the rows attribute.
+    """
+    def __init__(self,rows):
+        self.rows=rows
+        self._ConditionSetInstance=namedtuple('ConditionSetInstance',rows.dtype.names)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self,index):
+        if isinstance(index,slice):
+            return [self._ConditionSetInstance(*r) for r in self.rows[index].tolist()]
+        return self._ConditionSetInstance(*self.rows[index].tolist())
+
+    def __iter__(self):
+        ConditionSetInstance=self._ConditionSetInstance
+        for r in self.rows:
+            yield ConditionSetInstance(*r.tolist())
+
 ########### Experiment / Experiment Session Based Data Access #################
 
 class ExperimentDataAccessUtility(object):
@@ -213,9 +560,23 @@ class ExperimentDataAccessUtility(object):
             return ecvTable.colnames
         return None
 
-    def getConditionVariables(self,filter=None):
+    def getConditionVariables(self,filter=None,as_type='namedtuple'):
         """
-        **Docstr TBC.**
+        Returns the rows of the experiment condition variable table that match
+        the filter given. The filter is a dict of condition variable name ->
+        (operator, value) pairs, and a row is returned if it matches every
+        filter entry. Supported operators are '==', '!=', '<', '<=', '>', 
+        '>=', 'in', 'not in', and 'range' (value is a (min, max) pair, both
+        inclusive). By default all rows for the sessions of the experiment 
+        are returned.
+
+        Args:
+            filter (dict): The condition variable filter to apply.
+            
+            as_type (str): 'namedtuple' (the default) returns a sequence of namedtuples, created as each row is accessed. 'numpy' returns the matching rows as a numpy structured array.
+            
+        Returns:
+            ConditionVariableRows or ndarray: The condition variable rows that match the filter.
         """
         if filter is None:
             session_ids=[]
@@ -223,23 +584,17 @@ class ExperimentDataAccessUtility(object):
                 session_ids.append(s.session_id)
             filter=dict(session_id=(' in ',session_ids))
 
-        ConditionSetInstance=None
-
-        for conditionVarName, conditionVarComparitor in filter.iteritems():
-            avComparison, value = conditionVarComparitor
-
-            cv_group=self.hdfFile.root.data_collection.condition_variables
-            cvrows=[]
-            ecv="EXP_CV_%d"%(self._experimentID,)
-            if ecv in cv_group._v_leaves:
-                ecvTable=cv_group._v_leaves[ecv]
-
-                if ConditionSetInstance is None:
-                    colnam=ecvTable.colnames
-                    ConditionSetInstance = namedtuple('ConditionSetInstance', colnam)
+        cv_group=self.hdfFile.root.data_collection.condition_variables
+        ecv="EXP_CV_%d"%(self._experimentID,)
+        if ecv not in cv_group._v_leaves:
+            if as_type == 'numpy':
+                return None
+            return []
 
-                cvrows.extend([ConditionSetInstance(*r[:]) for r in ecvTable if all([eval("{0} {1} {2}".format(r[conditionVarName],conditionVarComparitor[0],conditionVarComparitor[1])) for conditionVarName, conditionVarComparitor in filter.iteritems()])])
-        return cvrows
+        cvrows=filterConditionVariableTable(cv_group._v_leaves[ecv],filter)
+        if as_type == 'numpy':
+            return cvrows
+        return ConditionVariableRows(cvrows)
      
     def getValuesForVariables(self,cv, value, cvNames):
         """
@@ -332,7 +687,7 @@ class ExperimentDataAccessUtility(object):
                         resultSetList.append([])
 
                         for ename in event_attribute_names:
-                            resultSetList[-1].append(deviceEventTable.readWhere(wclause, field=ename))
+                            resultSetList[-1].append(upgradeEventColumn(ename,deviceEventTable.readWhere(wclause, field=ename)))
                         resultSetList[-1].append(wclause)
                         resultSetList[-1].append(cv)
 
@@ -373,7 +728,7 @@ class ExperimentDataAccessUtility(object):
                         wclause+=" ) "
 
                     for ename in event_attribute_names:
-                        resultSetList[-1].append(deviceEventTable.readWhere(wclause, field=ename))
+                        resultSetList[-1].append(upgradeEventColumn(ename,deviceEventTable.readWhere(wclause, field=ename)))
                     resultSetList[-1].append(wclause)
                     resultSetList[-1].append(cv)
 
@@ -384,6 +739,119 @@ class ExperimentDataAccessUtility(object):
 
             return None
 
+    def getTrialEventAttributeValues(self,event_type_id,event_attribute_names,trial_windows,session_id=None,filter_id=None):
+        """
+        Returns the values of the specified event attributes for each trial 
+        time window given. Instead of a table query for each trial and 
+        attribute, the session's events of the given type are read from the 
+        event table once (using the table's session_id and type indexes when
+        they exist), sorted by time, and the events for each trial window are
+        found using a binary search of the sorted event times.
+        
+        Args:
+            event_type_id (int): The event type to return attribute values for.
+            
+            event_attribute_names (list): The event attribute (column) names to return values for.
+            
+            trial_windows (list or ndarray): A sequence of (start_time, end_time) pairs, one for each trial. Events with a time >= start_time and <= end_time are returned for the trial.
+            
+            session_id (int): The session to return events for. Can be None if the DataStore file only has one session for the experiment.
+            
+            filter_id (int): If given, only events with this filter_id are returned.
+            
+        Returns:
+            list: A namedtuple for each trial window, with a field for each event attribute name holding a numpy array of the attribute values, plus a 'trial_window' field with the (start_time, end_time) of the trial.
+        """
+        if self.hdfFile is None:
+            return None
+
+        if session_id is None:
+            session_ids=[s.session_id for s in self.getSessionMetaData()]
+            if len(session_ids) != 1:
+                raise ExperimentDataAccessException("getTrialEventAttributeValues: session_id must be given when the DataStore file has %d sessions."%(len(session_ids)))
+            session_id=session_ids[0]
+
+        if isinstance(event_attribute_names,basestring):
+            event_attribute_names=[event_attribute_names,]
+
+        deviceEventTable=self.getEventTable(event_type_id)
+        if deviceEventTable is None:
+            raise ExperimentDataAccessException("getTrialEventAttributeValues: no event table found for event type %s"%(str(event_type_id)))
+        for ename in event_attribute_names:
+            if ename not in deviceEventTable.colnames:
+                raise ExperimentDataAccessException("getTrialEventAttributeValues: %s does not have a column named %s"%(deviceEventTable.title,ename))
+
+        wclause="( experiment_id == {0} ) & ( session_id == {1} ) & ( type == {2} )".format(self._experimentID,session_id,event_type_id)
+        if filter_id is not None:
+            wclause += " & ( filter_id == {0} )".format(filter_id)
+        events=deviceEventTable.readCoordinates(deviceEventTable.getWhereList(wclause))
+
+        event_times=upgradeEventColumn('time',events['time'])
+        if len(event_times) > 1 and (N.diff(event_times) < 0.0).any():
+            time_order=event_times.argsort(kind='mergesort')
+            events=events[time_order]
+            event_times=event_times[time_order]
+        columns=[upgradeEventColumn(ename,events[ename]) for ename in event_attribute_names]
+
+        trial_windows=N.asarray(trial_windows,dtype=N.float64).reshape(-1,2)
+        start_indexes=event_times.searchsorted(trial_windows[:,0],side='left')
+        end_indexes=event_times.searchsorted(trial_windows[:,1],side='right')
+
+        TrialEventAttributeResults=namedtuple('TrialEventAttributeResults',list(event_attribute_names)+['trial_window',])
+        results=[]
+        for t,(si,ei) in enumerate(zip(start_indexes,end_indexes)):
+            trial_values=[c[si:ei] for c in columns]
+            trial_values.append(tuple(trial_windows[t]))
+            results.append(TrialEventAttributeResults(*trial_values))
+        return results
+
+    def getEventBlockSamples(self,event_type,session_id=None):
+        """
+        Returns the samples saved for the block events of the specified type,
+        i.e. MultiChannelAnalogInputBlockEvents, as an EventBlockSamples. Use 
+        its getSamples(), getTimes(), and getTimeRange() methods to read the
+        samples; the per sample times are only calculated when asked for.
+
+        Args:
+            event_type (str or int): The block event type name or event type id.
+            session_id (int): Only return the blocks of this session. None (the default) returns the blocks of all sessions.
+
+        Returns:
+            (EventBlockSamples): The block samples, or None if no table exists for the event type.
+        """
+        event_table=self.getEventTable(event_type)
+        if event_table is None:
+            return None
+        if session_id is None:
+            blocks=event_table.read()
+        else:
+            blocks=event_table.readWhere('session_id == %d'%(session_id))
+        blocks=upgradeEventArray(blocks)
+        blocks=blocks[N.argsort(blocks['time'],kind='mergesort')]
+        return EventBlockSamples(blocks,getBlockSamplesArray(event_table))
+
+    def readEventTable(self,event_type,coordinate_transforms=None):
+        """
+        Returns all the events in the DataStore table for the specified event
+        type as a numpy structured array. Event time columns are always 
+        returned as float64, even when the file was saved using float32 
+        event time columns.
+        
+        Args:
+            event_type (str or int): The event type name or event type id.
+            coordinate_transforms (tuple): Optional (from_transform, to_transform) pair of Display coordinate transforms; if given, the event position columns are converted using convertEventPositions().
+            
+        Returns:
+            (ndarray): The events saved in the event table.
+        """
+        event_table=self.getEventTable(event_type)
+        if event_table is None:
+            return None
+        events=upgradeEventArray(event_table.read())
+        if coordinate_transforms:
+            events=convertEventPositions(events,*coordinate_transforms)
+        return events
+
     def getEventIterator(self,event_type):
         """
         **Docstr TBC.**
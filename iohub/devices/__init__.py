@@ -13,6 +13,7 @@ Distributed under the terms of the GNU General Public License (GPL version 3 or
 """
 
 import gc, os, sys
+import heapq
 import collections
 from collections import deque
 from operator import itemgetter
@@ -27,6 +28,7 @@ if sys.platform != 'darwin':
 
 from ..util import convertCamelToSnake, print2err,printExceptionDetailsToStdErr
 from ..timebase import monotonicClock
+from ..constants import EventConstants
 
 class ioDeviceError(Exception):
     def __init__(self, device, msg):
@@ -787,6 +789,16 @@ class Device(ioObject):
                 ]
 
     EVENT_CLASS_NAMES=[]
+
+    # True for devices that, as a listener of their own events, must handle
+    # them one at a time in event_id order (i.e. the Keyboard, which pairs
+    # press and release events), instead of being given them grouped by
+    # event type.
+    ORDERED_EVENT_HANDLING=False
+
+    # total number of native events added by all devices; the ioHub Server
+    # skips its event processing iterations while it does not change.
+    _all_native_event_count=0
     
     _display_device=None
     _iohub_server=None
@@ -795,12 +807,14 @@ class Device(ioObject):
     DEVICE_TYPE_STRING=None
     
     __slots__=[e[0] for e in _newDataTypes]+['_native_event_buffer',
+                                            '_native_event_count',
                                             '_event_listeners',
                                             '_iohub_event_buffer',
                                             '_last_poll_time',
                                             '_last_callback_time',
                                             '_is_reporting_events',
                                             '_configuration',
+                                            '_filter_chain',
                                             'monitor_event_types']
     
     def __init__(self,*args,**kwargs):        
@@ -859,12 +873,18 @@ class Device(ioObject):
         ioObject.__init__(self,*args,**kwargs)
 
         self._is_reporting_events=kwargs.get('auto_report_events')
-        self._iohub_event_buffer=dict()
+        self._iohub_event_buffer=DeviceEventStore(self.event_buffer_length)
         self._event_listeners=dict()
         self._configuration=kwargs
         self._last_poll_time=0
         self._last_callback_time=0
         self._native_event_buffer=deque(maxlen=self.event_buffer_length)
+        # total number of native events added to the native event buffer; 
+        # used by the ioHub Server to adapt the device polling interval.
+        self._native_event_count=0
+        # the EventFilterChain run by the ioHub Server on the device's events,
+        # if any event_filters are configured for the device.
+        self._filter_chain=None
 
         
     def getConfiguration(self):
@@ -899,8 +919,12 @@ class Device(ioObject):
             eventTypeID (int): If specified, provides the ioHub DeviceEvent ID for which events should be returned for.  Events that have occurred but do not match the event ID specified are ignored. Event type ID's can be accessed via the EventConstants class; all available event types are class atttributes of EventConstants.
             
             clearEvents (int): Can be used to indicate if the events being returned should also be removed from the device event buffer. True (the defualt) indicates to remove events being returned. False results in events being left in the device event buffer. 
+
+            cursor (int): Optional kwarg giving the largest event_id of the events already read. Only events with a larger event_id are returned, and no events are removed from the device event buffer, so several readers can each read the device's events by passing the largest event_id of the events they have received. Events are returned in ioHub time order, which is not always event_id order (i.e. an eye tracker FixationEndEvent is created after samples with a later time), so use the largest event_id returned, not the event_id of the last event.
         
-            asType (str): Optional kwarg giving the object type to return events as. Valid values are 'namedtuple' (the default), 'dict', 'list', or 'object'.
+            asType (str): Optional kwarg giving the object type to return events as. Valid values are 'namedtuple' (the default), 'dict', 'list', 'object', or 'numpy'. When 'numpy' is used, a dict of event type id -> numpy structured array is returned.
+
+            query (dict): Optional kwarg giving the conditions events must match to be returned; see EventQuery for the conditions that can be given. The query is evaluated by the ioHub Process, so only matching events are sent to the PsychoPy Process. When clearEvents is True, only the events returned are removed from the device event buffer.
 
         Returns:   
             (list): New events that the ioHub has received since the last getEvents() or clearEvents() call to the device. Events are ordered by the ioHub time of each event, older event at index 0. The event object type is determined by the asType parameter passed to the method. By default a namedtuple object is returned for each event. 
@@ -915,20 +939,38 @@ class Device(ioObject):
             eventTypeID=kwargs.get('event_type_id',None)
             clearEvents=kwargs.get('clearEvents',True)
 
-        currentEvents=[]
+        query=kwargs.get('query')
+        if query:
+            return self._getQueryEvents(EventQuery(query),eventTypeID,clearEvents)
+
+        event_type_ids=None
         if eventTypeID:
-            currentEvents=list(self._iohub_event_buffer.get(eventTypeID,[]))
-            if clearEvents is True and len(currentEvents)>0:
-                self._iohub_event_buffer[eventTypeID]=[]
-        else:
-            [currentEvents.extend(l) for l in self._iohub_event_buffer.values()]
-            if clearEvents is True and len(currentEvents)>0:
-                self.clearEvents()
+            event_type_ids=[eventTypeID,]
+        return self._iohub_event_buffer.getEvents(event_type_ids,clearEvents,kwargs.get('cursor'))
 
-        if len(currentEvents)>0:
-            sorted(currentEvents, key=itemgetter(DeviceEvent.EVENT_HUB_TIME_INDEX))
-        return currentEvents
+    def _getQueryEvents(self,query,eventTypeID,clearEvents):
+        etypes=self._iohub_event_buffer.getEventTypes()
+        if eventTypeID:
+            etypes=[eventTypeID,]
+        if query.event_type_ids is not None:
+            etypes=[etype for etype in etypes if etype in query.event_type_ids]
 
+        return mergeEventsByTime([self._iohub_event_buffer.splitEvents(etype,query,clearEvents) for etype in etypes])
+
+    def getEventBufferStats(self):
+        """
+        Returns the number of events held in the device event buffer, and the
+        number of events dropped because the buffer was full, for each event
+        type the device has reported. The device event buffer holds up to 
+        event_buffer_length events of each event type.
+
+        Args:
+            None
+
+        Returns:
+            dict: event type id -> dict(count=int, dropped=int)
+        """
+        return self._iohub_event_buffer.getStats()
 
     def clearEvents(self):
         """
@@ -974,18 +1016,20 @@ class Device(ioObject):
         return self._is_reporting_events
 
     def _handleEvent(self,e):
-        etypelist=self._iohub_event_buffer.get(e[DeviceEvent.EVENT_TYPE_ID_INDEX],None)
-        if etypelist is None:
-            self._iohub_event_buffer[e[DeviceEvent.EVENT_TYPE_ID_INDEX]]=[e,]
-        else:
-            etypelist.append(e)
+        self._iohub_event_buffer.append(e)
         
+    def _handleEvents(self,events):
+        # events are all of the same type.
+        self._iohub_event_buffer.extend(events)
+
     def _getNativeEventBuffer(self):
         return self._native_event_buffer
 
     def _addNativeEventToBuffer(self,e):
         if self.isReportingEvents():
             self._native_event_buffer.append(e)
+            self._native_event_count+=1
+            Device._all_native_event_count+=1
 
     def _addEventListener(self,l,eventTypeIDs):
         lca=0
@@ -1227,25 +1271,25 @@ class DeviceEvent(ioObject):
                                             # or dictionary representations of an event based on the data from an
                                             # event value list.
 
-                ('device_time',N.float32),   # If the device that generates the given device event type also time stamps
+                ('device_time',N.float64),   # If the device that generates the given device event type also time stamps
                                             # events, this field is the time of the event as given by the device,
                                             # converted to sec.msec-usec for consistancy with all other ioHub device times.
                                             # If the device that generates the given event type does not time stamp
                                             # events, then the device_time is set to the logged_time for the event.
 
-                ('logged_time', N.float32),  # The sec time that the event was 'received' by the ioHub Server Process.
+                ('logged_time', N.float64),  # The sec time that the event was 'received' by the ioHub Server Process.
                                             # For devices that poll for events, this is the sec time that the poll
                                             # method was called for the device and the event was retrieved. For
                                             # devices that use the event callback, this is the sec time the callback
                                             # executed and accept the event. Time is in sec.msec-usec
 
-                ('time',N.float32),         # Time is in the normalized time base that all events share,
+                ('time',N.float64),         # Time is in the normalized time base that all events share,
                                             # regardless of device type. Time is calculated differently depending
                                             # on the device and perhaps event type.
                                             # Time is what should be used when comparing times of events across
                                             # different devices. Time is in sec.msec-usec.
 
-                ('confidence_interval', N.float32), # This property attempts to give a sense of the amount to which
+                ('confidence_interval', N.float64), # This property attempts to give a sense of the amount to which
                                                     # the event time may be off relative to the true time the event
                                                     # occurred. confidence_interval is calculated differently depending
                                                     # on the device and perhaps event types. In general though, the
@@ -1257,7 +1301,7 @@ class DeviceEvent(ioObject):
                                                     # in sec.msec-usec and will range from 0.000000 sec.msec-usec
                                                     # and higher.
 
-                ('delay',N.float32)  ,       # The delay of an event is the known (or estimated) delay from when the
+                ('delay',N.float64)  ,       # The delay of an event is the known (or estimated) delay from when the
                                             # real world event occurred to when the ioHub received the event for
                                             # processing. This is often called the real-time end-to-end delay
                                             # of an event. If the delay for an event can not be reasonably estimated
@@ -1368,6 +1412,309 @@ class DeviceEvent(ioObject):
     def createEventAsNamedTuple(cls,valueList):
         return cls.namedTupleClass(*valueList)
 #
+# Event value list <-> numpy structured array conversion
+#
+
+def eventListsToArrays(events):
+    """
+    Convert a list of event value lists into one numpy structured array per
+    event type, using the NUMPY_DTYPE of each event type's DeviceEvent class.
+    Each array is ordered by event time.
+
+    Returns:
+        dict: event type id -> numpy structured array.
+    """
+    events_by_type=dict()
+    for e in events:
+        etype=e[DeviceEvent.EVENT_TYPE_ID_INDEX]
+        etypelist=events_by_type.get(etype)
+        if etypelist is None:
+            events_by_type[etype]=[tuple(e),]
+        else:
+            etypelist.append(tuple(e))
+
+    event_arrays=dict()
+    for etype,etypelist in events_by_type.iteritems():
+        event_array=N.array(etypelist,EventConstants.getClass(etype).NUMPY_DTYPE)
+        event_arrays[etype]=event_array[event_array.argsort(order='time',kind='mergesort')]
+    return event_arrays
+
+def packEventArrays(event_arrays):
+    """
+    Convert the dict returned by eventListsToArrays() into a list of 
+    [event type id, raw array data] pairs that can be sent by msgpack. Arrays
+    with object fields (i.e. the samples of block events) can not be sent as
+    raw data, so their records are sent as value lists instead.
+    """
+    return [[etype,event_array.dtype.hasobject and event_array.tolist() or event_array.tostring()] for etype,event_array in event_arrays.iteritems()]
+
+def unpackEventArrays(packed_arrays):
+    """
+    Convert the result of packEventArrays() back into a dict of event type
+    id -> numpy structured array. The arrays are read only views of the
+    received data.
+    """
+    event_arrays=dict()
+    if packed_arrays:
+        for etype,raw_data in packed_arrays:
+            event_dtype=EventConstants.getClass(etype).NUMPY_DTYPE
+            if event_dtype.hasobject:
+                event_arrays[etype]=N.array([tuple(r) for r in raw_data],event_dtype)
+            else:
+                event_arrays[etype]=N.frombuffer(raw_data,event_dtype)
+    return event_arrays
+
+def mergeEventArrays(event_arrays,other_event_arrays):
+    """
+    Add the arrays in other_event_arrays to event_arrays, concatenating the
+    arrays of any event type found in both dicts.
+    """
+    for etype,event_array in other_event_arrays.iteritems():
+        if etype in event_arrays:
+            event_arrays[etype]=N.concatenate((event_arrays[etype],event_array))
+        else:
+            event_arrays[etype]=event_array
+    return event_arrays
+
+class EventQuery(object):
+    """
+    Selects events using the conditions of a query dict, so getEvents() can
+    be asked for only the events that are needed. A query dict can contain:
+
+    * event_types: A list of event type ids (EventConstants values) or event class names. Only events of these types match.
+    * time_range: [start, end] ioHub times; only events with start <= time <= end match. Either can be None.
+    * attributes: A dict of event attribute name -> condition. A condition that is a list or tuple matches any of the values it contains; a dict with 'min' and / or 'max' keys matches values in that range (inclusive); any other value must be equal to the event attribute. Events that do not have the attribute do not match.
+
+    Query dicts only contain basic types, so they can be sent to the ioHub
+    Process and evaluated there, before events are sent to the PsychoPy
+    Process.
+    """
+    __slots__=['event_type_ids','start_time','end_time','attributes','_type_conditions']
+    def __init__(self,query):
+        event_types=query.get('event_types')
+        self.event_type_ids=None
+        if event_types:
+            self.event_type_ids=set()
+            for etype in event_types:
+                if isinstance(etype,basestring):
+                    etype=getattr(EventConstants,convertCamelToSnake(etype[:-5],False))
+                self.event_type_ids.add(etype)
+        self.start_time,self.end_time=query.get('time_range') or (None,None)
+        self.attributes=query.get('attributes') or {}
+        self._type_conditions=dict()
+
+    def _getTypeConditions(self,etype):
+        """
+        Returns the (event value index, condition type, condition) of each
+        attribute condition for the event type, or None if the event type
+        does not have all the attributes.
+        """
+        if etype in self._type_conditions:
+            return self._type_conditions[etype]
+        attribute_names=EventConstants.getClass(etype).CLASS_ATTRIBUTE_NAMES
+        conditions=[]
+        for name,condition in self.attributes.iteritems():
+            if name not in attribute_names:
+                conditions=None
+                break
+            if isinstance(condition,(list,tuple)):
+                conditions.append((attribute_names.index(name),'in',condition))
+            elif isinstance(condition,dict):
+                conditions.append((attribute_names.index(name),'range',(condition.get('min'),condition.get('max'))))
+            else:
+                conditions.append((attribute_names.index(name),'==',condition))
+        self._type_conditions[etype]=conditions
+        return conditions
+
+    def matches(self,e):
+        """
+        Returns True if the event value list matches the query.
+        """
+        etype=e[DeviceEvent.EVENT_TYPE_ID_INDEX]
+        if self.event_type_ids is not None and etype not in self.event_type_ids:
+            return False
+        etime=e[DeviceEvent.EVENT_HUB_TIME_INDEX]
+        if (self.start_time is not None and etime < self.start_time) or (self.end_time is not None and etime > self.end_time):
+            return False
+        if self.attributes:
+            conditions=self._getTypeConditions(etype)
+            if conditions is None:
+                return False
+            for index,condition_type,condition in conditions:
+                value=e[index]
+                if condition_type == '==':
+                    if value != condition:
+                        return False
+                elif condition_type == 'in':
+                    if value not in condition:
+                        return False
+                else:
+                    min_value,max_value=condition
+                    if (min_value is not None and value < min_value) or (max_value is not None and value > max_value):
+                        return False
+        return True
+
+    def split(self,events):
+        """
+        Returns a list of the events that match the query, and a list of
+        the events that do not, keeping the order of the events.
+        """
+        matched=[]
+        unmatched=[]
+        matches=self.matches
+        for e in events:
+            if matches(e):
+                matched.append(e)
+            else:
+                unmatched.append(e)
+        return matched,unmatched
+
+class DeviceEventStore(object):
+    """
+    The device level event buffer of a Device. Events are held in one fixed
+    length deque per event type, so adding an event is O(1) and a device 
+    whose events are never read uses at most capacity events of memory per 
+    event type. When the deque of an event type is full, the oldest event of
+    that type is dropped and the type's drop count is incremented.
+
+    Each event type's events are kept in the order they were received, so 
+    events of several types are returned ordered by hub time by merging the
+    per type deques (a k-way merge), without sorting all the events.
+
+    Events can be read without removing them by giving a cursor: the 
+    largest event_id of the events already read. Only events with a larger 
+    event_id are returned, so a reader can use the largest event_id of the
+    events returned as the cursor of its next read. As events are returned
+    in hub time order, this is not always the event_id of the last event
+    returned; getEventCursor() returns it.
+    """
+    __slots__=['capacity','_events','_dropped']
+    def __init__(self,capacity=None):
+        self.capacity=capacity
+        # event type id -> deque of events
+        self._events=dict()
+        # event type id -> number of events dropped because the deque was full
+        self._dropped=dict()
+
+    def _getTypeBuffer(self,etype):
+        etype_events=self._events.get(etype)
+        if etype_events is None:
+            etype_events=deque(maxlen=self.capacity)
+            self._events[etype]=etype_events
+            self._dropped[etype]=0
+        return etype_events
+
+    def append(self,e):
+        etype=e[DeviceEvent.EVENT_TYPE_ID_INDEX]
+        etype_events=self._events.get(etype)
+        if etype_events is None:
+            etype_events=self._getTypeBuffer(etype)
+        elif len(etype_events) == self.capacity:
+            self._dropped[etype]+=1
+        etype_events.append(e)
+
+    def extend(self,events):
+        # events are all of the same type.
+        etype=events[0][DeviceEvent.EVENT_TYPE_ID_INDEX]
+        etype_events=self._getTypeBuffer(etype)
+        if self.capacity is not None:
+            overflow=len(etype_events)+len(events)-self.capacity
+            if overflow > 0:
+                self._dropped[etype]+=overflow
+        etype_events.extend(events)
+
+    def getEventTypes(self):
+        return self._events.keys()
+
+    def getEvents(self,event_type_ids=None,clear=True,cursor=None):
+        """
+        Returns the events of the given event types (all types if None),
+        ordered by hub time. If cursor is given, only events with an event_id
+        greater than cursor are returned, and no events are removed;
+        otherwise the returned events are removed when clear is True.
+        """
+        if event_type_ids is None:
+            event_type_ids=self._events.keys()
+
+        event_lists=[]
+        for etype in event_type_ids:
+            etype_events=self._events.get(etype)
+            if not etype_events:
+                continue
+            if cursor is not None:
+                event_lists.append(self._getEventsAfter(etype_events,cursor))
+            else:
+                event_lists.append(list(etype_events))
+                if clear is True:
+                    etype_events.clear()
+        return mergeEventsByTime(event_lists)
+
+    @staticmethod
+    def getEventCursor(events,cursor=None):
+        """
+        Returns the cursor to use for the read after the one that returned
+        events; the largest event_id of events, or cursor if events is empty.
+        """
+        if events:
+            return max(cursor,max([e[DeviceEvent.EVENT_ID_INDEX] for e in events]))
+        return cursor
+
+    def _getEventsAfter(self,etype_events,cursor):
+        # events are in event_id order, so only the new events are visited.
+        new_event_count=0
+        id_index=DeviceEvent.EVENT_ID_INDEX
+        for e in reversed(etype_events):
+            if e[id_index] <= cursor:
+                break
+            new_event_count+=1
+        if new_event_count == 0:
+            return []
+        if new_event_count == len(etype_events):
+            return list(etype_events)
+        return list(etype_events)[-new_event_count:]
+
+    def splitEvents(self,etype,query,clear=True):
+        """
+        Returns the events of etype that match the EventQuery, removing them
+        from the store if clear is True.
+        """
+        etype_events=self._events.get(etype)
+        if not etype_events:
+            return []
+        matched,unmatched=query.split(etype_events)
+        if matched and clear is True:
+            etype_events.clear()
+            etype_events.extend(unmatched)
+        return matched
+
+    def clear(self):
+        for etype_events in self._events.itervalues():
+            etype_events.clear()
+
+    def getStats(self):
+        """
+        Returns a dict of event type id -> dict(count, dropped) for each 
+        event type the store has received.
+        """
+        return dict([(etype,dict(count=len(etype_events),dropped=self._dropped[etype])) for etype,etype_events in self._events.iteritems()])
+
+def mergeEventsByTime(event_lists):
+    """
+    Merges lists of events that are each ordered by hub time into one list
+    ordered by hub time. Events with the same hub time are ordered by 
+    event_id.
+    """
+    event_lists=[l for l in event_lists if l]
+    if len(event_lists) == 0:
+        return []
+    if len(event_lists) == 1:
+        return event_lists[0]
+    time_index=DeviceEvent.EVENT_HUB_TIME_INDEX
+    id_index=DeviceEvent.EVENT_ID_INDEX
+    decorated=[[(e[time_index],e[id_index],e) for e in l] for l in event_lists]
+    return [d[2] for d in heapq.merge(*decorated)]
+
+#
 # Import Devices and DeviceEvents
 #
 
@@ -1396,11 +1743,6 @@ def import_device(module_path, device_class_name):
         
     return device_class,device_class_name,event_classes
 
-try:
-    if getattr(sys.modules[__name__],'Display',None) is None:
-        display_class,device_class_name,event_classes=import_device('iohub.devices.display','Display')
-        setattr(sys.modules[__name__],'Display', display_class)
-        
-except:
-    print2err("Warning: display device module could not be imported.")
-    printExceptionDetailsToStdErr()
+# Device modules, including the Display device (which imports wx and
+# psychopy), are only imported when a device is created, or a device
+# view is added by the ioHub client, with import_device().
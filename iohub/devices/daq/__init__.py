@@ -10,7 +10,7 @@ Distributed under the terms of the GNU General Public License (GPL version 3 or
 """
 
 
-from .. import Device, DeviceEvent
+from .. import Device, DeviceEvent, Computer
 from ...constants import DeviceConstants, EventConstants
 import numpy as N
 
@@ -35,10 +35,11 @@ class AnalogInputDevice(Device):
             * USB-1208FS
     
     The ioHub provides a simple common interface to all supported models, 
-    providing digital sample events for 8 single ended channels of 
-    simultaniously sampled analog inputs. Currently the input channel count
-    is fixed at 8 channels, although you do not neeed to use all channels 
-    that are being recorded obviously. 
+    providing digital sample events for up to 16 single ended channels of 
+    simultaniously sampled analog inputs. The number of channels recorded is
+    set by the input_channel_count setting; 1 - 16 channels are supported by
+    the Measurement Computing interface, and 8 channels by the LabJack 
+    interface. 
     
     All device interfaces have been written to use the 'data streaming'
     mode each supports. This means that a sampling rate is specified and the
@@ -73,11 +74,11 @@ class AnalogInputDevice(Device):
     _newDataTypes = [('input_channel_count', N.uint8), 
                      ('channel_sampling_rate', N.uint16)]
 
-    EVENT_CLASS_NAMES=['MultiChannelAnalogInputEvent']
+    EVENT_CLASS_NAMES=['MultiChannelAnalogInputEvent','MultiChannelAnalogInputBlockEvent']
     DEVICE_TYPE_ID=DeviceConstants.ANALOGINPUT
     DEVICE_TYPE_STRING="ANALOGINPUT"
 
-    __slots__=[e[0] for e in _newDataTypes]
+    __slots__=[e[0] for e in _newDataTypes]+['_scan_events','_block_events']
     def __init__(self, *args, **kwargs):
         
         #: The channel_sampling_rate attribute specifies the 'per channel'
@@ -89,6 +90,34 @@ class AnalogInputDevice(Device):
         
         Device.__init__(self,*args, **kwargs['dconfig'])
 
+        # MultiChannelAnalogInputBlockEvents are only created when they are
+        # in monitor_event_types; MultiChannelAnalogInputEvents are created
+        # unless only block events are being monitored.
+        monitored=self.monitor_event_types or []
+        self._block_events='MultiChannelAnalogInputBlockEvent' in monitored
+        self._scan_events='MultiChannelAnalogInputEvent' in monitored or not self._block_events
+
+    def _createMultiChannelBlockEventList(self,sample_interval,device_time,logged_time,time,confidence_interval,samples):
+        # Returns the MultiChannelAnalogInputBlockEvent list for samples, a
+        # list of scans that each hold input_channel_count channel values.
+        # The event time fields are those of the first scan.
+        return [0,  # exp id
+                0,  # session id
+                0,  # device id (not currently used)
+                Computer._getNextEventID(),  # event id
+                MultiChannelAnalogInputBlockEvent.EVENT_TYPE_ID, # event type
+                device_time, # device time
+                logged_time, # logged time
+                time,  # hub time
+                confidence_interval, # confidence interval
+                logged_time-time, # delay
+                0,  # filter_id
+                sample_interval,
+                self.input_channel_count,
+                len(samples),
+                samples
+                ]
+
     def _poll(self):
         return self.isReportingEvents()
 #
@@ -100,14 +129,17 @@ class AnalogInputEvent(DeviceEvent):
     
 class MultiChannelAnalogInputEvent(AnalogInputEvent):
     """
-    The AnalogInputDevice supports one event type at this time, a 
-    MultiChannelAnalogInputEvent that contains all the attributes of the base 
-    ioHub Device class as well at 8 extra attributes, labeled AI_0 - AI_7,
+    The AnalogInputDevice supports two event types, the 
+    MultiChannelAnalogInputEvent, created for each scan of the input channels,
+    and the MultiChannelAnalogInputBlockEvent, which holds a block of scans.
+    A MultiChannelAnalogInputEvent contains all the attributes of the base 
+    ioHub Device class as well at 16 extra attributes, labeled AI_0 - AI_15,
     which hold the digital representation of the analog input voltage at the time
-    the device took the analog readings from the 8 input channels being monitored
-    for each sample read. 
+    the device took the analog readings from the input channels being monitored
+    for each sample read. Attributes for channels above the device's 
+    input_channel_count are always 0.
     
-    Note that it is taken as the case that all devices sample the eight analog input 
+    Note that it is taken as the case that all devices sample the analog input 
     channels being monitored at the same time for each MultiChannelAnalogInputEvent.
     
     For the USB-1616FS device this is actually the case, as each analog input 
@@ -126,48 +158,73 @@ class MultiChannelAnalogInputEvent(AnalogInputEvent):
     the suggested maximum scanning rate of 1000 Hz per channel when the device is
     being used with the ioHub to be considered 'effectively' simultanious.
     """
-    _newDataTypes = [
-        ('AI_0',N.float32),
-        ('AI_1',N.float32),
-        ('AI_2',N.float32),
-        ('AI_3',N.float32),
-        ('AI_4',N.float32),
-        ('AI_5',N.float32),
-        ('AI_6',N.float32),
-        ('AI_7',N.float32)
-    ]
+    # The maximum number of analog input channels an event can hold; one
+    # AI_<channel> float32 field is created for each channel.
+    MAX_CHANNEL_COUNT=16
+    _newDataTypes = [('AI_%d'%(e),N.float32) for e in xrange(MAX_CHANNEL_COUNT)]
     EVENT_TYPE_ID=EventConstants.MULTI_CHANNEL_ANALOG_INPUT
     EVENT_TYPE_STRING='MULTI_CHANNEL_ANALOG_INPUT'
     IOHUB_DATA_TABLE=EVENT_TYPE_STRING
     __slots__=[e[0] for e in _newDataTypes]
     def __init__(self, *args, **kwargs):
         
-        #: Each MultiChannelAnalogInputEvent stores the state of all eight
+        #: Each MultiChannelAnalogInputEvent stores the state of all the
         #: analog inputs being monitored by the ioHub. AI_0 represents the state
-        #: of the first analog input channel, which has been converted to a digital value.
-        self.AI_0=None
+        #: of the first analog input channel, which has been converted to a 
+        #: digital value, AI_1 the second channel, and so on up to AI_15.
+        for channel_name,channel_dtype in self._newDataTypes:
+            setattr(self,channel_name,None)
 
-        #: Analog Input channel number 2 (index 1) value.
-        self.AI_1=None
-
-        #: Analog Input channel number 3 (index 2) value.
-        self.AI_2=None
+        AnalogInputEvent.__init__(self, *args, **kwargs)
 
-        #: Analog Input channel number 4 (index 3) value.
-        self.AI_3=None
+class MultiChannelAnalogInputBlockEvent(AnalogInputEvent):
+    """
+    A MultiChannelAnalogInputBlockEvent holds a block of consecutive scans of
+    the analog input channels; one block event is created for the scans
+    read from the device each time it is polled. Only the event header of
+    the first scan is saved and sent, instead of the full event header of 
+    every scan, so block events are better suited to high sampling rates 
+    than MultiChannelAnalogInputEvents. Block events are created when 
+    MultiChannelAnalogInputBlockEvent is included in the device's 
+    monitor_event_types.
+    
+    The event time attributes are those of the first scan in the block;
+    scan i of the block was taken sample_interval * i sec.msec later.
+    
+    In the ioDataStore, the scans of every block event are appended to a 
+    chunked 2-D array saved next to the MultiChannelAnalogInputBlockEvent 
+    table, and the table saves the array row of the first scan of each block
+    in a sample_index column instead of the samples attribute. Use 
+    ExperimentDataAccessUtility.getEventBlockSamples() to read the scans and
+    their times.
+    """
+    _newDataTypes = [
+        ('sample_interval',N.float64),
+        ('channel_count',N.uint8),
+        ('sample_count',N.uint32),
+        ('samples',N.object)
+    ]
+    EVENT_TYPE_ID=EventConstants.MULTI_CHANNEL_ANALOG_INPUT_BLOCK
+    EVENT_TYPE_STRING='MULTI_CHANNEL_ANALOG_INPUT_BLOCK'
+    IOHUB_DATA_TABLE=EVENT_TYPE_STRING
+    # The ioDataStore saves this attribute to a 2-D samples array, not the
+    # event table.
+    IOHUB_BLOCK_FIELD='samples'
+    __slots__=[e[0] for e in _newDataTypes]
+    def __init__(self, *args, **kwargs):
 
-        #: Analog Input channel number 5 (index 4) value.
-        self.AI_4=None
+        #: The sec.msec between consecutive scans of the block
+        #: ( 1.0 / channel_sampling_rate ).
+        self.sample_interval=None
 
-        #: Analog Input channel number 6 (index 5) value.
-        self.AI_5=None
+        #: The number of channel values in each scan.
+        self.channel_count=None
 
-        #: Analog Input channel number 7 (index 6) value.
-        self.AI_6=None
+        #: The number of scans in the block.
+        self.sample_count=None
 
-        #: Each MultiChannelAnalogInputEvent stores the state of all eight
-        #: analog inputs being monitored by the ioHub. AI_7 represents the state
-        #: of the last analog input channel being monitored, in digital form.
-        self.AI_7=None
+        #: The scans of the block; a list of sample_count scans, each being a
+        #: list of channel_count analog input channel values, AI_0 first.
+        self.samples=None
 
         AnalogInputEvent.__init__(self, *args, **kwargs)
@@ -117,6 +117,20 @@ class AnalogInput(AnalogInputDevice):
             0 # filter_id
             ]
         
+        if self._block_events and ain_counts[0] > 0:
+            sample_interval=1.0/float(self.channel_sampling_rate)
+            device_time=float(self._scan_count)/float(self.channel_sampling_rate)
+            scans=[[ain[a][s] for a in channel_index_list] for s in range(ain_counts[0])]
+            self._addNativeEventToBuffer(self._createMultiChannelBlockEventList(sample_interval,device_time,
+                                            logged_time,device_time+start_post,confidence_interval,scans))
+        if not self._scan_events:
+            self._scan_count+=ain_counts[0]
+            self._last_callback_time=logged_time
+            return True
+
+        # the event fields of channels that are not being recorded are 0.0
+        channel_padding=[0.0]*(MultiChannelAnalogInputEvent.MAX_CHANNEL_COUNT-self.input_channel_count)
+
         for s in range(ain_counts[0]):
             multi_channel_event=list(event)
 
@@ -126,6 +140,7 @@ class AnalogInput(AnalogInputDevice):
             multi_channel_event[9]=logged_time-multi_channel_event[6]
 
             multi_channel_event.extend([ain[a][s] for a in channel_index_list])
+            multi_channel_event.extend(channel_padding)
             self._addNativeEventToBuffer(multi_channel_event)
             self._scan_count+=1
             
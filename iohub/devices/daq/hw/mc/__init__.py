@@ -11,7 +11,8 @@ Distributed under the terms of the GNU General Public License (GPL version 3 or
 
 
 import sys
-from ..... import print2err, createErrorResult
+import numpy as N
+from ..... import print2err, printExceptionDetailsToStdErr, createErrorResult
 from ... import AnalogInputDevice, MultiChannelAnalogInputEvent
 from .... import Computer,  ioDeviceError
 
@@ -51,8 +52,11 @@ class AnalogInput(AnalogInputDevice):
                                              "_current_sample_buffer_index",
                                              "_samples_received_count",
                                              "_last_sample_buffer_index",
-                                             '_local_sample_buffer',
-                                             '_local_sample_count_created',
+                                             '_low_channel',
+                                             '_high_channel',
+                                             '_sample_array',
+                                             '_scan_count_created',
+                                             '_channel_padding',
                                              '_last_start_recording_time_pre',
                                              '_last_start_recording_time_post',
                                              '_a2d_resolution']
@@ -80,14 +84,16 @@ class AnalogInput(AnalogInputDevice):
             print2err("AnalogInput gain value [%s] is not supported. Supported gain values are %s, using the gain parameter."%(str(self._DAQ_GAIN_OPTIONS.keys()),))
             raise ioDeviceError(self,"AnalogInput gain not supported: %s"%(self.gain))
 
-        if self.input_channel_count != 8:
-            print2err("AnalogInput input_channel_count must be 8.")
-            raise ioDeviceError(self,"AnalogInput input_channel_count must be 8.")
-            
+        max_channel_count=MultiChannelAnalogInputEvent.MAX_CHANNEL_COUNT
+        if self.input_channel_count < 1 or self.input_channel_count > max_channel_count:
+            print2err("AnalogInput input_channel_count must be between 1 and %d."%(max_channel_count))
+            raise ioDeviceError(self,"AnalogInput input_channel_count must be between 1 and %d."%(max_channel_count))
 
-        # load the MC DLL
-        _DLL = windll.LoadLibrary("cbw32.dll")
-        AnalogInput._DLL = _DLL
+        # load the MC DLL, unless it, or a stand-in for it (see 
+        # benchmarks/mc_daq_decoding.py), has already been loaded.
+        if AnalogInput._DLL is None:
+            AnalogInput._DLL = windll.LoadLibrary("cbw32.dll")
+        _DLL = AnalogInput._DLL
 
         # get the MC API software version number
         _version=c_float(CURRENTREVNUM)
@@ -119,56 +125,22 @@ class AnalogInput(AnalogInputDevice):
         # init AnalogInput device memory handle to 0
         self._memory_handle=0
         
-        # Currently AnalogInput device gets data from a fix set of input channels:
-        # Analog Inputs 0 - 7
-        starting_channel_number=c_int(0)
-        ending_channel_number=c_int(self.input_channel_count-1)
-        save_channels=range(starting_channel_number.value,ending_channel_number.value+1)
-        save_channels=tuple(save_channels)
+        # AnalogInput device gets data from input channels 0 - input_channel_count-1
+        self._low_channel=c_int(0)
+        self._high_channel=c_int(self.input_channel_count-1)
 
         # initialize various counters and index values for use during data collection
         self._current_sample_buffer_index=c_long(0)
         self._last_sample_buffer_index=c_long(0)
         self._samples_received_count=c_long(0)
-        self._local_sample_count_created=0
-
-        # define a class to hold the local copy of sample data from the analog input device.
-        class AnalogInputSampleArray(Structure):
-            _fields_ = [('low_channel', c_int),
-                        ('high_channel', c_int),
-                        ('save_channels', POINTER(c_int)),
-                        ("input_channel_count", c_int),
-                        ("save_channel_count", c_int),
-                        ("count", c_int),
-                        ("indexes", POINTER(c_uint)),
-                        ("values", POINTER(c_uint16))]
-                        #("channels", POINTER(c_ushort))]
-
-            @staticmethod
-            def create(low,high,save_channels,asize):
-                dsb = AnalogInputSampleArray()
-                dsb.indexes=(c_uint * asize)()
-                dsb.values=(c_uint16 * asize)()
-                #dsb.channels=(c_ushort * asize)()
-                dsb.count=asize
-                dsb.low_channel=low
-                dsb.high_channel=high
-                dsb.input_channel_count=c_int(len(save_channels))
-                dsb.save_channel_count=c_int(len(save_channels))
-                dsb.save_channels=(c_int * dsb.save_channel_count)(*save_channels)
-                return dsb
-
-            def zero(self):
-                for d in xrange(self.count):
-                    self.indexes[d]=0
-                    self.values[d]=0
-                    #self.channels[d]=0
-
-        # create the class that will hold a local copy of sample data from the analog input device.
-        self._local_sample_buffer=AnalogInputSampleArray.create(starting_channel_number,
-                                                    ending_channel_number,
-                                                    save_channels,
-                                                    self._input_sample_buffer_size)
+        self._scan_count_created=0
+
+        # numpy view of the sample buffer the MC driver writes scans into;
+        # created when the scan is started.
+        self._sample_array=None
+
+        # values for the event channel fields that are not being recorded.
+        self._channel_padding=[0.0]*(max_channel_count-self.input_channel_count)
 
         # init the analog device status to IDLE.
         self._device_status=c_short(IDLE)
@@ -198,6 +170,10 @@ class AnalogInput(AnalogInputDevice):
                 if self._memory_handle == 0:  
                     print2err("\nERROR ALLOCATING DAQ MEMORY: out of memory\n")
                     sys.exit(1)
+
+                # the scan values are read through a numpy view of the driver
+                # memory, so no values are copied until they are decoded.
+                self._sample_array=N.frombuffer((c_uint16*self._input_sample_buffer_size).from_address(self._memory_handle),dtype=N.uint16)
             except:
                 print2err('------------- Error creating buffers -----------')
                 printExceptionDetailsToStdErr()
@@ -210,8 +186,8 @@ class AnalogInput(AnalogInputDevice):
             self._last_start_recording_time_pre=currentSec()
             try:                
                 self._DLL.cbAInScan(self.device_number, 
-                                             self._local_sample_buffer.low_channel,
-                                             self._local_sample_buffer.high_channel, 
+                                             self._low_channel,
+                                             self._high_channel, 
                                              c_int(self._input_sample_buffer_size), 
                                              byref(self.channel_sampling_rate), 
                                              self.gain, 
@@ -230,12 +206,12 @@ class AnalogInput(AnalogInputDevice):
                                                          # but when ever I give it second param ctypes throws
                                                          # a `4 bytes too much`error
             self._device_status=c_short(IDLE)
-            self._local_sample_buffer.zero()
+            self._sample_array=None
             # initialize various counters and index values for use during data collection
             self._current_sample_buffer_index=c_long(0)
             self._last_sample_buffer_index=c_long(0)
             self._samples_received_count=c_long(0)
-            self._local_sample_count_created=0
+            self._scan_count_created=0
             self._last_start_recording_time_pre=0.0
             self._last_start_recording_time_post=0.0
             
@@ -254,73 +230,80 @@ class AnalogInput(AnalogInputDevice):
 
 
     def _scanningPoll(self):
-        if self._device_status.value == RUNNING:
-            self._DLL.cbGetStatus (self.device_number, 
-                                            byref(self._device_status), 
-                                            byref(self._samples_received_count), 
-                                            byref(self._current_sample_buffer_index))#,AIFUNCTION)
-                                            
-            logged_time = currentSec()
-
-            currentIndex=self._current_sample_buffer_index.value
-            currentSampleCount=self._samples_received_count.value
-
-            if currentSampleCount > 0 and currentIndex > 0:
-                lastIndex=self._last_sample_buffer_index.value
-                samples=self._local_sample_buffer
-
-#                ioHub.print2err("cc: %ld\tec: %ld"%(self._samples_received_count.value,self._local_sample_count_created))
-#                ioHub.print2err("c_index: %ld, l_index: %ld,  c_count: %ld"%(currentIndex,lastIndex,currentSampleCount))
-                if lastIndex != currentIndex:
-
-                        # only for 1208FS
-                        #ulStat = self._DLL.cbAConvertData (c_int32(self.device_number), self._current_sample_buffer_index, self._sample_data_buffer,None)
+        if self._device_status.value != RUNNING:
+            print2err("Error: MC DAQ not responding. Stopping event reporting.")
+            self.enableEventReporting(False)
+            return False
 
-                        self._last_sample_buffer_index=c_long(currentIndex)
+        self._DLL.cbGetStatus (self.device_number, 
+                                        byref(self._device_status), 
+                                        byref(self._samples_received_count), 
+                                        byref(self._current_sample_buffer_index))#,AIFUNCTION)
+                                        
+        logged_time = currentSec()
 
-                        if lastIndex>currentIndex:
-                            for v in xrange(lastIndex,self._input_sample_buffer_size):
-                                #ioHub.print2err("v: %d\t%d"%(v,self._sample_data_buffer[v]))
-                                self._saveScannedEvent(logged_time,samples,v)
+        currentIndex=self._current_sample_buffer_index.value
+        # the driver reports a negative index until the first scan is complete.
+        if self._samples_received_count.value <= 0 or currentIndex < 0:
+            return False
 
-                            lastIndex=0
+        # only for 1208FS
+        #ulStat = self._DLL.cbAConvertData (c_int32(self.device_number), self._current_sample_buffer_index, self._sample_data_buffer,None)
+
+        # Only complete scans are decoded; the values of a partly received
+        # scan are decoded by a later poll. The driver buffer holds a whole
+        # number of scans, so a scan never wraps around the end of the buffer.
+        lastIndex=self._last_sample_buffer_index.value
+        buffer_size=self._input_sample_buffer_size
+        channel_count=self.input_channel_count
+        scan_count=((currentIndex-lastIndex)%buffer_size)//channel_count
+        if scan_count == 0:
+            return False
 
-                        for v in xrange(lastIndex,currentIndex):
-                                #ioHub.print2err("v: %d\t%d"%(v,self._sample_data_buffer[v]))
-                                self._saveScannedEvent(logged_time,samples,v)
-#            ioHub.print2err("-----------")
+        endIndex=lastIndex+scan_count*channel_count
+        sample_array=self._sample_array
+        if endIndex <= buffer_size:
+            values=sample_array[lastIndex:endIndex]
         else:
-        
-           ioHub.print2err("Error: MC DAQ not responding. Exiting...")
-           self.getConfiguration['_ioServer'].shutDown()
-           sys.exit(1)
-
-    def _saveScannedEvent(self,logged_time,samples,sample_index):
-        sample_channel=self._local_sample_count_created%samples.input_channel_count
-
-        samples.values[sample_index]=self._sample_data_buffer[sample_index]
-        
-        #ioHub.print2err("{0}\t{1}\t{2}".format(sample_index,samples.values[sample_index],self._sample_data_buffer[sample_index]))        
-        
-        samples.indexes[sample_index]=self._local_sample_count_created/samples.input_channel_count
-        #samples.channels[sample_index]=sample_channel
-
-        if sample_channel == samples.input_channel_count-1 and self.isReportingEvents():
-            mce=self._createMultiChannelEventList(logged_time,samples,sample_index-sample_channel)
-            self._addNativeEventToBuffer(mce)
-        self._local_sample_count_created+=1
-
-
-    def _createMultiChannelEventList(self,logged_time,samples,index):
+            values=N.concatenate((sample_array[lastIndex:],sample_array[:endIndex-buffer_size]))
+        self._last_sample_buffer_index=c_long(endIndex%buffer_size)
+
+        scans=values.reshape(scan_count,channel_count).astype(N.float64).tolist()
+        if self._block_events:
+            self._createMultiChannelBlockEvent(logged_time,scans)
+        if self._scan_events:
+            self._createMultiChannelEvents(logged_time,scans)
+        self._scan_count_created+=scan_count
+        return True
+
+    def _createMultiChannelBlockEvent(self,logged_time,scans):
+        """
+        Creates one MultiChannelAnalogInputBlockEvent holding scans, a list of
+        scans that each hold input_channel_count channel values.
+        """
+        # timing fields are those of the first scan; see _createMultiChannelEvents.
+        sample_interval=1.0/self.channel_sampling_rate.value
+        device_time=self._scan_count_created/float(self.channel_sampling_rate.value)
+        time=device_time+self._last_start_recording_time_post
+        confidence_interval=self._last_start_recording_time_post-self._last_start_recording_time_pre
+        self._addNativeEventToBuffer(self._createMultiChannelBlockEventList(sample_interval,
+                                        device_time,logged_time,time,confidence_interval,scans))
+
+    def _createMultiChannelEvents(self,logged_time,scans):
+        """
+        Creates a MultiChannelAnalogInputEvent for each of scans, a list of
+        scans that each hold input_channel_count channel values.
+        """
         # For the AnalogInput device, sample time stamps are not
         # provided for the samples, but we will use the device_time field
         # to store a simulated device_time:
-        #   = device sample number for analog input 0 / channel_sampling_rate
-        device_time = float(samples.indexes[index])/ float(self.channel_sampling_rate.value)
+        #   = device scan number / channel_sampling_rate
+        scan_count=len(scans)
+        device_times=((N.arange(scan_count)+self._scan_count_created)/float(self.channel_sampling_rate.value)).tolist()
 
         # ioHub time = device_time + ioHub time when scan start function returned.        
-        time=device_time+self._last_start_recording_time_post
-        
+        start_time=self._last_start_recording_time_post
+
         # The confidence interval is set to the time taken for the start scan call to run, 
         # since we do not know when during the start scan call samples actually
         # started being read by the device.
@@ -336,30 +319,29 @@ class AnalogInput(AnalogInputDevice):
         # The actual delay from when the start scan method is called and when the first
         # sample event is received from the device should be checked and used if possible to
         # make the time attribute more accurate.
-        delay=logged_time-time
-        
-        daqEvent=[0,    # exp id
-            0,              # session id
-            0, #device id (not currently used)
-            Computer._getNextEventID(),  # event id
-            MultiChannelAnalogInputEvent.EVENT_TYPE_ID,    # event type
-            device_time,   # device time
-            logged_time,  # logged time
-            time,       # hub time
-            confidence_interval, # confidence interval
-            delay,        # delay
-            0,                       # filter_id
-            float(samples.values[index]),         # analog input 0
-            float(samples.values[index+1]),       # analog input 1
-            float(samples.values[index+2]),       # analog input 2
-            float(samples.values[index+3]),       # analog input 3
-            float(samples.values[index+4]),       # analog input 4
-            float(samples.values[index+5]),       # analog input 5
-            float(samples.values[index+6]),       # analog input 6
-            float(samples.values[index+7])       # analog input 7
-            ]
-        return daqEvent
 
+        event_type_id=MultiChannelAnalogInputEvent.EVENT_TYPE_ID
+        channel_padding=self._channel_padding
+        getNextEventID=Computer._getNextEventID
+        addNativeEventToBuffer=self._addNativeEventToBuffer
+        for device_time,channel_values in zip(device_times,scans):
+            time=device_time+start_time
+            daqEvent=[0,    # exp id
+                0,              # session id
+                0, #device id (not currently used)
+                getNextEventID(),  # event id
+                event_type_id,    # event type
+                device_time,   # device time
+                logged_time,  # logged time
+                time,       # hub time
+                confidence_interval, # confidence interval
+                logged_time-time,        # delay
+                0                       # filter_id
+                ]
+            # analog input 0 - input_channel_count-1, then 0.0 for the unused channels
+            daqEvent.extend(channel_values)
+            daqEvent.extend(channel_padding)
+            addNativeEventToBuffer(daqEvent)
 
     def _close(self):
         #/* The BACKGROUND operation must be explicitly stopped
@@ -11,15 +11,12 @@ Created on Thu Mar 14 16:32:33 2013
 
 import socket
 import os
+import sys
+import json
+import marshal
 
 
-from yaml import load
-try:
-    from yaml import CLoader as Loader, CDumper as Dumper
-except ImportError:
-    from yaml import Loader, Dumper
-
-from iohub import module_directory,print2err
+from iohub import module_directory,print2err,__version__
 
 class ValidationError(Exception):
     """Base class for exceptions in this module."""
@@ -324,6 +321,10 @@ def isValidList(config_param_name,value,constraints):
         
         if current_length<min_length or current_length>max_length:
             raise NonSupportedValueError(config_param_name,value,constraints)
+
+        # a list with no valid_values constraint can hold any values.
+        if 'valid_values' not in constraints:
+            return value
         
         for v in value:
             if v not in valid_values:
@@ -351,10 +352,212 @@ CONFIG_VALIDATION_KEY_WORD_MAPPINGS=dict(IOHUB_STRING=isValidString,
                                  IOHUB_DATE=isValidDateString)
 ###############################################
 
+# Config file cache
+
+class ConfigCache(object):
+    """
+    Caches the contents of the ioHub yaml config files, and the merged and
+    validated configuration of each device, in a cache file that is shared
+    by the ioHub launches of the current user, so the yaml files do not need
+    to be parsed, and device configurations validated, every time the ioHub
+    Server starts.
+
+    Cached entries are keyed by the modification time and size of the files
+    they were created from, so editing a default_<device>.yaml or
+    supported_config_settings.yaml file is picked up by the next launch.
+    Entries are stored marshalled, so every caller gets its own copy to
+    modify. marshal only stores plain python values, so loading the cache
+    file can not run code; config contents holding other types of values
+    are not cached.
+
+    The cache file is saved in the .iohub directory of the user's home
+    directory, which is created readable by the user only. A cache file
+    that is not owned by the user, or that other users can write to, is
+    not loaded. The IOHUB_CONFIG_CACHE environment variable can be set to
+    the path of the cache file to use, or to 'off' to only cache within a
+    process.
+    """
+    FORMAT_VERSION=2
+    def __init__(self,cache_file_path=None):
+        if cache_file_path is None:
+            cache_file_path=os.environ.get('IOHUB_CONFIG_CACHE') or self._getDefaultCacheFilePath()
+        if cache_file_path and cache_file_path.lower() == 'off':
+            cache_file_path=None
+        self.cache_file_path=cache_file_path
+        # file path -> (file stamp, marshalled file contents)
+        self._files=dict()
+        # device key -> (dependency file stamps, marshalled (device config, config errors))
+        self._devices=dict()
+        self._modified=False
+        self.hit_count=0
+        self.miss_count=0
+        self._load()
+
+    @staticmethod
+    def _getDefaultCacheFilePath():
+        # None, so the cache is only kept in the process, if the per user
+        # cache directory can not be created.
+        cache_dir=os.path.join(os.path.expanduser('~'),'.iohub')
+        try:
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir,0700)
+        except OSError:
+            return None
+        return os.path.join(cache_dir,'config_cache.marshal')
+
+    @staticmethod
+    def _isTrustedFile(file_path):
+        # Only files owned by the user, and not writable by other users,
+        # are trusted. Windows file permissions are not checked.
+        if not hasattr(os,'getuid'):
+            return True
+        file_stat=os.stat(file_path)
+        return file_stat.st_uid == os.getuid() and not file_stat.st_mode & 022
+
+    def _load(self):
+        if self.cache_file_path is None or not os.path.exists(self.cache_file_path):
+            return
+        try:
+            if not self._isTrustedFile(self.cache_file_path):
+                print2err("Not loading the ioHub config cache file %s: it is not owned by the current user, "
+                          "or can be written by other users."%(self.cache_file_path))
+                self.cache_file_path=None
+                return
+            f=open(self.cache_file_path,'rb')
+            try:
+                cache=marshal.load(f)
+            finally:
+                f.close()
+            if cache.get('version') == (self.FORMAT_VERSION,__version__):
+                self._files=cache['files']
+                self._devices=cache['devices']
+        except Exception:
+            # An unreadable cache file is replaced by the next save().
+            self._files=dict()
+            self._devices=dict()
+
+    def save(self):
+        """
+        Saves the cache file if any entries were added since it was loaded.
+        The file is written to a temp file that is then renamed, so an ioHub
+        launch never reads a partially written cache file.
+        """
+        if self.cache_file_path is None or not self._modified:
+            return
+        temp_file_path="%s.%d"%(self.cache_file_path,os.getpid())
+        temp_file_created=False
+        try:
+            # the cache file is created readable and writable by the user only.
+            f=os.fdopen(os.open(temp_file_path,os.O_WRONLY|os.O_CREAT|os.O_EXCL|getattr(os,'O_BINARY',0),0600),'wb')
+            temp_file_created=True
+            try:
+                marshal.dump(dict(version=(self.FORMAT_VERSION,__version__),files=self._files,
+                                  devices=self._devices),f)
+            finally:
+                f.close()
+            if os.path.exists(self.cache_file_path) and sys.platform == 'win32':
+                os.remove(self.cache_file_path)
+            os.rename(temp_file_path,self.cache_file_path)
+            self._modified=False
+        except Exception, e:
+            print2err("Could not save the ioHub config cache file %s: %s"%(self.cache_file_path,e))
+            if temp_file_created and os.path.exists(temp_file_path):
+                os.remove(temp_file_path)
+
+    @staticmethod
+    def _getFileStamp(file_path):
+        file_stat=os.stat(file_path)
+        return file_stat.st_mtime,file_stat.st_size
+
+    def loadYamlFile(self,yaml_file_path):
+        """
+        Returns the contents of a yaml file, parsing the file only if it is
+        not in the cache or has changed since it was cached.
+        """
+        yaml_file_path=os.path.abspath(yaml_file_path)
+        file_stamp=self._getFileStamp(yaml_file_path)
+        cached=self._files.get(yaml_file_path)
+        if cached and cached[0] == file_stamp:
+            self.hit_count+=1
+            return marshal.loads(cached[1])
+
+        self.miss_count+=1
+        # yaml is only imported when a file needs to be parsed.
+        from yaml import load
+        try:
+            from yaml import CLoader as Loader
+        except ImportError:
+            from yaml import Loader
+        yaml_file_contents=load(file(yaml_file_path,'r'), Loader=Loader)
+        try:
+            self._files[yaml_file_path]=file_stamp,marshal.dumps(yaml_file_contents)
+            self._modified=True
+        except ValueError:
+            # files holding values that can not be marshalled are not cached.
+            pass
+        return yaml_file_contents
+
+    @staticmethod
+    def getDeviceKey(device_module_path,device_class_name,device_config):
+        """
+        Returns the cache key of a device configuration, as given in the
+        experiment's ioHub config, or None if the configuration can not be
+        cached.
+        """
+        try:
+            return json.dumps([device_module_path,device_class_name,device_config],sort_keys=True)
+        except (TypeError,ValueError):
+            return None
+
+    def getDeviceConfig(self,device_key):
+        """
+        Returns the cached (merged device config, config errors) of the
+        device_key, or None if there is none, or if one of the files it was
+        created from has changed.
+        """
+        cached=self._devices.get(device_key) if device_key else None
+        try:
+            if cached:
+                dependencies,marshalled_config=cached
+                if [s for p,s in dependencies] == [self._getFileStamp(p) for p,s in dependencies]:
+                    self.hit_count+=1
+                    return marshal.loads(marshalled_config)
+        except OSError:
+            pass
+        self.miss_count+=1
+        return None
+
+    def setDeviceConfig(self,device_key,dependency_file_paths,device_config,config_errors):
+        """
+        Caches the merged and validated device_config, and its config_errors,
+        for device_key. dependency_file_paths are the paths of the files
+        that the merged config was created from.
+        """
+        if device_key is None:
+            return
+        try:
+            dependencies=[(p,self._getFileStamp(p)) for p in dependency_file_paths]
+            self._devices[device_key]=dependencies,marshal.dumps((device_config,config_errors))
+            self._modified=True
+        except Exception:
+            # configs holding values that can not be marshalled are not cached.
+            pass
+
+_config_cache=None
+def getConfigCache():
+    """
+    Returns the ConfigCache of the current process, loading it the first time
+    it is needed.
+    """
+    global _config_cache
+    if _config_cache is None:
+        _config_cache=ConfigCache()
+    return _config_cache
+
 # load a support_settings_values.yaml
 
 def loadYamlFile(yaml_file_path,print_file=False):
-    yaml_file_contents=load(file(yaml_file_path,'r'), Loader=Loader)    
+    yaml_file_contents=getConfigCache().loadYamlFile(yaml_file_path)
 #    if print_file:
 #        print 'yaml_file_contents:'
 #        print 'file: ',yaml_file_path
@@ -421,8 +624,11 @@ def validateConfigDictToFuncMapping(param_validation_func_mapping,current_device
             validation_results['not_found'].append((config_param,config_value))    
     return validation_results
             
+def getDeviceValidationFilePath(relative_module_path):
+    return os.path.join(_current_dir,relative_module_path[len('iohub.devices.'):].replace('.',os.path.sep),'supported_config_settings.yaml')
+
 def validateDeviceConfiguration(relative_module_path,device_class_name,current_device_config):
-    validation_file_path=os.path.join(_current_dir,relative_module_path[len('iohub.devices.'):].replace('.',os.path.sep),'supported_config_settings.yaml')
+    validation_file_path=getDeviceValidationFilePath(relative_module_path)
 
     device_settings_validation_dict=loadYamlFile(validation_file_path,print_file=True)
     device_settings_validation_dict=device_settings_validation_dict[device_settings_validation_dict.keys()[0]]
@@ -14,10 +14,12 @@ Distributed under the terms of the GNU General Public License
 
 import wx
 import sys
+import numpy as N
 
 from psychopy import misc
 
 from .. import Device,Computer
+from .unit_conversions import pixelToCoord, coordToPixel
 from ...constants import DeviceConstants
 from ...util import ioHubDialog, print2err,printExceptionDetailsToStdErr, createErrorResult
 
@@ -45,12 +47,13 @@ class Display(Device):
     DEVICE_TYPE_ID=DeviceConstants.DISPLAY
     DEVICE_TYPE_STRING='DISPLAY'
     
-    __slots__=['_pixels_per_degree','_pix2coord','_coord2pix','_xwindow','_psychopy_monitor']
+    __slots__=['_pixels_per_degree','_pix2coord','_coord2pix','_coord_transform','_xwindow','_psychopy_monitor']
     def __init__(self,*args,**kwargs):
         Device.__init__(self,*args,**kwargs['dconfig'])
         self._psychopy_monitor=None
         self._coord2pix=None
         self._pix2coord=None
+        self._coord_transform=None
         
         if sys.platform == 'linux2':
             self._xwindow=None
@@ -238,6 +241,27 @@ class Display(Device):
         """
         return self.getConfiguration()['runtime_info']['coordinate_bounds']
 
+    def getCoordinateTransform(self):
+        """
+        Get the transform used to convert between native pixel positions and
+        the Display's coordinate space. The transform is a tuple
+        (origin_x, origin_y, scale_x, scale_y), where (origin_x, origin_y) is
+        the native pixel position of the Display's center, and scale_x, scale_y
+        are the number of coordinate units per pixel for each axis. 
+        
+        The transform can be given to the functions in
+        iohub.devices.display.unit_conversions (pixelToCoord, coordToPixel,
+        convertCoord) to convert whole arrays of positions at once, for example
+        columns of event positions read from the ioDataStore.
+
+        Args: 
+            None
+            
+        Returns:
+            tuple: (origin_x, origin_y, scale_x, scale_y) coordinate transform for the Display.
+        """
+        return self.getConfiguration()['runtime_info']['coordinate_transform']
+
     def getDefaultEyeDistance(self):
         """
         Returns the default  distance from the particpant's eye to the Display's
@@ -335,6 +359,59 @@ class Display(Device):
             return self._coord2pix(self,cx,cy,display_index)
         return 0,0
     
+    def _pixel2DisplayCoords(self,px,py,display_index=None):
+        """
+        Array version of _pixel2DisplayCoord; converts arrays of pixel positions
+        to the Display's coordinate space in one call. display_index can be
+        a single display index, an array of display indexes (one per position),
+        or None, in which case all positions are assumed to be on the ioHub
+        Display device. Positions that are not on the ioHub Display device are
+        returned unchanged.
+
+        Args:
+            px (ndarray): horizontal pixel positions.
+            py (ndarray): vertical pixel positions.
+            display_index (int, ndarray, or None): display index of the positions.
+
+        Returns:
+            tuple: (x,y) float64 arrays of the mapped positions.
+        """
+        px=N.asarray(px,dtype=N.float64)
+        py=N.asarray(py,dtype=N.float64)
+        if self._coord_transform is None:
+            return N.zeros_like(px),N.zeros_like(py)
+        cx,cy=pixelToCoord(self._coord_transform,px,py)
+        if display_index is not None:
+            on_display=N.asarray(display_index) == self.getIndex()
+            cx=N.where(on_display,cx,px)
+            cy=N.where(on_display,cy,py)
+        return cx,cy
+
+    def _displayCoords2Pixel(self,cx,cy,display_index=None):
+        """
+        Array version of _displayCoord2Pixel; converts arrays of Display
+        coordinate space positions to pixel positions in one call. 
+        display_index is handled as in _pixel2DisplayCoords.
+
+        Args:
+            cx (ndarray): horizontal Display coordinate space positions.
+            cy (ndarray): vertical Display coordinate space positions.
+            display_index (int, ndarray, or None): display index of the positions.
+
+        Returns:
+            tuple: (px,py) float64 arrays of the mapped pixel positions.
+        """
+        cx=N.asarray(cx,dtype=N.float64)
+        cy=N.asarray(cy,dtype=N.float64)
+        if self._coord_transform is None:
+            return N.zeros_like(cx),N.zeros_like(cy)
+        px,py=coordToPixel(self._coord_transform,cx,cy)
+        if display_index is not None:
+            on_display=N.asarray(display_index) == self.getIndex()
+            px=N.where(on_display,px,cx)
+            py=N.where(on_display,py,cy)
+        return px,py
+
     @classmethod
     def _getComputerDisplayRuntimeInfoList(cls):
         """
@@ -540,76 +617,38 @@ class Display(Device):
             return
 
         # For now, use psychopy unit conversions so that drawing positions match
-        # device positions exactly
+        # device positions exactly. The psychopy pix, cm, deg and norm
+        # conversions are all linear, so they are reduced to a per axis scale
+        # of the pixel offset from the display center once, here, instead of
+        # calling the psychopy.misc functions for every position converted.
         l,t,r,b=self.getBounds() 
         w=r-l
         h=b-t
-                
-        def display2psychopyPix(x,y):
-            x=x-l
-            y=y-t       
-            return (x-w/2),-y+h/2
 
-        def psychopy2displayPix(cx,cy):
-            return l+(cx+w/2),t+(cy-h/2) 
-             
         if coord_type=='pix':
-            def pix2coord(self, x,y,display_index=None):
-                if display_index == self.getIndex(): 
-                    return display2psychopyPix(x,y)
-                return x,y
-            self._pix2coord=pix2coord
-        
-            def coord2pix(self,cx,cy,display_index=None):
-                if display_index == self.getIndex():
-                    return psychopy2displayPix(cx,cy)             
-                return cx,cy
-            self._coord2pix=coord2pix
-            
+            scale_x=scale_y=1.0
         elif coord_type=='cm':
-            def pix2cmcoord(self, x,y,display_index=None):
-                #print2err('Display {0} bounds: {1}'.format(display_index,self.getBounds()))
-                if display_index == self.getIndex():      
-                    ppx,ppy=display2psychopyPix(x,y)
-                    return misc.pix2cm(ppx,self._psychopy_monitor),misc.pix2cm(ppy,self._psychopy_monitor)
-                return x,y
-            self._pix2coord=pix2cmcoord
-        
-            def cmcoord2pix(self,cx,cy,display_index=None):
-                if display_index == self.getIndex():
-                    return psychopy2displayPix(misc.cm2pix(cx,self._psychopy_monitor),misc.cm2pix(cy,self._psychopy_monitor))  
-                return cx,cy
-            self._coord2pix=cmcoord2pix
-            
+            scale_x=scale_y=misc.pix2cm(1.0,self._psychopy_monitor)
         elif coord_type=='deg':
-            def pix2degcoord(self, x,y,display_index=None):
-                if display_index == self.getIndex():      
-                    ppx,ppy=display2psychopyPix(x,y)
-#                    print2err('pix2degcoord: ',(x,y),( ppx,ppy),( misc.pix2deg(ppx,self._psychopy_monitor),misc.pix2deg(ppy,self._psychopy_monitor)))
-                    return misc.pix2deg(ppx,self._psychopy_monitor),misc.pix2deg(ppy,self._psychopy_monitor)
-                return x,y
-            self._pix2coord=pix2degcoord
-        
-            def degcoord2pix(self,degx,degy,display_index=None):
-                if display_index == self.getIndex():
-                    return psychopy2displayPix(misc.deg2pix(degx,self._psychopy_monitor),misc.cm2pix(degy,self._psychopy_monitor))   
-                return degx,degy
-            self._coord2pix=degcoord2pix
-            
+            scale_x=scale_y=misc.pix2deg(1.0,self._psychopy_monitor)
         elif coord_type=='norm':
-            def pix2ncoord(self, x,y,display_index=None):
-                #print2err('Display {0} bounds: {1}'.format(display_index,self.getBounds()))
-                if display_index == self.getIndex():      
-                    ppx,ppy=display2psychopyPix(x,y)
-                    return ppx/((r-l)/2.0),ppy/((b-t)/2.0)
-                return x,y
-            self._pix2coord=pix2ncoord
-        
-            def ncoord2pix(self,nx,ny,display_index=None):
-                if display_index == self.getIndex():
-                    return psychopy2displayPix(nx*((r-l)/2.0),ny*((b-t)/2.0)) 
-                return nx,ny
-            self._coord2pix=ncoord2pix
+            scale_x=2.0/w
+            scale_y=2.0/h
+
+        self._coord_transform=transform=(l+w/2.0,t+h/2.0,scale_x,scale_y)
+        self.getConfiguration()['runtime_info']['coordinate_transform']=transform
+
+        def pix2coord(self, x,y,display_index=None):
+            if display_index == self.getIndex(): 
+                return pixelToCoord(transform,x,y)
+            return x,y
+        self._pix2coord=pix2coord
+    
+        def coord2pix(self,cx,cy,display_index=None):
+            if display_index == self.getIndex():
+                return coordToPixel(transform,cx,cy)
+            return cx,cy
+        self._coord2pix=coord2pix
                     
     def _createPsychopyCalibrationFile(self):
         display_config=self.getConfiguration()
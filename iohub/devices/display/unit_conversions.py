@@ -13,7 +13,12 @@ Distributed under the terms of the GNU General Public License (GPL version 3 or
 .. fileauthor:: Sol Simpson <sol@isolver-software.com>, Josh Borah <josh@a-s-l.com>
 """
 
-from math import atan, tan, sqrt
+from numpy import arctan as atan, tan, sqrt, where
+
+#
+# All conversion functions accept either scalar values or numpy arrays of
+# values, so whole columns of positions can be converted in one call.
+#
 
 #
 # distToPixel
@@ -79,7 +84,7 @@ def distToCa(eye2display, distH, distV):
 
 def caToDist(eye2display, caH, caV):
     distH =  eye2display * tan(caH/57.2958)
-    distV = eye2display * tan(caV/57.2968)
+    distV = eye2display * tan(caV/57.2958)
     return distH,distV
 
 
@@ -94,7 +99,7 @@ def distToFick(eye2display,distH,distV):
 def fickToDist(eye2display, az, el):
     distH = eye2display * tan( az/57.2958 )
     distV = sqrt(eye2display * eye2display + distH * distH) * tan( el/57.2958 )
-    return distH/distV
+    return distH,distV
 
 #
 # Convert between distance coordinates (distH, distV) and 'symmetric angle'
@@ -114,16 +119,38 @@ def saToDist(eye2dsply, saH, saV):
     tansaH_sqrd = tan( saH/57.2958) * tan( saH/57.2958)
     Dsqrd = eye2dsply * eye2dsply
 
-    signsaV = 1.0
-    if saV < 0.0:
-        signsaV = -1.0
-
-    signsaH = 1.0
-    if saH < 0.0:
-        signsaH = -1.0
+    signsaV = where(saV < 0.0, -1.0, 1.0)
+    signsaH = where(saH < 0.0, -1.0, 1.0)
 
     distV = signsaV * sqrt((Dsqrd * tansaV_sqrd  + Dsqrd * tansaH_sqrd * tansaV_sqrd)/ ( 1- tansaH_sqrd * tansaV_sqrd ))
 
     distH = signsaH * sqrt((Dsqrd + distV * distV) * tansaH_sqrd)
 
-    return distV,distH
+    return distH,distV
+
+#
+# Convert between display pixel positions (px, py), which have a top-left origin,
+# and Display device coordinates (cx, cy), which have a center origin and a
+# y axis that increases upwards.
+#
+# The PsychoPy pix, cm, deg and norm unit conversions used by the Display
+# device are all linear scalings of a pixel's offset from the display center,
+# so any of the coordinate types is described by a transform tuple
+# (origin_x, origin_y, scale_x, scale_y), which the Display device calculates
+# once when it is created (see Display.getCoordinateTransform()).
+#
+def pixelToCoord(transform, px, py):
+    origin_x, origin_y, scale_x, scale_y = transform
+    cx = (px - origin_x) * scale_x
+    cy = (origin_y - py) * scale_y
+    return cx, cy
+
+def coordToPixel(transform, cx, cy):
+    origin_x, origin_y, scale_x, scale_y = transform
+    px = origin_x + cx / scale_x
+    py = origin_y - cy / scale_y
+    return px, py
+
+def convertCoord(from_transform, to_transform, cx, cy):
+    px, py = coordToPixel(from_transform, cx, cy)
+    return pixelToCoord(to_transform, px, py)
@@ -106,7 +106,7 @@ class MessageEvent(DeviceEvent):
     IOHUB_DATA_TABLE=EVENT_TYPE_STRING
 
     _newDataTypes=[
-                ('msg_offset', N.float32), 
+                ('msg_offset', N.float64), 
                 ('prefix',N.str,3), 
                 ('text',N.str,128)  
                 ]
@@ -66,7 +66,7 @@ class EyeTrackerDevice(Device):
 
     DEVICE_TYPE_ID=DeviceConstants.EYETRACKER
     DEVICE_TYPE_STRING='EYETRACKER'
-    __slots__=['_latest_sample','_latest_gaze_position', '_runtime_settings']
+    __slots__=['_latest_sample','_latest_gaze_position', '_runtime_settings','_event_detector']
 
     def __init__(self,*args,**kwargs):
         if self.__class__._INSTANCE is not None:
@@ -87,11 +87,40 @@ class EyeTrackerDevice(Device):
 
         # stores the eye tracker runtime related configuration settings from the ioHub .yaml config file
         self._runtime_settings=kwargs['dconfig']['runtime_settings']                                          
+
+        # trackers that do not parse eye events themselves can have fixation,
+        # saccade, and blink events created from their samples by the ioHub.
+        self._event_detector=None
+        detection_settings=kwargs['dconfig'].get('event_detection',{})
+        if detection_settings and detection_settings.get('enable',False) is True:
+            self._createEventDetector(kwargs['dconfig'],detection_settings)
     
         #TODO: Add support for message ID to Message text lookup table in ioDataStore
         # data table that can be used by ET systems that support sending int codes,
         # but not text to tracker at runtime for syncing.
         
+    def _getDegreesPerDisplayUnit(self):
+        # the horizontal visual angle, in deg, of one Display coordinate unit.
+        try:
+            display=self._display_device
+            return 1.0/(display.getPixelsPerDegree()[0]*display.getCoordinateTransform()[2])
+        except:
+            print2err("EyeTracker: could not get Display deg / unit; using 1.0")
+            return 1.0
+
+    def _createEventDetector(self,device_config,detection_settings):
+        from event_detection import EyeEventDetector
+        
+        settings=dict([(k,v) for k,v in detection_settings.iteritems() if k != 'enable'])
+        self._event_detector=EyeEventDetector(self,sampling_rate=device_config.get('runtime_settings',{}).get('sampling_rate'),
+                                              degrees_per_unit=self._getDegreesPerDisplayUnit(),**settings)
+        
+        monitor_event_types=device_config.setdefault('monitor_event_types',[])
+        for event_class_name in EyeEventDetector.EVENT_CLASS_NAMES:
+            if event_class_name not in monitor_event_types:
+                monitor_event_types.append(event_class_name)
+        self._addEventListener(self._event_detector,EyeEventDetector.SAMPLE_EVENT_TYPES)
+
     def trackerTime(self):
         """
         trackerTime returns the current time reported by the 
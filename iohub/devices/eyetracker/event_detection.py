@@ -0,0 +1,468 @@
+"""
+ioHub
+ioHub Common Eye Tracker Interface
+.. file: ioHub/devices/eyetracker/event_detection.py
+
+Copyright (C) 2012-2013 iSolver Software Solutions
+Distributed under the terms of the GNU General Public License (GPL version 3 or any later version).
+
+.. moduleauthor:: Sol Simpson <sol@isolver-software.com> + contributors, please see credits section of documentation.
+.. fileauthor:: Sol Simpson <sol@isolver-software.com>
+"""
+
+import math
+from collections import deque
+
+import numpy as N
+
+from ... import print2err, printExceptionDetailsToStdErr
+from ...constants import EventConstants, EyeTrackerConstants
+from ...util import NumPyRingBuffer
+from .. import Computer, DeviceEvent
+from eye_events import (MonocularEyeSampleEvent, BinocularEyeSampleEvent,
+                        FixationStartEvent,FixationEndEvent,SaccadeStartEvent,
+                        SaccadeEndEvent,BlinkStartEvent,BlinkEndEvent)
+
+# The per eye sample fields that are copied to the start_, end_ and
+# average_ fields of the eye events created by the detector.
+EYE_FIELDS=('gaze_x','gaze_y','gaze_z','angle_x','angle_y','raw_x','raw_y',
+            'pupil_measure1','pupil_measure1_type','pupil_measure2','pupil_measure2_type',
+            'ppd_x','ppd_y','velocity_x','velocity_y','velocity_xy')
+_GAZE_X,_GAZE_Y,_PUPIL=0,1,7
+_VELOCITY_X,_VELOCITY_Y,_VELOCITY_XY=13,14,15
+_TYPE_FIELDS=(8,10)
+
+# The base DeviceEvent fields that detected events take from the sample that
+# starts or ends them.
+_SAMPLE_TIME_INDEXES=(DeviceEvent.EVENT_DEVICE_TIME_INDEX,DeviceEvent.EVENT_LOGGED_TIME_INDEX,
+                      DeviceEvent.EVENT_HUB_TIME_INDEX,DeviceEvent.EVENT_CONFIDENCE_INTERVAL_INDEX,
+                      DeviceEvent.EVENT_DELAY_INDEX)
+
+FIXATION,SACCADE,BLINK=range(3)
+
+def _eyeFieldIndexes(sample_class,prefix=''):
+    names=sample_class.CLASS_ATTRIBUTE_NAMES
+    return [names.index(prefix+n) for n in EYE_FIELDS]
+
+def _createEvent(event_class,sample,fields):
+    names=event_class.CLASS_ATTRIBUTE_NAMES
+    e=[0]*len(names)
+    for i in _SAMPLE_TIME_INDEXES:
+        e[i]=sample[i]
+    e[DeviceEvent.EVENT_ID_INDEX]=Computer._getNextEventID()
+    e[DeviceEvent.EVENT_TYPE_ID_INDEX]=event_class.EVENT_TYPE_ID
+    for n,v in fields.iteritems():
+        e[names.index(n)]=v
+    return e
+
+def velocityFilterKernel(filter_type,filter_length):
+    """
+    Returns the coefficients that are correlated with filter_length
+    consecutive positions to give the velocity of the middle position,
+    in position units per sample.
+
+    * DIFFERENCE: The difference between the last and first positions of the window.
+    * SAVITZKY_GOLAY: Savitzky-Golay first derivative of a 2nd order polynomial fit to the window.
+    """
+    half_length=filter_length//2
+    if filter_length < 3 or filter_length%2 == 0:
+        raise ValueError("velocity_filter_length must be an odd number >= 3: %s"%(str(filter_length)))
+    if filter_type == 'DIFFERENCE':
+        kernel=N.zeros(filter_length)
+        kernel[0]=-1.0/(2*half_length)
+        kernel[-1]=1.0/(2*half_length)
+        return kernel
+    if filter_type == 'SAVITZKY_GOLAY':
+        k=N.arange(-half_length,half_length+1,dtype=N.float64)
+        return k/N.sum(k*k)
+    raise ValueError("Unknown velocity_filter type: %s"%(str(filter_type)))
+
+class _DispersionWindow(object):
+    """
+    Holds the samples of an I-DT fixation candidate window, tracking the
+    min and max x and y position of the window using monotonic queues so
+    that samples can be added to and removed from the window in O(1) time.
+    """
+    def __init__(self):
+        self.items=deque()
+        self._ranges=[deque(),deque(),deque(),deque()]
+        self._next_index=0
+        self._first_index=0
+
+    def __len__(self):
+        return len(self.items)
+
+    def append(self,item,x,y):
+        i=self._next_index
+        self._next_index+=1
+        self.items.append(item)
+        min_x,max_x,min_y,max_y=self._ranges
+        while min_x and min_x[-1][1] >= x:
+            min_x.pop()
+        min_x.append((i,x))
+        while max_x and max_x[-1][1] <= x:
+            max_x.pop()
+        max_x.append((i,x))
+        while min_y and min_y[-1][1] >= y:
+            min_y.pop()
+        min_y.append((i,y))
+        while max_y and max_y[-1][1] <= y:
+            max_y.pop()
+        max_y.append((i,y))
+
+    def popleft(self):
+        i=self._first_index
+        self._first_index+=1
+        for r in self._ranges:
+            if r[0][0] == i:
+                r.popleft()
+        return self.items.popleft()
+
+    def bounds(self):
+        min_x,max_x,min_y,max_y=self._ranges
+        return min_x[0][1],max_x[0][1],min_y[0][1],max_y[0][1]
+
+    def dispersion(self):
+        min_x,max_x,min_y,max_y=self.bounds()
+        return (max_x-min_x)+(max_y-min_y)
+
+    def clear(self):
+        self.items.clear()
+        for r in self._ranges:
+            r.clear()
+        self._first_index=self._next_index
+
+class _EyeChannel(object):
+    """
+    Holds the position history and event state for the samples of one eye.
+    """
+    def __init__(self,detector,eye,field_indexes):
+        self.detector=detector
+        self.eye=eye
+        self.field_indexes=field_indexes
+        history_length=max(len(detector.velocity_kernel)-1,1)
+        self._x_history=NumPyRingBuffer(history_length,N.float64)
+        self._y_history=NumPyRingBuffer(history_length,N.float64)
+        self._t_history=NumPyRingBuffer(history_length,N.float64)
+        self._sample_history=deque(maxlen=history_length)
+        self._last_label=None
+        self._window=_DispersionWindow()
+        self._fixation_bounds=None
+        self._resetEventState()
+
+    def reset(self):
+        # an event that has been started is ended at the last sample labelled.
+        self._endEvent()
+        self._x_history.clear()
+        self._y_history.clear()
+        self._t_history.clear()
+        self._sample_history.clear()
+        self._last_label=None
+        self._window.clear()
+        self._fixation_bounds=None
+
+    def _resetEventState(self):
+        self._event_label=None
+        self._event_start=None
+        self._event_end=None
+        self._event_sums=None
+        self._event_peaks=None
+        self._event_count=0
+        self._event_started=False
+
+    def addSamples(self,samples):
+        detector=self.detector
+        fi=self.field_indexes
+        sample_count=len(samples)
+        gaze_x=N.fromiter((s[fi[_GAZE_X]] for s in samples),N.float64,sample_count)
+        gaze_y=N.fromiter((s[fi[_GAZE_Y]] for s in samples),N.float64,sample_count)
+        pupil=N.fromiter((s[fi[_PUPIL]] for s in samples),N.float64,sample_count)
+        times=N.fromiter((s[DeviceEvent.EVENT_HUB_TIME_INDEX] for s in samples),N.float64,sample_count)
+        missing=(pupil <= 0.0)|~N.isfinite(gaze_x)|~N.isfinite(gaze_y)
+        gaze_x[missing]=N.nan
+        gaze_y[missing]=N.nan
+
+        # Restart the position history and event state after a gap in the
+        # sample stream, i.e. when recording was stopped and restarted.
+        max_sample_gap=detector.max_sample_gap
+        if self._t_history.getLength() > 0 and times[0]-self._lastValues(self._t_history)[-1] > max_sample_gap:
+            self.reset()
+        start=0
+        for gap in N.nonzero(N.diff(times) > max_sample_gap)[0]+1:
+            self._addSampleSegment(samples[start:gap],gaze_x[start:gap],gaze_y[start:gap],times[start:gap])
+            self.reset()
+            start=gap
+        self._addSampleSegment(samples[start:],gaze_x[start:],gaze_y[start:],times[start:])
+
+    def _lastValues(self,ring):
+        count=ring.getLength()
+        return ring.getElements()[ring.max_size-count:]
+
+    def _addSampleSegment(self,samples,gaze_x,gaze_y,times):
+        detector=self.detector
+        kernel=detector.velocity_kernel
+        half_length=len(kernel)//2
+
+        x_all=N.concatenate((self._lastValues(self._x_history),gaze_x))
+        y_all=N.concatenate((self._lastValues(self._y_history),gaze_y))
+        t_all=N.concatenate((self._lastValues(self._t_history),times))
+        all_samples=list(self._sample_history)+list(samples)
+
+        if len(x_all) >= len(kernel):
+            sample_interval=detector.sample_interval
+            if sample_interval is None:
+                sample_interval=N.median(N.diff(t_all))
+            velocity_scale=detector.degrees_per_unit/sample_interval
+            velocity_x=N.correlate(x_all,kernel,'valid')*velocity_scale
+            velocity_y=N.correlate(y_all,kernel,'valid')*velocity_scale
+            velocity_xy=N.hypot(velocity_x,velocity_y)
+            center_missing=N.isnan(x_all[half_length:half_length+len(velocity_x)])
+            centers=all_samples[half_length:half_length+len(velocity_x)]
+            label=detector.algorithm == 'IDT' and self._labelIDT or self._labelIVT
+            for i,sample in enumerate(centers):
+                label(sample,center_missing[i],velocity_x[i],velocity_y[i],velocity_xy[i])
+
+        self._x_history.extend(x_all)
+        self._y_history.extend(y_all)
+        self._t_history.extend(t_all)
+        self._sample_history.extend(all_samples)
+
+    def _sampleValues(self,sample,velocity_x,velocity_y,velocity_xy):
+        values=[sample[i] for i in self.field_indexes]
+        if velocity_xy == velocity_xy:
+            values[_VELOCITY_X]=velocity_x
+            values[_VELOCITY_Y]=velocity_y
+            values[_VELOCITY_XY]=velocity_xy
+        else:
+            values[_VELOCITY_X]=values[_VELOCITY_Y]=values[_VELOCITY_XY]=0.0
+        return values
+
+    def _labelIVT(self,sample,missing,velocity_x,velocity_y,velocity_xy):
+        if missing:
+            label=BLINK
+        elif velocity_xy != velocity_xy:
+            # the velocity window includes missing samples; keep the current label.
+            label=self._last_label
+            if label is None or label == BLINK:
+                label=SACCADE
+        elif velocity_xy > self.detector.velocity_threshold:
+            label=SACCADE
+        else:
+            label=FIXATION
+        self._last_label=label
+        self._addLabelledSample(label,sample,self._sampleValues(sample,velocity_x,velocity_y,velocity_xy))
+
+    def _labelIDT(self,sample,missing,velocity_x,velocity_y,velocity_xy):
+        detector=self.detector
+        window=self._window
+        if missing:
+            self._fixation_bounds=None
+            while window:
+                self._addLabelledSample(SACCADE,*window.popleft())
+            window.clear()
+            self._addLabelledSample(BLINK,sample,self._sampleValues(sample,velocity_x,velocity_y,velocity_xy))
+            return
+
+        values=self._sampleValues(sample,velocity_x,velocity_y,velocity_xy)
+        x=values[_GAZE_X]*detector.degrees_per_unit
+        y=values[_GAZE_Y]*detector.degrees_per_unit
+
+        if self._fixation_bounds:
+            min_x,max_x,min_y,max_y=self._fixation_bounds
+            min_x,max_x=min(min_x,x),max(max_x,x)
+            min_y,max_y=min(min_y,y),max(max_y,y)
+            if (max_x-min_x)+(max_y-min_y) <= detector.dispersion_threshold:
+                self._fixation_bounds=min_x,max_x,min_y,max_y
+                self._addLabelledSample(FIXATION,sample,values)
+                return
+            # the sample ends the fixation; it starts the next fixation candidate window.
+            self._fixation_bounds=None
+            self._endEvent()
+
+        window.append((sample,values),x,y)
+        hub_time=DeviceEvent.EVENT_HUB_TIME_INDEX
+        while len(window) > 1 and window.items[-1][0][hub_time]-window.items[0][0][hub_time] >= detector.min_fixation_duration:
+            if window.dispersion() <= detector.dispersion_threshold:
+                self._fixation_bounds=window.bounds()
+                while window:
+                    self._addLabelledSample(FIXATION,*window.popleft())
+                break
+            self._addLabelledSample(SACCADE,*window.popleft())
+
+    def _addLabelledSample(self,label,sample,values):
+        if label != self._event_label:
+            self._endEvent()
+            self._event_label=label
+            self._event_start=(sample,values)
+            self._event_sums=list(values)
+            self._event_peaks=[abs(values[_VELOCITY_X]),abs(values[_VELOCITY_Y]),values[_VELOCITY_XY]]
+            self._event_count=1
+        else:
+            sums=self._event_sums
+            for i,v in enumerate(values):
+                sums[i]+=v
+            peaks=self._event_peaks
+            peaks[0]=max(peaks[0],abs(values[_VELOCITY_X]))
+            peaks[1]=max(peaks[1],abs(values[_VELOCITY_Y]))
+            peaks[2]=max(peaks[2],values[_VELOCITY_XY])
+            self._event_count+=1
+        self._event_end=(sample,values)
+
+        if not self._event_started and self._eventDuration() >= self.detector.min_durations[label]:
+            self._event_started=True
+            self._startEvent()
+
+    def _eventDuration(self):
+        hub_time=DeviceEvent.EVENT_HUB_TIME_INDEX
+        return self._event_end[0][hub_time]-self._event_start[0][hub_time]
+
+    def _startEvent(self):
+        sample,values=self._event_start
+        label=self._event_label
+        if label == BLINK:
+            self.detector._addDetectedEvent(BlinkStartEvent,sample,dict(eye=self.eye,status=0))
+            return
+        fields=dict(zip(EYE_FIELDS,values))
+        fields['eye']=self.eye
+        fields['status']=0
+        self.detector._addDetectedEvent(label == FIXATION and FixationStartEvent or SaccadeStartEvent,sample,fields)
+
+    def _endEvent(self):
+        if self._event_started:
+            start_sample,start_values=self._event_start
+            end_sample,end_values=self._event_end
+            duration=self._eventDuration()
+            label=self._event_label
+            fields=dict(eye=self.eye,duration=duration,status=0)
+            if label == BLINK:
+                self.detector._addDetectedEvent(BlinkEndEvent,end_sample,fields)
+            else:
+                for n,v in zip(EYE_FIELDS,start_values):
+                    fields['start_'+n]=v
+                for n,v in zip(EYE_FIELDS,end_values):
+                    fields['end_'+n]=v
+                count=float(self._event_count)
+                averages=[s/count for s in self._event_sums]
+                for i in _TYPE_FIELDS:
+                    averages[i]=start_values[i]
+                fields['average_velocity_x'],fields['average_velocity_y'],fields['average_velocity_xy']=averages[_VELOCITY_X:]
+                fields['peak_velocity_x'],fields['peak_velocity_y'],fields['peak_velocity_xy']=self._event_peaks
+                if label == FIXATION:
+                    for n,v in zip(EYE_FIELDS,averages):
+                        fields['average_'+n]=v
+                    self.detector._addDetectedEvent(FixationEndEvent,end_sample,fields)
+                else:
+                    degrees_per_unit=self.detector.degrees_per_unit
+                    amplitude_x=(end_values[_GAZE_X]-start_values[_GAZE_X])*degrees_per_unit
+                    amplitude_y=(end_values[_GAZE_Y]-start_values[_GAZE_Y])*degrees_per_unit
+                    fields['amplitude_x']=amplitude_x
+                    fields['amplitude_y']=amplitude_y
+                    fields['angle']=math.degrees(math.atan2(amplitude_y,amplitude_x))
+                    self.detector._addDetectedEvent(SaccadeEndEvent,end_sample,fields)
+        self._resetEventState()
+
+class EyeEventDetector(object):
+    """
+    EyeEventDetector creates fixation, saccade, and blink events from the eye
+    samples of an eye tracker that does not parse eye events itself.
+    The detector is added as an event listener for the eye tracker's sample
+    events, and processes each batch of samples it is given by the ioHub
+    Server. Detected events are added to the eye tracker's native event buffer,
+    so they are handled like any other event the eye tracker creates.
+
+    Eye velocity is calculated for every sample using a DIFFERENCE or
+    SAVITZKY_GOLAY filter of velocity_filter_length samples. The velocity of
+    a sample is therefore known velocity_filter_length // 2 samples after it
+    is received, and detected events are delayed by at least that much.
+
+    Two detection algorithms are supported:
+
+    * IVT: Samples with a velocity greater than velocity_threshold deg / sec are saccade samples; other samples are fixation samples.
+    * IDT: A fixation starts when the samples within min_fixation_duration have a dispersion ( x range + y range ) of no more than dispersion_threshold degrees, and continues until a sample would increase the dispersion above the threshold. Samples not part of a fixation are saccade samples.
+
+    With either algorithm, samples with no pupil or gaze position data are
+    blink samples. A start event is created once a run of samples with the
+    same label has lasted for the min. duration set for that event type,
+    and the end event is created when the run of samples ends.
+    """
+    EVENT_CLASS_NAMES=['FixationStartEvent','FixationEndEvent','SaccadeStartEvent',
+                       'SaccadeEndEvent','BlinkStartEvent','BlinkEndEvent']
+    SAMPLE_EVENT_TYPES=[EventConstants.MONOCULAR_EYE_SAMPLE,EventConstants.BINOCULAR_EYE_SAMPLE]
+
+    _MONOCULAR_FIELD_INDEXES=_eyeFieldIndexes(MonocularEyeSampleEvent)
+    _LEFT_FIELD_INDEXES=_eyeFieldIndexes(BinocularEyeSampleEvent,'left_')
+    _RIGHT_FIELD_INDEXES=_eyeFieldIndexes(BinocularEyeSampleEvent,'right_')
+    _MONOCULAR_EYE_INDEX=MonocularEyeSampleEvent.CLASS_ATTRIBUTE_NAMES.index('eye')
+
+    def __init__(self,eye_tracker,algorithm='IVT',velocity_filter='SAVITZKY_GOLAY',
+                 velocity_filter_length=5,velocity_threshold=30.0,dispersion_threshold=1.0,
+                 min_fixation_duration=0.05,min_saccade_duration=0.01,min_blink_duration=0.05,
+                 sampling_rate=None,degrees_per_unit=1.0):
+        if algorithm not in ('IVT','IDT'):
+            raise ValueError("Unknown event detection algorithm: %s"%(str(algorithm)))
+        self._eye_tracker=eye_tracker
+        self.algorithm=algorithm
+        self.velocity_kernel=velocityFilterKernel(velocity_filter,velocity_filter_length)
+        self.velocity_threshold=velocity_threshold
+        self.dispersion_threshold=dispersion_threshold
+        self.min_fixation_duration=min_fixation_duration
+        self.min_durations={FIXATION:min_fixation_duration,SACCADE:min_saccade_duration,BLINK:min_blink_duration}
+        self.sample_interval=None
+        if isinstance(sampling_rate,(int,long,float)) and sampling_rate > 0:
+            self.sample_interval=1.0/sampling_rate
+        self.max_sample_gap=max(self.sample_interval or 0.0,0.004)*10.0
+        self.degrees_per_unit=degrees_per_unit
+        self._channels=dict()
+        self._detected_events=[]
+
+    def _getChannel(self,key,eye,field_indexes):
+        channel=self._channels.get(key)
+        if channel is None:
+            channel=self._channels[key]=_EyeChannel(self,eye,field_indexes)
+        return channel
+
+    def _handleEvent(self,event):
+        self._handleEvents([event,])
+
+    def _handleEvents(self,events):
+        # events are all of the same type.
+        try:
+            etype=events[0][DeviceEvent.EVENT_TYPE_ID_INDEX]
+            if etype == EventConstants.BINOCULAR_EYE_SAMPLE:
+                self._getChannel('left',EyeTrackerConstants.LEFT_EYE,self._LEFT_FIELD_INDEXES).addSamples(events)
+                self._getChannel('right',EyeTrackerConstants.RIGHT_EYE,self._RIGHT_FIELD_INDEXES).addSamples(events)
+            elif etype == EventConstants.MONOCULAR_EYE_SAMPLE:
+                eye_index=self._MONOCULAR_EYE_INDEX
+                eye=events[0][eye_index]
+                start=0
+                for i in xrange(1,len(events)+1):
+                    if i == len(events) or events[i][eye_index] != eye:
+                        self._getChannel(('mono',eye),eye,self._MONOCULAR_FIELD_INDEXES).addSamples(events[start:i])
+                        if i < len(events):
+                            eye=events[i][eye_index]
+                            start=i
+            self._sendDetectedEvents()
+        except:
+            print2err("Error in EyeEventDetector._handleEvents")
+            printExceptionDetailsToStdErr()
+            self._detected_events=[]
+
+    def _addDetectedEvent(self,event_class,sample,fields):
+        self._detected_events.append((sample[DeviceEvent.EVENT_HUB_TIME_INDEX],event_class,sample,fields))
+
+    def _sendDetectedEvents(self):
+        if self._detected_events:
+            detected_events=self._detected_events
+            self._detected_events=[]
+            # events from each eye are merged into time order.
+            detected_events.sort(key=lambda d: d[0])
+            for event_time,event_class,sample,fields in detected_events:
+                self._eye_tracker._addNativeEventToBuffer(_createEvent(event_class,sample,fields))
+
+    def reset(self):
+        """
+        Clears the sample history of every eye, ending any event in progress.
+        """
+        for channel in self._channels.values():
+            channel.reset()
+        self._sendDetectedEvents()
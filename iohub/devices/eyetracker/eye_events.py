@@ -754,7 +754,7 @@ class FixationEndEvent(EyeTrackerEvent):
     # 58 fields
     _newDataTypes = [
                     ('eye', 'u1'),
-                    ('duration','f4'),
+                    ('duration','f8'),
                     ('start_gaze_x','f4'),
                     ('start_gaze_y','f4'),
                     ('start_gaze_z','f4'),
@@ -1128,7 +1128,7 @@ class SaccadeStartEvent(FixationStartEvent):
 class SaccadeEndEvent(EyeTrackerEvent):
     _newDataTypes = [
                     ('eye', 'u1'),
-                    ('duration','f4'),
+                    ('duration','f8'),
                     ('amplitude_x','f4'),
                     ('amplitude_y','f4'),
                     ('angle', 'f4'),
@@ -1461,7 +1461,7 @@ class BlinkEndEvent(EyeTrackerEvent):
                                                 #   EyeTrackerConstants.SIMULATED_MONOCULAR
 
 
-                        ('duration','f4'),  # The duration of the blink event.
+                        ('duration','f8'),  # The duration of the blink event.
 
                         ('status', 'u1')    # An available status byte for the eye tracker blink start event.
                                             # Meaning is completely tracker dependent.
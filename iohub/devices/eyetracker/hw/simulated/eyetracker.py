@@ -0,0 +1,468 @@
+"""
+ioHub
+Common Eye Tracker Interface
+.. file: ioHub/devices/eyetracker/hw/simulated/eyetracker.py
+
+Copyright (C) 2012-2013 iSolver Software Solutions
+Distributed under the terms of the GNU General Public License (GPL version 3 or any later version).
+
+.. moduleauthor:: Sol Simpson <sol@isolver-software.com> + contributors, please see credits section of documentation.
+.. fileauthor:: Sol Simpson <sol@isolver-software.com>
+"""
+
+import math
+import random
+
+from ..... import print2err, printExceptionDetailsToStdErr, createErrorResult
+from .....constants import EventConstants, EyeTrackerConstants
+from .... import Computer
+from ... import EyeTrackerDevice
+from ...eye_events import *
+
+FIXATION,SACCADE,BLINK='FIXATION','SACCADE','BLINK'
+
+class ScriptedGazePath(object):
+    """
+    ScriptedGazePath generates the gaze position of a simulated eye that
+    fixates a sequence of targets, making a saccade between each target and
+    blinking every blink_interval sec.msec.
+
+    targets is a list of [x, y, duration] fixation targets, in Display
+    coordinate units, that is repeated for as long as the path is used.
+    If targets is empty, targets are positioned randomly within
+    target_bounds ( left, top, right, bottom ) and fixated for 0.5 - 1.5
+    times fixation_duration.
+
+    The path is made of phases ( FIXATION, SACCADE or BLINK ). Saccades
+    follow a cosine velocity profile, so saccade velocity peaks at
+    pi / 2 times the average saccade velocity.
+    """
+    def __init__(self,targets,target_bounds,fixation_duration=0.25,saccade_duration=0.04,
+                 blink_interval=0.0,blink_duration=0.15):
+        self.targets=[tuple(t) for t in targets or []]
+        self.target_bounds=target_bounds
+        self.fixation_duration=fixation_duration
+        self.saccade_duration=saccade_duration
+        self.blink_interval=blink_interval
+        self.blink_duration=blink_duration
+        self.reset(0.0)
+
+    def reset(self,start_time):
+        self._target_index=0
+        self._last_blink_time=start_time
+        x,y,duration=self._nextTarget()
+        self.phase=(FIXATION,start_time,start_time+duration,x,y,x,y)
+
+    def _nextTarget(self):
+        if self.targets:
+            target=self.targets[self._target_index%len(self.targets)]
+            self._target_index+=1
+            return target
+        l,t,r,b=self.target_bounds
+        return (random.uniform(l,r),random.uniform(b,t),
+                random.uniform(0.5,1.5)*self.fixation_duration)
+
+    def _nextPhase(self):
+        kind,start_time,end_time,x0,y0,x1,y1=self.phase
+        if kind == FIXATION:
+            x,y,self._next_fixation_duration=self._nextTarget()
+            return (SACCADE,end_time,end_time+self.saccade_duration,x1,y1,x,y)
+        if kind == SACCADE and self.blink_interval > 0.0 and end_time-self._last_blink_time >= self.blink_interval:
+            self._last_blink_time=end_time
+            return (BLINK,end_time,end_time+self.blink_duration,x1,y1,x1,y1)
+        return (FIXATION,end_time,end_time+self._next_fixation_duration,x1,y1,x1,y1)
+
+    def position(self,t):
+        """
+        Returns ( phase_changed, kind, x, y ) for time t. Times must be
+        given in increasing order.
+        """
+        phase_changed=False
+        while t >= self.phase[2]:
+            self.phase=self._nextPhase()
+            phase_changed=True
+        kind,start_time,end_time,x0,y0,x1,y1=self.phase
+        if kind != SACCADE:
+            return phase_changed,kind,x1,y1
+        s=(1.0-math.cos(math.pi*(t-start_time)/(end_time-start_time)))/2.0
+        return phase_changed,kind,x0+(x1-x0)*s,y0+(y1-y0)*s
+
+class EyeTracker(EyeTrackerDevice):
+    """
+    The Simulated EyeTracker class implements the ioHub Common Eye Tracker
+    Interface without any eye tracking hardware. Monocular or binocular eye
+    samples are generated at the configured sampling_rate, with the gaze
+    position following either a scripted gaze path or the ioHub Mouse
+    position. When a scripted gaze path is used, fixation, saccade, and
+    blink events are created for the path, as a tracker with a native
+    event parser would.
+
+    Samples are generated each time the device is polled, for every sample
+    time that has passed since the last poll, so sampling rates of several
+    kHz can be simulated with a device_timer interval of a few msec. Native
+    events are added with _addNativeEventToBuffer and converted to ioHub
+    events by _getIOHubEventObject, the same path used by hardware eye tracker
+    implementations, so the simulated tracker can be used to measure ioHub
+    event throughput and latency.
+    """
+    EVENT_CLASS_NAMES=['MonocularEyeSampleEvent','BinocularEyeSampleEvent','FixationStartEvent',
+                         'FixationEndEvent', 'SaccadeStartEvent', 'SaccadeEndEvent',
+                         'BlinkStartEvent', 'BlinkEndEvent']
+
+    _PARSER_EVENT_CLASSES={EventConstants.FIXATION_START:FixationStartEvent,
+                           EventConstants.FIXATION_END:FixationEndEvent,
+                           EventConstants.SACCADE_START:SaccadeStartEvent,
+                           EventConstants.SACCADE_END:SaccadeEndEvent,
+                           EventConstants.BLINK_START:BlinkStartEvent,
+                           EventConstants.BLINK_END:BlinkEndEvent}
+
+    PUPIL_SIZE=4.0
+
+    __slots__=['_connected','_recording','_sample_interval','_eyes','_gaze_source',
+               '_gaze_path','_gaze_noise','_sample_delay','_parse_events','_degrees_per_unit',
+               '_start_time','_sample_index','_last_poll_time','_phase_start']
+
+    def __init__(self, *args,**kwargs):
+        EyeTrackerDevice.__init__(self,*args,**kwargs)
+
+        runtime_settings=self._runtime_settings
+        self._sample_interval=1.0/runtime_settings.get('sampling_rate',1000)
+        track_eyes=runtime_settings.get('track_eyes','BINOCULAR')
+        if track_eyes == 'BINOCULAR':
+            self._eyes=(EyeTrackerConstants.LEFT_EYE,EyeTrackerConstants.RIGHT_EYE)
+        else:
+            self._eyes=(getattr(EyeTrackerConstants,track_eyes),)
+
+        simulation=kwargs['dconfig'].get('simulation',{})
+        self._gaze_source=simulation.get('gaze_source','PATH')
+        self._gaze_noise=simulation.get('gaze_noise',0.0)
+        self._sample_delay=simulation.get('sample_delay',0.0)
+        self._parse_events=self._gaze_source == 'PATH' and simulation.get('parse_events',True) is True
+        self._degrees_per_unit=self._getDegreesPerDisplayUnit()
+
+        l,t,r,b=self._display_device.getCoordBounds()
+        target_bounds=(l*0.8,t*0.8,r*0.8,b*0.8)
+        self._gaze_path=ScriptedGazePath(simulation.get('path',[]),target_bounds,
+                                         simulation.get('fixation_duration',0.25),
+                                         simulation.get('saccade_duration',0.04),
+                                         simulation.get('blink_interval',0.0),
+                                         simulation.get('blink_duration',0.15))
+
+        self._recording=False
+        self._start_time=0.0
+        self._sample_index=0
+        self._last_poll_time=0.0
+        self._phase_start=None
+        self._connected=False
+        self.setConnectionState(True)
+
+    def trackerTime(self):
+        """
+        trackerTime returns the current time reported by the simulated eye
+        tracker, which is the ioHub time, in sec.msec-usec format.
+
+        Args:
+            None
+
+        Return:
+            float: The current simulated eye tracker time.
+        """
+        return Computer.getTime()
+
+    def trackerSec(self):
+        """
+        trackerSec returns the same value as trackerTime, as the simulated eye
+        tracker time base is already sec.msec-usec.
+
+        Args:
+            None
+
+        Return:
+            float: The current simulated eye tracker time.
+        """
+        return Computer.getTime()
+
+    def setConnectionState(self,enable):
+        """
+        setConnectionState connects ( setConnectionState(True) ) or
+        disconnects ( setConnectionState(False) ) the simulated eye tracker.
+        A connection is opened when the ioHub Server process is started.
+
+        Args:
+            enable (bool): True = enable the connection, False = disable the connection.
+
+        Return:
+            bool: indicates the current connection state.
+        """
+        if not isinstance(enable,bool):
+            return createErrorResult("INVALID_METHOD_ARGUMENT_VALUE",error_message="The enable arguement value provided is not recognized",method="EyeTracker.setConnectionState",arguement='enable', value=enable)
+        if enable is False and self._recording:
+            self.setRecordingState(False)
+        self._connected=enable
+        return self._connected
+
+    def isConnected(self):
+        """
+        isConnected returns whether the simulated eye tracker is connected.
+
+        Args:
+            None
+
+        Return:
+            bool:  True = the simulated eye tracker is connected. False otherwise.
+        """
+        return self._connected
+
+    def runSetupProcedure(self,starting_state=EyeTrackerConstants.DEFAULT_SETUP_PROCEDURE):
+        """
+        The simulated eye tracker does not need to be calibrated, so
+        runSetupProcedure returns immediately.
+
+        Args:
+            None
+
+        Returns:
+            int: EyeTrackerConstants.EYETRACKER_OK
+        """
+        return EyeTrackerConstants.EYETRACKER_OK
+
+    def enableEventReporting(self,enabled=True):
+        """
+        Device type independent method equal to the EyeTracker.setRecordingState method.
+        """
+        return self.setRecordingState(enabled)
+
+    def setRecordingState(self,recording):
+        """
+        The setRecordingState method is used to start or stop the generation
+        of eye data by the simulated eye tracker. When recording starts, the
+        scripted gaze path is restarted from its first target.
+
+        Args:
+            recording (bool): if True, the eye tracker will start recordng data.; false = stop recording data.
+
+        Return:
+            bool: the current recording state of the eye tracking device
+        """
+        try:
+            if not isinstance(recording,bool):
+                return createErrorResult("INVALID_METHOD_ARGUMENT_VALUE",
+                    error_message="The recording arguement value provided is not a boolean.",
+                    method="EyeTracker.setRecordingState",arguement='recording', value=recording)
+
+            if self._connected and recording is True and not self._recording:
+                self._start_time=Computer.getTime()
+                self._sample_index=0
+                self._last_poll_time=self._start_time
+                self._gaze_path.reset(self._start_time)
+                self._phase_start=None
+                EyeTrackerDevice.enableEventReporting(self,True)
+                self._recording=True
+            elif recording is False and self._recording:
+                self._poll()
+                if self._phase_start:
+                    x,y=self._gaze_path.phase[5:7]
+                    self._endPhase(self._start_time+(self._sample_index-1)*self._sample_interval,x,y)
+                self._recording=False
+                EyeTrackerDevice.enableEventReporting(self,False)
+                if self._event_detector:
+                    self._event_detector.reset()
+                self._latest_sample=None
+                self._latest_gaze_position=None
+            return self._recording
+        except Exception, e:
+            return createErrorResult("IOHUB_DEVICE_EXCEPTION",
+                    error_message="An unhandled exception occurred on the ioHub Server Process.",
+                    method="EyeTracker.setRecordingState", error=e)
+
+    def isRecordingEnabled(self):
+        """
+        The isRecordingEnabled method indicates if the simulated eye tracker
+        is currently recording data or not.
+
+        Args:
+           None
+
+        Return:
+            bool: True == the device is recording data; False == Recording is not occurring
+        """
+        return self._recording
+
+    def _getGazePosition(self,sample_time):
+        if self._gaze_source == 'MOUSE':
+            mouse=self._iohub_server.deviceDict.get('Mouse')
+            if mouse is None:
+                return False,FIXATION,0.0,0.0
+            x,y=mouse.getPosition()
+            return False,FIXATION,x,y
+        return self._gaze_path.position(sample_time)
+
+    def _poll(self):
+        try:
+            if not self._recording:
+                return False
+
+            logged_time=Computer.getTime()
+            confidence_interval=logged_time-self._last_poll_time
+            self._last_poll_time=logged_time
+
+            eyes=self._eyes
+            if len(eyes) == 2:
+                sample_type=EventConstants.BINOCULAR_EYE_SAMPLE
+            else:
+                sample_type=EventConstants.MONOCULAR_EYE_SAMPLE
+            noise=self._gaze_noise
+            gauss=random.gauss
+            add_event=self._addNativeEventToBuffer
+            start_time=self._start_time
+            sample_interval=self._sample_interval
+            last_sample_time=logged_time-self._sample_delay
+            sample_index=self._sample_index
+            sample_time=start_time+sample_index*sample_interval
+
+            while sample_time <= last_sample_time:
+                phase_changed,kind,x,y=self._getGazePosition(sample_time)
+                if self._parse_events and (phase_changed or self._phase_start is None):
+                    if self._phase_start:
+                        # the phase the path has moved on from ends where the new phase starts.
+                        self._endPhase(sample_time-sample_interval,*self._gaze_path.phase[3:5])
+                    self._startPhase(sample_time,logged_time,confidence_interval)
+
+                if kind == BLINK:
+                    gaze=(0.0,0.0,0.0,0.0)
+                    pupil=0.0
+                elif noise > 0.0:
+                    gaze=(x+gauss(0.0,noise),y+gauss(0.0,noise),x+gauss(0.0,noise),y+gauss(0.0,noise))
+                    pupil=self.PUPIL_SIZE
+                else:
+                    gaze=(x,y,x,y)
+                    pupil=self.PUPIL_SIZE
+                add_event((sample_type,sample_time,logged_time,confidence_interval,gaze,pupil))
+
+                sample_index+=1
+                sample_time=start_time+sample_index*sample_interval
+            self._sample_index=sample_index
+            return True
+        except Exception:
+            print2err("ERROR occurred during poll:")
+            printExceptionDetailsToStdErr()
+
+    def _startPhase(self,sample_time,logged_time,confidence_interval):
+        kind,start_time,end_time,x0,y0,x1,y1=self._gaze_path.phase
+        self._phase_start=(kind,sample_time,logged_time,confidence_interval,x0,y0)
+        if kind == BLINK:
+            etype=EventConstants.BLINK_START
+            fields=dict()
+        else:
+            etype=kind == FIXATION and EventConstants.FIXATION_START or EventConstants.SACCADE_START
+            fields=dict(gaze_x=x0,gaze_y=y0,pupil_measure1=self.PUPIL_SIZE,
+                        pupil_measure1_type=EyeTrackerConstants.PUPIL_DIAMETER)
+        for eye in self._eyes:
+            self._addNativeEventToBuffer((etype,sample_time,logged_time,confidence_interval,eye,fields))
+
+    def _endPhase(self,sample_time,x1,y1):
+        kind,start_time,logged_time,confidence_interval,x0,y0=self._phase_start
+        self._phase_start=None
+        duration=sample_time-start_time
+        logged_time=self._last_poll_time
+        if kind == BLINK:
+            etype=EventConstants.BLINK_END
+            fields=dict(duration=duration)
+        elif kind == FIXATION:
+            etype=EventConstants.FIXATION_END
+            fields=dict(duration=duration)
+            for prefix in ('start_','end_','average_'):
+                fields[prefix+'gaze_x']=x0
+                fields[prefix+'gaze_y']=y0
+                fields[prefix+'pupil_measure1']=self.PUPIL_SIZE
+                fields[prefix+'pupil_measure1_type']=EyeTrackerConstants.PUPIL_DIAMETER
+        else:
+            etype=EventConstants.SACCADE_END
+            amplitude_x=(x1-x0)*self._degrees_per_unit
+            amplitude_y=(y1-y0)*self._degrees_per_unit
+            amplitude=math.hypot(amplitude_x,amplitude_y)
+            phase_duration=max(self._gaze_path.saccade_duration,sample_time-start_time)
+            fields=dict(duration=duration,amplitude_x=amplitude_x,amplitude_y=amplitude_y,
+                        angle=math.degrees(math.atan2(amplitude_y,amplitude_x)),
+                        start_gaze_x=x0,start_gaze_y=y0,end_gaze_x=x1,end_gaze_y=y1,
+                        average_velocity_xy=amplitude/phase_duration,
+                        peak_velocity_xy=amplitude*math.pi/(2.0*phase_duration))
+            for prefix in ('start_','end_'):
+                fields[prefix+'pupil_measure1']=self.PUPIL_SIZE
+                fields[prefix+'pupil_measure1_type']=EyeTrackerConstants.PUPIL_DIAMETER
+        for eye in self._eyes:
+            self._addNativeEventToBuffer((etype,sample_time,logged_time,confidence_interval,eye,fields))
+
+    def _getIOHubEventObject(self,native_event_data):
+        """
+        The _getIOHubEventObject method is called by the ioHub Server to convert
+        the native simulated eye tracker events to the appropriate ioHub Event
+        type representation.
+
+        Samples are native tuples of ( event_type, device_time, logged_time,
+        confidence_interval, ( left_x, left_y, right_x, right_y ), pupil_size ),
+        and parser events native tuples of ( event_type, device_time,
+        logged_time, confidence_interval, eye, field_value_dict ). Events
+        created by the ioHub eye event detector are already ioHub event lists.
+
+        Args:
+            native_event_data: the native event tuple or list.
+
+        Returns:
+            list: The appropriate ioHub Event type in list form.
+        """
+        if isinstance(native_event_data,list):
+            return native_event_data
+        try:
+            event_type,device_time,logged_time,confidence_interval=native_event_data[:4]
+            delay=logged_time-device_time
+            if event_type == EventConstants.BINOCULAR_EYE_SAMPLE:
+                (left_x,left_y,right_x,right_y),pupil=native_event_data[4:]
+                pupil_type=EyeTrackerConstants.PUPIL_DIAMETER
+                undefined=EyeTrackerConstants.UNDEFINED
+                sample=[0,0,0,Computer._getNextEventID(),event_type,device_time,logged_time,
+                        device_time,confidence_interval,delay,0,
+                        left_x,left_y,undefined,undefined,undefined,undefined,undefined,undefined,
+                        undefined,undefined,pupil,pupil_type,undefined,undefined,undefined,undefined,
+                        undefined,undefined,undefined,
+                        right_x,right_y,undefined,undefined,undefined,undefined,undefined,undefined,
+                        undefined,undefined,pupil,pupil_type,undefined,undefined,undefined,undefined,
+                        undefined,undefined,undefined,
+                        0]
+                self._latest_sample=sample
+                if pupil > 0.0:
+                    self._latest_gaze_position=(left_x+right_x)/2.0,(left_y+right_y)/2.0
+                return sample
+            if event_type == EventConstants.MONOCULAR_EYE_SAMPLE:
+                (gaze_x,gaze_y,right_x,right_y),pupil=native_event_data[4:]
+                undefined=EyeTrackerConstants.UNDEFINED
+                sample=[0,0,0,Computer._getNextEventID(),event_type,device_time,logged_time,
+                        device_time,confidence_interval,delay,0,self._eyes[0],
+                        gaze_x,gaze_y,undefined,undefined,undefined,undefined,undefined,undefined,
+                        undefined,undefined,pupil,EyeTrackerConstants.PUPIL_DIAMETER,undefined,undefined,
+                        undefined,undefined,undefined,undefined,undefined,
+                        0]
+                self._latest_sample=sample
+                if pupil > 0.0:
+                    self._latest_gaze_position=gaze_x,gaze_y
+                return sample
+
+            eye,fields=native_event_data[4:]
+            attribute_names=self._PARSER_EVENT_CLASSES[event_type].CLASS_ATTRIBUTE_NAMES
+            e=[EyeTrackerConstants.UNDEFINED]*len(attribute_names)
+            e[3:11]=[Computer._getNextEventID(),event_type,device_time,logged_time,
+                     device_time,confidence_interval,delay,0]
+            e[attribute_names.index('eye')]=eye
+            for name,value in fields.iteritems():
+                e[attribute_names.index(name)]=value
+            return e
+        except Exception:
+            print2err("ERROR occurred during _getIOHubEventObject:")
+            printExceptionDetailsToStdErr()
+
+    def _eyeTrackerToDisplayCoords(self,eyetracker_point):
+        # simulated gaze positions are already in Display coordinates.
+        return eyetracker_point
+
+    def _displayToEyeTrackerCoords(self,display_x,display_y):
+        return display_x,display_y
@@ -401,6 +401,10 @@ class EyeTracker(EyeTrackerDevice):
         Returns:
             tuple: The appropriate ioHub Event type in list form.
         """
+        if isinstance(native_event_data,list):
+            # fixation, saccade, and blink events created by the ioHub eye
+            # event detector are already in ioHub event list format.
+            return native_event_data
         try:
             logged_time,device_event_time,iohub_event_time,data_delay,eye_data_event=native_event_data
             
@@ -0,0 +1,422 @@
+"""
+ioHub
+.. file: ioHub/devices/filters.py
+
+Copyright (C) 2012-2013 iSolver Software Solutions
+Distributed under the terms of the GNU General Public License (GPL version 3 or any later version).
+
+.. moduleauthor:: Sol Simpson <sol@isolver-software.com> + contributors, please see credits section of documentation.
+.. fileauthor:: Sol Simpson <sol@isolver-software.com>
+"""
+
+import numpy as N
+from numpy.lib.stride_tricks import as_strided
+
+from ..constants import EventConstants
+from ..util import convertCamelToSnake
+from . import DeviceEvent
+
+# filter_id is saved as an int16, so at most 15 filters can be created.
+MAX_FILTER_COUNT=15
+
+_EYE_PREFIXES=('','left_','right_')
+
+def savitzkyGolayKernel(window_length,polynomial_order,position,derivative=0):
+    """
+    Returns the coefficients that are correlated with window_length
+    consecutive values to give the value (derivative=0), or the first
+    derivative in value units per sample (derivative=1), at index position
+    of the window of a polynomial_order least squares polynomial fit to the
+    window.
+    """
+    if polynomial_order >= window_length:
+        raise ValueError("polynomial_order must be less than window_length: %d, %d"%(polynomial_order,window_length))
+    k=N.arange(-position,window_length-position,dtype=N.float64)
+    A=N.vander(k,polynomial_order+1)[:,::-1]
+    return N.linalg.pinv(A)[derivative]
+
+class _FilterChannel(object):
+    """
+    The value history and held events of one event type handled by a
+    WindowEventFilter.
+    """
+    __slots__=['input_indexes','output_indexes','history','held','last_time']
+    def __init__(self,input_indexes,output_indexes):
+        self.input_indexes=input_indexes
+        self.output_indexes=output_indexes
+        self.reset()
+
+    def reset(self):
+        self.history=None
+        self.held=[]
+        self.last_time=None
+
+class EventFilter(object):
+    """
+    Base class of the ioHub Server event filters. A filter handles the events
+    of the event_types given, and passes all other events on unchanged.
+    Each filter has a filter_id bit, which is or'ed into the filter_id field
+    of each event the filter handles.
+    """
+    FILTER_TYPE_STRING=None
+    def __init__(self,device,filter_id,name,event_types,**kwargs):
+        self.device=device
+        self.filter_id=filter_id
+        self.name=name
+        self.event_type_ids=[getattr(EventConstants,convertCamelToSnake(n[:-5],False)) for n in event_types]
+        if kwargs:
+            raise ValueError("Unknown %s filter settings: %s"%(self.FILTER_TYPE_STRING,', '.join(kwargs.keys())))
+
+    def filterEvents(self,events):
+        """
+        Filters a list of events in the order they were received, and returns
+        the list of events that are ready to be passed on.
+        """
+        handled=self.event_type_ids
+        output=[]
+        typed_events=dict()
+        for e in events:
+            etype=e[DeviceEvent.EVENT_TYPE_ID_INDEX]
+            if etype in handled:
+                typed=typed_events.get(etype)
+                if typed is None:
+                    typed_events[etype]=[e,]
+                else:
+                    typed.append(e)
+            else:
+                output.append(e)
+        for etype,typed in typed_events.iteritems():
+            output.extend(self._filterTypeEvents(etype,typed))
+        return output
+
+    def _filterTypeEvents(self,etype,events):
+        raise NotImplementedError()
+
+    def hasHeldEvents(self):
+        """
+        Returns True if the filter is holding events it needs later events
+        to finish filtering.
+        """
+        return False
+
+    def flush(self):
+        """
+        Finishes filtering any held events, as if the last event received
+        was repeated, and returns them.
+        """
+        return []
+
+class WindowEventFilter(EventFilter):
+    """
+    Base class of filters that calculate new field values for each event
+    from the values of a window of window_length consecutive events of the
+    same type. The window ends delay events after the event being filtered,
+    so an event is held until delay later events have been received.
+
+    When the time between two events of the same type is more than max_gap
+    sec.msec, i.e. recording was stopped and restarted, held events are
+    flushed and filtering starts again. At the start of filtering, the
+    first event's values are repeated to fill the window.
+    """
+    def __init__(self,device,filter_id,name,event_types,window_length,delay=0,fields=None,max_gap=0.1,**kwargs):
+        EventFilter.__init__(self,device,filter_id,name,event_types,**kwargs)
+        if delay < 0 or delay >= window_length:
+            raise ValueError("%s filter delay must be >= 0 and < window_length: %d, %d"%(self.FILTER_TYPE_STRING,delay,window_length))
+        self.window_length=window_length
+        self.delay=delay
+        self.fields=fields
+        self.max_gap=max_gap
+        self._channels=dict()
+
+    def _getFieldIndexes(self,event_class):
+        """
+        Returns the indexes of the event fields used as the filter input,
+        and the indexes of the event fields the filter output is saved to.
+        """
+        names=event_class.CLASS_ATTRIBUTE_NAMES
+        fields=self.fields
+        if not fields:
+            fields=[p+a for p in _EYE_PREFIXES for a in ('gaze_x','gaze_y') if p+a in names]
+        if not fields:
+            raise ValueError("%s filter: no fields given for %s"%(self.name,event_class.__name__))
+        indexes=[names.index(f) for f in fields]
+        return indexes,indexes
+
+    def _getChannel(self,etype):
+        channel=self._channels.get(etype)
+        if channel is None:
+            input_indexes,output_indexes=self._getFieldIndexes(EventConstants.getClass(etype))
+            channel=_FilterChannel(input_indexes,output_indexes)
+            self._channels[etype]=channel
+        return channel
+
+    def _filterTypeEvents(self,etype,events):
+        channel=self._getChannel(etype)
+        # column 0 is the event time, the rest are the input fields.
+        indexes=[DeviceEvent.EVENT_HUB_TIME_INDEX,]+channel.input_indexes
+        values=N.array([[e[i] for i in indexes] for e in events],dtype=N.float64)
+
+        output=[]
+        times=values[:,0]
+        if channel.last_time is not None and times[0]-channel.last_time > self.max_gap:
+            output.extend(self._flushChannel(channel))
+        start=0
+        for gap in N.nonzero(N.diff(times) > self.max_gap)[0]+1:
+            output.extend(self._addEvents(channel,events[start:gap],values[start:gap]))
+            output.extend(self._flushChannel(channel))
+            start=gap
+        output.extend(self._addEvents(channel,events[start:],values[start:]))
+        return output
+
+    def _addEvents(self,channel,events,values):
+        history_length=self.window_length-1
+        if channel.history is None:
+            channel.history=N.repeat(values[:1],history_length,axis=0)
+        all_values=N.concatenate((channel.history,values))
+        pending=channel.held+list(events)
+
+        ready_count=len(pending)-self.delay
+        if ready_count > 0:
+            self._updateEvents(channel,pending[:ready_count],all_values,len(all_values)-len(pending))
+            channel.held=pending[ready_count:]
+        else:
+            ready_count=0
+            channel.held=pending
+
+        channel.history=all_values[len(all_values)-history_length:]
+        channel.last_time=values[-1,0]
+        return pending[:ready_count]
+
+    def _flushChannel(self,channel):
+        held=channel.held
+        if held:
+            history=channel.history
+            all_values=N.concatenate((history,N.repeat(history[-1:],self.delay,axis=0)))
+            self._updateEvents(channel,held,all_values,len(history)-len(held))
+        channel.reset()
+        return held
+
+    def _updateEvents(self,channel,events,all_values,first_row):
+        """
+        Saves the filter output for the events, whose values are the rows of
+        all_values starting at first_row, to the events.
+        """
+        window_start=first_row-(self.window_length-1-self.delay)
+        s0,s1=all_values.strides
+        windows=as_strided(all_values[window_start:],shape=(len(events),self.window_length,all_values.shape[1]),strides=(s0,s0,s1))
+        filtered=self._filterWindows(windows)
+
+        filter_id=self.filter_id
+        output_indexes=channel.output_indexes
+        for e,row in zip(events,filtered.tolist()):
+            for i,v in zip(output_indexes,row):
+                e[i]=v
+            e[DeviceEvent.EVENT_FILTER_ID_INDEX]|=filter_id
+
+    def _filterWindows(self,windows):
+        """
+        Returns the filter output for each window of the windows array, which
+        has the shape (event count, window_length, 1 + input field count).
+        """
+        raise NotImplementedError()
+
+    def hasHeldEvents(self):
+        for channel in self._channels.itervalues():
+            if channel.held:
+                return True
+        return False
+
+    def flush(self):
+        output=[]
+        for channel in self._channels.itervalues():
+            output.extend(self._flushChannel(channel))
+        return output
+
+class MovingAverageFilter(WindowEventFilter):
+    """
+    Replaces each field value with the mean of the window of values.
+    """
+    FILTER_TYPE_STRING='MOVING_AVERAGE'
+    def _filterWindows(self,windows):
+        return windows[:,:,1:].mean(axis=1)
+
+class MedianFilter(WindowEventFilter):
+    """
+    Replaces each field value with the median of the window of values.
+    """
+    FILTER_TYPE_STRING='MEDIAN'
+    def _filterWindows(self,windows):
+        return N.median(windows[:,:,1:],axis=1)
+
+class SavitzkyGolayFilter(WindowEventFilter):
+    """
+    Replaces each field value with the value of a polynomial_order
+    least squares polynomial fit to the window of values.
+    """
+    FILTER_TYPE_STRING='SAVITZKY_GOLAY'
+    def __init__(self,device,filter_id,name,event_types,window_length,polynomial_order=2,**kwargs):
+        WindowEventFilter.__init__(self,device,filter_id,name,event_types,window_length,**kwargs)
+        self.kernel=savitzkyGolayKernel(window_length,polynomial_order,window_length-1-self.delay)
+
+    def _filterWindows(self,windows):
+        return N.tensordot(windows[:,:,1:],self.kernel,axes=([1],[0]))
+
+class VelocityFilter(WindowEventFilter):
+    """
+    Sets the velocity_x, velocity_y, and velocity_xy fields of eye samples
+    to the first derivative of a polynomial_order least squares polynomial
+    fit to the window of gaze positions of each eye. Velocity is in
+    degrees / second if the device can give the degrees per display unit
+    of the gaze positions, otherwise it is in gaze position units / second.
+
+    A delay of window_length // 2 gives the velocity at the middle of the
+    window, which is less noisy than the velocity at the end of the window.
+    """
+    FILTER_TYPE_STRING='VELOCITY'
+    def __init__(self,device,filter_id,name,event_types,window_length,polynomial_order=2,**kwargs):
+        WindowEventFilter.__init__(self,device,filter_id,name,event_types,window_length,**kwargs)
+        self.kernel=savitzkyGolayKernel(window_length,polynomial_order,window_length-1-self.delay,derivative=1)
+        self.degrees_per_unit=1.0
+        getDegreesPerDisplayUnit=getattr(device,'_getDegreesPerDisplayUnit',None)
+        if getDegreesPerDisplayUnit:
+            self.degrees_per_unit=getDegreesPerDisplayUnit()
+
+    def _getFieldIndexes(self,event_class):
+        names=event_class.CLASS_ATTRIBUTE_NAMES
+        input_indexes=[]
+        output_indexes=[]
+        for p in _EYE_PREFIXES:
+            if p+'gaze_x' in names and p+'velocity_x' in names:
+                input_indexes.extend([names.index(p+'gaze_x'),names.index(p+'gaze_y')])
+                output_indexes.extend([names.index(p+'velocity_x'),names.index(p+'velocity_y'),names.index(p+'velocity_xy')])
+        if not input_indexes:
+            raise ValueError("%s filter: %s has no gaze and velocity fields."%(self.name,event_class.__name__))
+        return input_indexes,output_indexes
+
+    def _filterWindows(self,windows):
+        # per sample derivative scaled by the sample interval of each window.
+        sample_intervals=(windows[:,-1,0]-windows[:,0,0])/(self.window_length-1)
+        sample_intervals[sample_intervals <= 0.0]=N.inf
+        velocity=N.tensordot(windows[:,:,1:],self.kernel,axes=([1],[0]))
+        velocity*=(self.degrees_per_unit/sample_intervals)[:,N.newaxis]
+        eye_count=velocity.shape[1]//2
+        output=N.empty((len(velocity),eye_count*3))
+        output[:,0::3]=velocity[:,0::2]
+        output[:,1::3]=velocity[:,1::2]
+        output[:,2::3]=N.hypot(velocity[:,0::2],velocity[:,1::2])
+        return output
+
+class HeuristicFilter(WindowEventFilter):
+    """
+    The heuristic eye position filter described by Stampe (1993). Level 1
+    replaces single event spikes, where a value is above or below both the
+    previous and next values, with the nearer of those values. Level 2 also
+    replaces two event spikes. Events are held for level later events.
+
+    Each event is compared to the filtered value of the previous event, so
+    events are filtered one at a time.
+    """
+    FILTER_TYPE_STRING='HEURISTIC'
+    def __init__(self,device,filter_id,name,event_types,level=1,**kwargs):
+        if level not in (1,2):
+            raise ValueError("HEURISTIC filter level must be 1 or 2: %s"%(str(level)))
+        WindowEventFilter.__init__(self,device,filter_id,name,event_types,level+2,delay=level,**kwargs)
+
+    def _filterWindows(self,windows):
+        # windows are overlapping views of the filter's value history, so a
+        # value filtered here is the previous value of the next window, and
+        # is kept in the history for the next call.
+        level_2=self.delay == 2
+        column_count=windows.shape[2]
+        for w in windows:
+            for c in xrange(1,column_count):
+                previous,current,following=w[0,c],w[1,c],w[2,c]
+                if level_2:
+                    after_following=w[3,c]
+                    if (current-previous)*(current-after_following) > 0.0 and (following-previous)*(following-after_following) > 0.0 and (current-previous)*(following-previous) > 0.0:
+                        if abs(current-previous) <= abs(current-after_following):
+                            current=following=previous
+                        else:
+                            current=following=after_following
+                        w[2,c]=following
+                if (current-previous)*(current-following) > 0.0:
+                    if abs(current-previous) <= abs(current-following):
+                        current=previous
+                    else:
+                        current=following
+                w[1,c]=current
+        return windows[:,1,1:].copy()
+
+class DecimationFilter(EventFilter):
+    """
+    Passes on one of every factor events of each event type, and drops
+    the rest.
+    """
+    FILTER_TYPE_STRING='DECIMATE'
+    def __init__(self,device,filter_id,name,event_types,factor,**kwargs):
+        EventFilter.__init__(self,device,filter_id,name,event_types,**kwargs)
+        if factor < 1:
+            raise ValueError("DECIMATE filter factor must be >= 1: %s"%(str(factor)))
+        self.factor=factor
+        self._counts=dict()
+
+    def _filterTypeEvents(self,etype,events):
+        count=self._counts.get(etype,0)
+        first=(self.factor-count%self.factor)%self.factor
+        self._counts[etype]=count+len(events)
+        output=events[first::self.factor]
+        filter_id=self.filter_id
+        for e in output:
+            e[DeviceEvent.EVENT_FILTER_ID_INDEX]|=filter_id
+        return output
+
+EVENT_FILTER_TYPES=dict([(c.FILTER_TYPE_STRING,c) for c in (MovingAverageFilter,MedianFilter,SavitzkyGolayFilter,
+                                                              VelocityFilter,HeuristicFilter,DecimationFilter)])
+
+class EventFilterChain(object):
+    """
+    The filters run by the ioHub Server on the events of one device, after
+    the device's native events are converted to ioHub events and before they
+    are given to the device's event listeners. Filters are run in order.
+
+    If save_raw_events is True, a copy of each event is saved before it is
+    filtered, so the unfiltered events can be saved to the ioDataStore as well;
+    they have the same event_id as the filtered event and a filter_id of 0.
+
+    Filters that need later events to filter an event hold it until those
+    events are received. If the device has not sent any events for
+    hold_timeout sec.msec, held events are flushed.
+    """
+    def __init__(self,filters,save_raw_events=False,hold_timeout=0.05):
+        self.filters=filters
+        self.save_raw_events=save_raw_events
+        self.hold_timeout=hold_timeout
+        self.raw_events=[]
+        self.last_input_time=0.0
+
+    def filterEvents(self,events,input_time):
+        self.last_input_time=input_time
+        if self.save_raw_events:
+            self.raw_events.extend(events)
+            events=[list(e) for e in events]
+        for event_filter in self.filters:
+            events=event_filter.filterEvents(events)
+        return events
+
+    def hasHeldEvents(self):
+        for event_filter in self.filters:
+            if event_filter.hasHeldEvents():
+                return True
+        return False
+
+    def flushStale(self,current_time):
+        """
+        Flushes the events held by the filters if no events have been received
+        for hold_timeout sec.msec. Returns the flushed events.
+        """
+        if current_time-self.last_input_time < self.hold_timeout or not self.hasHeldEvents():
+            return []
+        events=[]
+        for event_filter in self.filters:
+            events=event_filter.filterEvents(events)+event_filter.flush()
+        return events
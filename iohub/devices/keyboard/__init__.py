@@ -21,6 +21,7 @@ Keyboard=None
 import numpy as N
 
 from ... import print2err,printExceptionDetailsToStdErr
+from ...util import OrderedDict
 from ...constants import KeyboardConstants, DeviceConstants, EventConstants, ModifierKeyCodes
 from .. import Device, Computer
 
@@ -40,88 +41,66 @@ class ioHubKeyboardDevice(Device):
 
     DEVICE_TYPE_ID=DeviceConstants.KEYBOARD
     DEVICE_TYPE_STRING='KEYBOARD'
-    __slots__=['_key_states','_lastProcessedEventID','_modifier_states','_modifier_value','_report_auto_repeats']
+    # The maximum number of keys tracked as being pressed. If more keys are
+    # pressed without being released (i.e. because the release events were
+    # not received), the key that was pressed first is forgotten.
+    MAX_PRESSED_KEYS=32
+    # press and release events must reach _updateKeyState in event_id order.
+    ORDERED_EVENT_HANDLING=True
+    __slots__=['_key_states','_key_id_index','_modifier_states','_modifier_value','_report_auto_repeats']
     def __init__(self,*args,**kwargs):
-        self._key_states=dict()
-        self._lastProcessedEventID=0
+        self._key_states=OrderedDict()
+        self._key_id_index=KeyboardInputEvent.CLASS_ATTRIBUTE_NAMES.index('key_id')
         self._modifier_states=dict(zip(ModifierKeyCodes._mod_names,[False]*len(ModifierKeyCodes._mod_names)))
         self._modifier_value=0
         self._report_auto_repeats=kwargs.get('report_auto_repeat_press_events',False)
         Device.__init__(self,*args,**kwargs)
 
-    def clearEvents(self):
-        cEvents=self._getCharEvents()
-        [self._addNativeEventToBuffer(e) for e in cEvents]
-        Device.clearEvents(self)
-
     def _handleEvent(self,e):
         Device._handleEvent(self,e)
-        cEvents=self._getCharEvents()
-        [self._addNativeEventToBuffer(e) for e in cEvents]
+        charEvent=self._updateKeyState(e)
+        if charEvent is not None:
+            self._addNativeEventToBuffer(charEvent)
 
-    def _getCharEvents(self):
+    def _updateKeyState(self,e):
         '''
-        _getCharEvents is called automatically as part of the keyboard event handling process within ioHub.
+        _updateKeyState is called automatically for each keyboard event as part of the keyboard event handling process within ioHub.
         Users do not need to call it, thus why it is a _ 'private' method.
 
-        _getCharEvents uses KeyPress and KeyRelease Events to generate KeyboardChar Events.
+        _updateKeyState uses KeyPress and KeyRelease Events to generate KeyboardChar Events.
         A KeyboardChar event has the same base event structure as a KeyReleaseEvent, but adds a
         field to hold an associated key press event and a second field to hold the duration
         that the keyboard char was pressed.
 
-        When a KeyPressEvent is detected, the event is stored in a dictionary using the event.key as the dict key.
-        Repeated 'press' events for the same key are ignored (i.e. keyboard repeats when you hold a key down).
+        When a KeyPressEvent is received, the event is stored in a dictionary using the event.key_id as the dict key.
+        Repeated 'press' events for the same key are counted, but otherwise ignored (i.e. keyboard repeats when you hold a key down).
 
-        When a KeyReleaseEvent is detected, the event.key is checked for in the char dict. If it is present,
+        When a KeyReleaseEvent is received, the event.key_id is checked for in the dict. If it is present,
         a KeyboardCharEvent is created using the KeyboardReleaseEvent as the basis for the Char event, and the
-        KeyboardStartEvent that was stored in the dict for the startEvent, and duration calculated fields.
+        KeyboardPressEvent that was stored in the dict for the press event, and duration calculated fields,
+        and is returned. None is returned for all other events.
         '''
-        press_events=[e for e in self.getEvents(event_type_id=EventConstants.KEYBOARD_PRESS,clearEvents=False) if e[DeviceEvent.EVENT_ID_INDEX] > self._lastProcessedEventID]
-        release_events=[e for e in self.getEvents(event_type_id=EventConstants.KEYBOARD_RELEASE,clearEvents=False) if e[DeviceEvent.EVENT_ID_INDEX] > self._lastProcessedEventID]
-
-        key_id_index=KeyboardInputEvent.CLASS_ATTRIBUTE_NAMES.index('key_id')
-        
-        keypress_events=[]
-        keyrelease_events=[]
-        if len(press_events)>0:
-            i=-1
-            while press_events[i][DeviceEvent.EVENT_ID_INDEX] > self._lastProcessedEventID:
-                self._lastProcessedEventID=press_events[i][DeviceEvent.EVENT_ID_INDEX]
-                keypress_events.insert(0,press_events[i])
-                if i+len(press_events)==0:
-                    break
-                i-=1
-
-        if len(release_events)>0:
-            i=-1
-            while release_events[i][DeviceEvent.EVENT_ID_INDEX] > self._lastProcessedEventID:
-                self._lastProcessedEventID=release_events[i][DeviceEvent.EVENT_ID_INDEX]
-                keyrelease_events.insert(0,release_events[i])
-                if i+len(release_events)==0:
-                    break
-                i-=1
-
-        press_events=None
-        release_events=None
-
-        charEvents=[]
-
-        for e in keypress_events:
-            if e[key_id_index] not in self._key_states.keys():              
-                    self._key_states[e[key_id_index]]=[e,0]
+        etype=e[DeviceEvent.EVENT_TYPE_ID_INDEX]
+        if etype == EventConstants.KEYBOARD_PRESS:
+            key_id=e[self._key_id_index]
+            key_state=self._key_states.get(key_id)
+            if key_state is None:
+                self._key_states[key_id]=[e,0]
+                if len(self._key_states) > self.MAX_PRESSED_KEYS:
+                    self._key_states.popitem(last=False)
             else:
-                    self._key_states[e[key_id_index]][1]+=1
-        for e in keyrelease_events:
-            if e[key_id_index] in self._key_states.keys():
-                key_press= self._key_states.pop(e[key_id_index])[0]
-                key_release=e
-                charEvent=list(key_release)
+                key_state[1]+=1
+        elif etype == EventConstants.KEYBOARD_RELEASE:
+            key_state=self._key_states.pop(e[self._key_id_index],None)
+            if key_state is not None:
+                key_press=key_state[0]
+                charEvent=list(e)
                 charEvent[DeviceEvent.EVENT_TYPE_ID_INDEX]=KeyboardCharEvent.EVENT_TYPE_ID
                 charEvent[DeviceEvent.EVENT_ID_INDEX]=Computer._getNextEventID()
                 charEvent.append(tuple(key_press))
-                charEvent.append(key_release[DeviceEvent.EVENT_HUB_TIME_INDEX]-key_press[DeviceEvent.EVENT_HUB_TIME_INDEX])
-                charEvents.append(charEvent)
-        return charEvents
+                charEvent.append(e[DeviceEvent.EVENT_HUB_TIME_INDEX]-key_press[DeviceEvent.EVENT_HUB_TIME_INDEX])
+                return charEvent
+        return None
 
 if Computer.system == 'win32':
     from win32 import Keyboard
@@ -298,7 +277,7 @@ class KeyboardCharEvent(KeyboardReleaseEvent):
     _newDataTypes = [ ('press_event',KeyboardPressEvent.NUMPY_DTYPE),  # contains the keyboard press event that is
                                                                       # associated with the release event
 
-                      ('duration',N.float32)  # duration of the Keyboard char event
+                      ('duration',N.float64)  # duration of the Keyboard char event
     ]
     EVENT_TYPE_ID=EventConstants.KEYBOARD_CHAR
     EVENT_TYPE_STRING='KEYBOARD_CHAR'
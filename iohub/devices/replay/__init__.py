@@ -0,0 +1,257 @@
+"""
+ioHub
+.. file: ioHub/devices/replay/__init__.py
+
+Copyright (C) 2012-2013 iSolver Software Solutions
+Distributed under the terms of the GNU General Public License (GPL version 3 or any later version).
+
+.. moduleauthor:: Sol Simpson <sol@isolver-software.com> + contributors, please see credits section of documentation.
+.. fileauthor:: Sol Simpson <sol@isolver-software.com>
+"""
+
+import os
+
+import numpy as N
+
+from .. import Device, Computer, DeviceEvent
+from ...util import convertCamelToSnake, print2err, printExceptionDetailsToStdErr
+from ...constants import DeviceConstants, EventConstants
+from ..keyboard import (KeyboardInputEvent, KeyboardKeyEvent, KeyboardPressEvent,
+                        KeyboardReleaseEvent, KeyboardCharEvent)
+from ..mouse import (MouseInputEvent, MouseButtonEvent, MouseScrollEvent, MouseMoveEvent,
+                     MouseDragEvent, MouseButtonPressEvent, MouseButtonReleaseEvent,
+                     MouseMultiClickEvent)
+from ..experiment import MessageEvent, LogEvent
+from ..daq import MultiChannelAnalogInputEvent
+from ..eyetracker.eye_events import (MonocularEyeSampleEvent, BinocularEyeSampleEvent,
+                                     FixationStartEvent, FixationEndEvent, SaccadeStartEvent,
+                                     SaccadeEndEvent, BlinkStartEvent, BlinkEndEvent)
+
+class Replay(Device):
+    """
+    The Replay Device re-injects the events saved in an existing ioHub
+    DataStore file into the ioHub Server, in the order of their saved hub time,
+    so the load of a recorded session can be reproduced without the devices
+    that recorded it.
+
+    Replayed events are added to the Replay device's native event buffer, and
+    so are handled by the same event dispatch, event streaming, and DataStore
+    saving code as the events of the original devices. Each replayed event is
+    given a new event_id, and its logged_time and time are set to the time
+    it was replayed; all other event fields are as saved.
+
+    Events are replayed at the original rate (speed 1.0), N times faster than
+    the original rate (speed N), or as fast as possible (speed 0.0). Replay
+    starts when event reporting is enabled for the device, and restarts from
+    the first event if event reporting is disabled and enabled again.
+    getReplayStatus() returns the achieved replay rate and the event queue
+    depths of the ioHub Server.
+    """
+    EVENT_CLASS_NAMES=['KeyboardInputEvent','KeyboardKeyEvent','KeyboardPressEvent',
+                       'KeyboardReleaseEvent','KeyboardCharEvent',
+                       'MouseInputEvent','MouseButtonEvent','MouseScrollEvent','MouseMoveEvent',
+                       'MouseDragEvent','MouseButtonPressEvent','MouseButtonReleaseEvent',
+                       'MouseMultiClickEvent','MessageEvent','LogEvent','MultiChannelAnalogInputEvent',
+                       'MonocularEyeSampleEvent','BinocularEyeSampleEvent','FixationStartEvent',
+                       'FixationEndEvent','SaccadeStartEvent','SaccadeEndEvent',
+                       'BlinkStartEvent','BlinkEndEvent']
+
+    DEVICE_TYPE_ID=DeviceConstants.REPLAY
+    DEVICE_TYPE_STRING='REPLAY'
+    __slots__=['_replay_settings','_speed','_event_tables','_event_table_index',
+               '_event_row_index','_event_times','_replay_index','_replay_start_time',
+               '_replay_end_time','_max_native_buffer_depth']
+
+    def __init__(self,*args,**kwargs):
+        Device.__init__(self,*args,**kwargs['dconfig'])
+        self._replay_settings=kwargs['dconfig'].get('replay',{})
+        self._speed=float(self._replay_settings.get('speed',1.0))
+        self._event_tables=[]
+        self._event_table_index=None
+        self._event_row_index=None
+        self._event_times=None
+        self._replay_index=0
+        self._replay_start_time=None
+        self._replay_end_time=None
+        self._max_native_buffer_depth=0
+        self._loadEvents()
+
+    def _loadEvents(self):
+        from ...datastore.util import ExperimentDataAccessUtility, upgradeEventArray
+
+        replay_file=self._replay_settings.get('file')
+        if not replay_file:
+            print2err("Replay device: no replay file given; no events will be replayed.")
+            return
+        hdf_path,hdf_name=os.path.split(os.path.abspath(replay_file))
+
+        session_codes=self._replay_settings.get('session_codes') or []
+        if isinstance(session_codes,basestring):
+            session_codes=[session_codes,]
+
+        monitored_event_ids=[getattr(EventConstants,convertCamelToSnake(n[:-5],False)) for n in self.monitor_event_types]
+
+        data_access=ExperimentDataAccessUtility(hdf_path,hdf_name,sessionCodes=session_codes)
+        try:
+            session_ids=[s.session_id for s in data_access.getSessionMetaData()]
+            table_paths=set([row['table_path'] for row in data_access.hdfFile.root.class_table_mapping.where('class_type_id == 1')])
+
+            event_times=[]
+            table_indexes=[]
+            row_indexes=[]
+            for table_path in sorted(table_paths):
+                events=upgradeEventArray(data_access.hdfFile.getNode(table_path).read())
+                keep=N.in1d(events['type'],monitored_event_ids)
+                if session_codes:
+                    keep&=N.in1d(events['session_id'],session_ids)
+                events=events[keep]
+                if len(events) == 0:
+                    continue
+                event_class=EventConstants.getClass(int(events['type'][0]))
+                if event_class is not None:
+                    # events saved with fewer fields than the current event
+                    # class (i.e. 8 channel analog input events) are padded.
+                    events=upgradeEventArray(events,event_class.NUMPY_DTYPE)
+                event_times.append(events['time'])
+                table_indexes.append(N.repeat(len(self._event_tables),len(events)))
+                row_indexes.append(N.arange(len(events)))
+                self._event_tables.append(events)
+        finally:
+            data_access.close()
+
+        if event_times:
+            event_times=N.concatenate(event_times)
+            # a stable sort keeps same time events in their saved order.
+            order=N.argsort(event_times,kind='mergesort')
+            self._event_times=event_times[order]-event_times[order[0]]
+            self._event_table_index=N.concatenate(table_indexes)[order]
+            self._event_row_index=N.concatenate(row_indexes)[order]
+
+    def getEventCount(self):
+        """
+        Returns the number of events that will be replayed.
+
+        Args:
+            None
+
+        Returns:
+            int: number of events loaded from the replay file.
+        """
+        if self._event_times is None:
+            return 0
+        return len(self._event_times)
+
+    def getReplayStatus(self):
+        """
+        Returns a dict describing the progress of the current replay:
+
+        * state: 'NOT_STARTED', 'REPLAYING', or 'DONE'.
+        * event_count: the number of events loaded from the replay file.
+        * events_replayed: the number of events replayed so far.
+        * elapsed_time: sec.msec since the replay started.
+        * events_per_second: the achieved replay rate.
+        * replay_lag: sec.msec the replay is behind the requested speed; always 0.0 when speed is 0.0.
+        * native_buffer_depth, max_native_buffer_depth: the current and max. number of events waiting in the Replay device's native event buffer.
+        * global_buffer_depth: the number of events in the ioHub Server global event buffer.
+        * datastore_rows_pending: the number of events staged but not yet written to the DataStore file.
+
+        Args:
+            None
+
+        Returns:
+            dict: replay status information.
+        """
+        now=Computer.getTime()
+        status=dict(event_count=self.getEventCount(),events_replayed=self._replay_index,
+                    elapsed_time=0.0,events_per_second=0.0,replay_lag=0.0,
+                    native_buffer_depth=len(self._native_event_buffer),
+                    max_native_buffer_depth=self._max_native_buffer_depth,
+                    global_buffer_depth=0,datastore_rows_pending=0)
+
+        if self._replay_start_time is None:
+            status['state']='NOT_STARTED'
+        else:
+            end_time=self._replay_end_time
+            status['state']=end_time is None and 'REPLAYING' or 'DONE'
+            elapsed_time=(end_time or now)-self._replay_start_time
+            status['elapsed_time']=elapsed_time
+            if elapsed_time > 0.0:
+                status['events_per_second']=self._replay_index/elapsed_time
+            if end_time is None and self._speed > 0.0 and self._replay_index < self.getEventCount():
+                status['replay_lag']=max(0.0,elapsed_time-float(self._event_times[self._replay_index])/self._speed)
+
+        server=self._iohub_server
+        if server:
+            if server.eventBuffer is not None:
+                status['global_buffer_depth']=len(server.eventBuffer)
+            if server.emrt_file is not None:
+                status['datastore_rows_pending']=server.emrt_file.getStagingStats()['rows_pending']
+        return status
+
+    def enableEventReporting(self,enabled=True):
+        """
+        Starts ( enabled=True ) or stops ( enabled=False ) replaying events.
+        Replay always starts from the first event of the replay file.
+
+        Args:
+            enabled (bool):  True (default) == Start replaying events. False == Stop replaying events.
+
+        Returns:
+            bool: The current reporting state.
+        """
+        if enabled and not self.isReportingEvents():
+            self._replay_start_time=None
+        return Device.enableEventReporting(self,enabled)
+
+    def _startReplay(self,start_time):
+        self._replay_index=0
+        self._replay_start_time=start_time
+        self._replay_end_time=None
+        self._max_native_buffer_depth=0
+
+    def _poll(self):
+        try:
+            if not self.isReportingEvents() or self._event_times is None:
+                return False
+
+            logged_time=Computer.getTime()
+            if self._replay_start_time is None:
+                self._startReplay(logged_time)
+            if self._replay_end_time is not None:
+                return False
+
+            native_buffer=self._native_event_buffer
+            if len(native_buffer) > self._max_native_buffer_depth:
+                self._max_native_buffer_depth=len(native_buffer)
+
+            # never add more events than the native event buffer can hold.
+            start_index=self._replay_index
+            end_index=start_index+self.event_buffer_length-len(native_buffer)
+            if self._speed > 0.0:
+                replay_position=(logged_time-self._replay_start_time)*self._speed
+                end_index=min(end_index,int(N.searchsorted(self._event_times,replay_position,'right')))
+            end_index=min(end_index,len(self._event_times))
+
+            event_tables=self._event_tables
+            table_indexes=self._event_table_index
+            row_indexes=self._event_row_index
+            for i in xrange(start_index,end_index):
+                e=list(event_tables[table_indexes[i]][row_indexes[i]].tolist())
+                e[DeviceEvent.EVENT_ID_INDEX]=Computer._getNextEventID()
+                e[DeviceEvent.EVENT_LOGGED_TIME_INDEX]=logged_time
+                e[DeviceEvent.EVENT_HUB_TIME_INDEX]=logged_time
+                self._addNativeEventToBuffer(e)
+            self._replay_index=max(start_index,end_index)
+
+            if self._replay_index >= len(self._event_times):
+                self._replay_end_time=logged_time
+                print2err("Replay device: %d events replayed in %.3f sec."%(self._replay_index,logged_time-self._replay_start_time))
+            return True
+        except Exception:
+            print2err("ERROR occurred during Replay poll:")
+            printExceptionDetailsToStdErr()
+
+    def _close(self):
+        self._event_tables=[]
+        self._event_times=None
+        Device._close(self)
@@ -11,8 +11,13 @@ Distributed under the terms of the GNU General Public License (GPL version 3 or
 """
 
 from gevent import socket
+import socket as stdsocket
+import select
 import msgpack
 import struct
+import mmap
+import os
+import numpy as N
 
 MAX_PACKET_SIZE=64*1024
 
@@ -76,6 +81,16 @@ class SocketConnection(object):
             print "Error during SocketConnection.receive: ",e
             raise e
 
+    def receiveWithTimeout(self,timeout):
+        """
+        Returns the result of receive() if data arrives within timeout sec.msec,
+        otherwise returns (None,None).
+        """
+        readable,w,x=select.select([self.sock,],[],[],timeout)
+        if readable:
+            return self.receive()
+        return None,None
+
     def close(self):
         self.sock.close()
 
@@ -86,3 +101,131 @@ class UDPClientConnection(SocketConnection):
     def initSocket(self,**kwargs):
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, MAX_PACKET_SIZE)
+
+
+class UDPEventStreamConnection(SocketConnection):
+    """
+    Experiment Process side connection used to receive the events pushed by
+    the ioHub Server once the connection has subscribed to the ioHub Server
+    event stream. A standard (non gevent) socket is used so the connection
+    can be read from a background thread.
+    """
+    def __init__(self,remote_host='127.0.0.1',remote_port=9000,rcvBufferLength = MAX_PACKET_SIZE):
+        SocketConnection.__init__(self,remote_host=remote_host,remote_port=remote_port,rcvBufferLength=rcvBufferLength)
+
+    def initSocket(self,**kwargs):
+        self.sock = stdsocket.socket(stdsocket.AF_INET, stdsocket.SOCK_DGRAM)
+        self.sock.setsockopt(stdsocket.SOL_SOCKET, stdsocket.SO_RCVBUF, MAX_PACKET_SIZE)
+        self.sock.bind((self._remote_host,0))
+
+
+
+class SharedEventRingBuffer(object):
+    """
+    Fixed length ring of event records stored in a memory mapped file, used
+    to pass events from the ioHub Server to the Experiment Process without
+    them being packed and sent over UDP. Each ring holds the events of a
+    single event type, with each record laid out using the NUMPY_DTYPE of
+    the event class. The ioHub Server is the only writer of a ring.
+
+    The file starts with a HEADER_SIZE byte header holding the total number
+    of records ever written to the ring, the ring capacity, and the record
+    size. A reader keeps its own count of records read, so any records
+    written since the last read can be returned as a numpy view of the
+    mapped file.
+    """
+    HEADER_DTYPE=N.dtype([('write_count',N.uint64),('capacity',N.uint32),('record_size',N.uint32)])
+    HEADER_SIZE=64
+
+    def __init__(self,file_path,np_dtype,capacity=None,create=False):
+        self.file_path=file_path
+        self.np_dtype=N.dtype(np_dtype)
+        self._read_count=0
+        self.overrun_count=0
+
+        if create is True:
+            # a new file, readable and writable by the user only; an existing
+            # file or link at file_path is never opened.
+            fd=os.open(file_path,os.O_RDWR|os.O_CREAT|os.O_EXCL|getattr(os,'O_BINARY',0),0600)
+            self._file=os.fdopen(fd,'w+b')
+            self._file.truncate(self.HEADER_SIZE+capacity*self.np_dtype.itemsize)
+        else:
+            self._file=open(file_path,'r+b')
+        self._mmap=mmap.mmap(self._file.fileno(),0)
+
+        self._header=N.ndarray((1,),self.HEADER_DTYPE,buffer=self._mmap)
+        if create is True:
+            self._header[0]=(0,capacity,self.np_dtype.itemsize)
+        elif self._header['record_size'][0] != self.np_dtype.itemsize:
+            self.close()
+            raise ValueError("SharedEventRingBuffer record size mismatch for %s"%(file_path))
+        self.capacity=int(self._header['capacity'][0])
+        self._records=N.ndarray((self.capacity,),self.np_dtype,buffer=self._mmap,offset=self.HEADER_SIZE)
+
+        # Start a new reader at the oldest record still held by the ring,
+        # so events written before the reader was opened are not lost.
+        self._read_count=max(0,self.getWriteCount()-self.capacity)
+
+    def getWriteCount(self):
+        return int(self._header['write_count'][0])
+
+    def append(self,event):
+        """
+        Write an event value list to the next record of the ring. Only called
+        by the ioHub Server.
+        """
+        write_count=self.getWriteCount()
+        self._records[write_count%self.capacity]=tuple(event)
+        self._header['write_count']=write_count+1
+
+    def read(self):
+        """
+        Returns a numpy array of the records written since the last read(),
+        or None if no new records are available. If the records do not wrap
+        around the end of the ring, the array returned is a view of the
+        mapped file; it is only valid until the writer has written another
+        capacity records, so copy it if it needs to be kept.
+
+        If more than capacity records were written since the last read, the
+        oldest records have been overwritten and are dropped; the number
+        dropped is added to overrun_count.
+        """
+        write_count=self.getWriteCount()
+        start=self._read_count
+        available=write_count-start
+        if available <= 0:
+            return None
+        if available > self.capacity:
+            self.overrun_count+=available-self.capacity
+            available=self.capacity
+        self._read_count=write_count
+
+        first=(write_count-available)%self.capacity
+        end=first+available
+        if end <= self.capacity:
+            return self._records[first:end]
+        return N.concatenate((self._records[first:],self._records[:end-self.capacity]))
+
+    def clear(self):
+        """
+        Skip any records that have not been read yet.
+        """
+        self._read_count=self.getWriteCount()
+
+    def __len__(self):
+        return min(self.getWriteCount()-self._read_count,self.capacity)
+
+    def close(self,remove_file=False):
+        self._header=None
+        self._records=None
+        if self._mmap:
+            self._mmap.close()
+            self._mmap=None
+        if self._file:
+            self._file.close()
+            self._file=None
+        if remove_file:
+            try:
+                os.remove(self.file_path)
+            except:
+                pass
@@ -13,32 +13,45 @@ import gevent
 from gevent.server import DatagramServer
 from gevent import Greenlet
 import os,sys
+import socket
 from operator import itemgetter
 from collections import deque
 
 import iohub
 import iohub.client
-from iohub.util import OrderedDict,print2err, printExceptionDetailsToStdErr, ioHubError, createErrorResult,convertCamelToSnake,MonotonicClock
+from iohub.util import OrderedDict,print2err, printExceptionDetailsToStdErr, ioHubError, createErrorResult,convertCamelToSnake,MonotonicClock,updateDict
 from iohub.constants import DeviceConstants,EventConstants
-from iohub.devices import Computer, DeviceEvent, import_device        
-from iohub.devices.deviceConfigValidation import validateDeviceConfiguration
-
-from yaml import load
-try:
-    from yaml import CLoader as Loader, CDumper as Dumper
-except ImportError:
-    from yaml import Loader, Dumper
-        
+from iohub.devices import Computer, Device, DeviceEvent, EventQuery, import_device, eventListsToArrays, packEventArrays
+from iohub.devices.deviceConfigValidation import validateDeviceConfiguration, getConfigCache, getDeviceValidationFilePath
+from iohub.net import SharedEventRingBuffer
+
 currentSec= Computer.currentSec
 
 import json
 import msgpack
     
+class TicketAddress(tuple):
+    """
+    The reply address of a request that was sent with a ticket id. Used as
+    the replyTo address by the request handlers, so sendResponse() can
+    include the ticket id in the reply.
+    """
+    def __new__(cls,address,ticket):
+        ta=tuple.__new__(cls,address)
+        ta.address=address
+        ta.ticket=ticket
+        return ta
+
 class udpServer(DatagramServer):
+    # The number of (address, ticket) replies kept so retransmitted requests
+    # get the original reply, instead of the request being handled again.
+    TICKET_REPLY_CACHE_LENGTH=256
+
     def __init__(self,ioHubServer,address,coder='msgpack'):
         self.iohub=ioHubServer
         self.feed=None
         self._running=True
+        self._ticketReplies=OrderedDict()
         if coder == 'msgpack':
             self.iohub.log("ioHub Server configuring msgpack...")
             self.coder=msgpack
@@ -56,11 +69,38 @@ class udpServer(DatagramServer):
         self.feed(request[:-2])
         request = self.unpack()   
         request_type= request.pop(0)
+
+        if request_type == 'TICKET':
+            # ('TICKET', ticket_id, request): the reply is sent as
+            # ('TICKET_RESULT', ticket_id, reply) so the ioHubConnection can
+            # match replies to requests, and have several requests pending.
+            ticket=request[0]
+            ticket_key=(replyTo,ticket)
+            if ticket_key in self._ticketReplies:
+                # a retransmitted request; resend the reply if it has been
+                # sent, otherwise the request is still being handled.
+                packet_data=self._ticketReplies[ticket_key]
+                if packet_data is None:
+                    packet_data=self.pack(('TICKET_PENDING',ticket))+'\r\n'
+                self._sendPacketData(packet_data,replyTo)
+                return True
+            self._ticketReplies[ticket_key]=None
+            while len(self._ticketReplies) > self.TICKET_REPLY_CACHE_LENGTH:
+                self._ticketReplies.popitem(last=False)
+            replyTo=TicketAddress(replyTo,ticket)
+            request=request[1]
+            request_type= request.pop(0)
         
         if request_type == 'GET_EVENTS':
-            return self.handleGetEvents(replyTo)
+            return self.handleGetEvents(request,replyTo)
         elif request_type == 'EXP_DEVICE':
             return self.handleExperimentDeviceRequest(request,replyTo)
+        elif request_type == 'SUBSCRIBE_EVENTS':
+            return self.handleEventStreamSubscription(request,replyTo)
+        elif request_type == 'UNSUBSCRIBE_EVENTS':
+            self.iohub.removeEventStreamSubscriber(replyTo)
+            self.sendResponse(('UNSUBSCRIBE_EVENTS_RESULT',True),replyTo)
+            return True
         elif request_type == 'RPC':
             callable_name=request.pop(0)
             args=None
@@ -122,10 +162,24 @@ class udpServer(DatagramServer):
                                 replyTo)
             return False
             
-    def handleGetEvents(self,replyTo):
+    def handleGetEvents(self,request,replyTo):
         try:
-            currentEvents=list(self.iohub.eventBuffer)
-            self.iohub.eventBuffer.clear()
+            if len(request)>1 and request[1]:
+                # only the events matching the query are sent and removed.
+                currentEvents,unmatchedEvents=EventQuery(request[1]).split(self.iohub.eventBuffer)
+                self.iohub.eventBuffer.clear()
+                self.iohub.eventBuffer.extend(unmatchedEvents)
+            else:
+                currentEvents=list(self.iohub.eventBuffer)
+                self.iohub.eventBuffer.clear()
+
+            if request and request[0] == 'numpy':
+                # one structured array per event type, sent as raw data.
+                if len(currentEvents)>0:
+                    self.sendResponse(('GET_EVENTS_RESULT',packEventArrays(eventListsToArrays(currentEvents))),replyTo)
+                else:
+                    self.sendResponse(('GET_EVENTS_RESULT', None),replyTo)
+                return True
 
             if len(currentEvents)>0:
                 sorted(currentEvents, key=itemgetter(DeviceEvent.EVENT_HUB_TIME_INDEX))
@@ -140,6 +194,34 @@ class udpServer(DatagramServer):
                                 replyTo)
             return False
 
+    def handleEventStreamSubscription(self,request,replyTo):
+        coalesce=True
+        if len(request)>0:
+            coalesce=request.pop(0)
+        try:
+            self.sendResponse(('SUBSCRIBE_EVENTS_RESULT',True),replyTo)
+            self.iohub.addEventStreamSubscriber(replyTo,coalesce)
+            return True
+        except Exception,e:
+            self.sendResponse(createErrorResult('IOHUB_SUBSCRIBE_EVENTS_ERROR',
+                                    msg="An error occurred while subscribing to the ioHub Server event stream",
+                                    exception=str(e)),
+                                replyTo)
+            return False
+
+    def sendStreamedEvents(self,events,address):
+        # sendResponse() is not used: it sends an error result in place of
+        # a response that fails, so send errors would never reach the
+        # caller, and a subscriber that can no longer be sent to would
+        # never be removed.
+        try:
+            self._sendPacketData(self.pack(('EVENT_STREAM',events))+'\r\n',address)
+            return True
+        except:
+            print2err("Error sending streamed events to: ",address)
+            printExceptionDetailsToStdErr()
+            return False
+
     def handleExperimentDeviceRequest(self,request,replyTo):
         request_type= request.pop(0)
         if request_type == 'EVENT_TX':
@@ -195,6 +277,8 @@ class udpServer(DatagramServer):
                     result=method(**kwargs)
                 else:
                     result=method()
+                if dmethod == 'getEvents' and kwargs and kwargs.get('asType') == 'numpy':
+                    result=packEventArrays(eventListsToArrays(result))
                 self.sendResponse(('DEV_RPC_RESULT',result),replyTo)
                 return True
             except Exception, e:
@@ -273,18 +357,15 @@ class udpServer(DatagramServer):
             
     def sendResponse(self,data,address):
         packet_data=None
+        ticket=getattr(address,'ticket',None)
         try:
             max_size=iohub.net.MAX_PACKET_SIZE/2-20
+            if ticket is not None:
+                data=('TICKET_RESULT',ticket,data)
             packet_data=self.pack(data)+'\r\n'
-            packet_data_length=len(packet_data)
-            if packet_data_length>= max_size:
-                num_packets=len(packet_data)/max_size+1
-                self.sendResponse(('IOHUB_MULTIPACKET_RESPONSE',num_packets),address)
-                for p in xrange(num_packets-1):
-                    self.socket.sendto(packet_data[p*max_size:(p+1)*max_size],address)
-                self.socket.sendto(packet_data[(p+1)*max_size:packet_data_length],address)
-            else:
-                self.socket.sendto(packet_data,address)
+            if ticket is not None:
+                self._ticketReplies[(address.address,ticket)]=packet_data
+            self._sendPacketData(packet_data,address.address if ticket is not None else address)
         except:
             print2err('Error trying to send data to experiment process:')
             print2err('data length:',len(data))
@@ -310,8 +391,26 @@ class udpServer(DatagramServer):
                                    first_data_element=str(first_data_element),
                                    packet_data_length=packet_data_length,
                                    max_packet_size=max_size)
+            if ticket is not None:
+                data=('TICKET_RESULT',ticket,data)
+                address=address.address
             packet_data=self.pack(data)+'\r\n'
             packet_data_length=len(packet_data)            
+            if ticket is not None:
+                # retransmits of the request get the error reply as well.
+                self._ticketReplies[(address,ticket)]=packet_data
+            self.socket.sendto(packet_data,address)
+
+    def _sendPacketData(self,packet_data,address):
+        max_size=iohub.net.MAX_PACKET_SIZE/2-20
+        packet_data_length=len(packet_data)
+        if packet_data_length>= max_size:
+            num_packets=packet_data_length/max_size+1
+            self.socket.sendto(self.pack(('IOHUB_MULTIPACKET_RESPONSE',num_packets))+'\r\n',address)
+            for p in xrange(num_packets-1):
+                self.socket.sendto(packet_data[p*max_size:(p+1)*max_size],address)
+            self.socket.sendto(packet_data[(p+1)*max_size:packet_data_length],address)
+        else:
             self.socket.sendto(packet_data,address)
             
     def setExperimentInfo(self,experimentInfoList):
@@ -377,10 +476,30 @@ class udpServer(DatagramServer):
 
     def flushIODataStoreFile(self):
         if self.iohub.emrt_file:
-            self.iohub.emrt_file.emrtFile.flush()
+            self.iohub.emrt_file.flush()
             return True
         return False
 
+    def getDataStoreStats(self):
+        if self.iohub.emrt_file:
+            return self.iohub.emrt_file.getStagingStats()
+        return False
+
+    def getSharedEventBufferInfo(self):
+        return self.iohub.getSharedEventBufferInfo()
+
+    def getDevicePollingStats(self):
+        return [m.getStats() for m in self.iohub.deviceMonitors]
+
+    def getStartupTimes(self):
+        return self.iohub.getStartupTimes().items()
+
+    def registerEventTrigger(self,device_name,query,notify_address):
+        return self.iohub.registerEventTrigger(device_name,query,notify_address)
+
+    def unregisterEventTrigger(self,trigger_id):
+        return self.iohub.unregisterEventTrigger(trigger_id)
+
     def shutDown(self):
         try:
             self.disableHighPriority()
@@ -393,31 +512,158 @@ class udpServer(DatagramServer):
             sys.exit(1)
 
 class DeviceMonitor(Greenlet):
-    def __init__(self, device,sleep_interval):
+    """
+    Greenlet that polls a device that uses a device_timer. The polling 
+    interval adapts to the device activity: after a poll that added native
+    events the device is polled every sleep_interval sec.msec; after each 
+    poll that did not, the interval is increased by 50%, up to 
+    max_sleep_interval. Polls are scheduled relative to the previous
+    scheduled poll time, so sleep overshoot does not accumulate; if a poll 
+    starts more than one interval late, the schedule is reset.
+    """
+    def __init__(self, device,sleep_interval,max_sleep_interval=None):
         Greenlet.__init__(self)
         self.device = device
         self.sleep_interval=sleep_interval
+        if max_sleep_interval is None or max_sleep_interval < sleep_interval:
+            max_sleep_interval=sleep_interval
+        self.max_sleep_interval=max_sleep_interval
+        self.current_interval=sleep_interval
         self.running=False
+
+        self.poll_count=0
+        self.active_poll_count=0
+        self.event_count=0
+        self.total_poll_duration=0.0
+        self.max_poll_duration=0.0
+        self.total_poll_jitter=0.0
+        self.max_poll_jitter=0.0
         
     def _run(self):
         self.running = True
         ctime=Computer.currentSec
+        device=self.device
+        next_poll_time=ctime()
         while self.running is True:
             stime=ctime()
-            self.device._poll()
-            i=self.sleep_interval-(ctime()-stime)
+            event_count=device._native_event_count
+            device._poll()
+            etime=ctime()
+            new_events=device._native_event_count-event_count
+
+            poll_jitter=stime-next_poll_time
+            self._updateStats(etime-stime,poll_jitter,new_events)
+
+            if new_events > 0:
+                self.current_interval=self.sleep_interval
+            elif self.current_interval < self.max_sleep_interval:
+                self.current_interval=min(self.current_interval*1.5,self.max_sleep_interval)
+
+            if poll_jitter > self.current_interval:
+                next_poll_time=stime
+            next_poll_time+=self.current_interval
+            i=next_poll_time-ctime()
             if i > 0.0:
-                gevent.sleep(i)    
+                gevent.sleep(i)
+            else:
+                gevent.sleep(0)
+
+    def _updateStats(self,poll_duration,poll_jitter,new_events):
+        self.poll_count+=1
+        self.total_poll_duration+=poll_duration
+        if poll_duration > self.max_poll_duration:
+            self.max_poll_duration=poll_duration
+        if poll_jitter > 0.0:
+            self.total_poll_jitter+=poll_jitter
+            if poll_jitter > self.max_poll_jitter:
+                self.max_poll_jitter=poll_jitter
+        if new_events > 0:
+            self.active_poll_count+=1
+            self.event_count+=new_events
+
+    def getStats(self):
+        poll_count=max(self.poll_count,1)
+        return dict(device_name=self.device.name,
+                    poll_count=self.poll_count,
+                    active_poll_count=self.active_poll_count,
+                    event_count=self.event_count,
+                    events_per_poll=self.event_count/float(poll_count),
+                    mean_poll_duration=self.total_poll_duration/poll_count,
+                    max_poll_duration=self.max_poll_duration,
+                    mean_poll_jitter=self.total_poll_jitter/poll_count,
+                    max_poll_jitter=self.max_poll_jitter,
+                    min_interval=self.sleep_interval,
+                    max_interval=self.max_sleep_interval,
+                    current_interval=self.current_interval)
+
+
+class DeviceEventTriggers(object):
+    """
+    Event listener holding the event triggers registered for one device.
+    Triggers are evaluated as the device's events are dispatched by the
+    ioServer; each event that matches a trigger's EventQuery is sent to the
+    trigger's notification address as 
+    ('TRIGGER_FIRED', trigger_id, event, fired_time), so the Experiment
+    Process does not need to request events to find out a trigger has fired.
+    """
+    def __init__(self,device,udpService):
+        self.device=device
+        self.udpService=udpService
+        # trigger_id -> (EventQuery, notification address)
+        self.triggers=OrderedDict()
+
+    def addTrigger(self,trigger_id,query,address):
+        self.triggers[trigger_id]=(query,address)
+        self._updateListenedEventTypes()
+
+    def removeTrigger(self,trigger_id):
+        if trigger_id in self.triggers:
+            del self.triggers[trigger_id]
+            self._updateListenedEventTypes()
+
+    def _updateListenedEventTypes(self):
+        # only listen for the event types that a trigger could fire for.
+        self.device._removeEventListener(self)
+        monitored_ids=[getattr(EventConstants,convertCamelToSnake(n[:-5],False)) for n in self.device.monitor_event_types or []]
+        etypes=set()
+        for query,address in self.triggers.itervalues():
+            if query.event_type_ids is None:
+                etypes.update(monitored_ids)
+            else:
+                etypes.update([etype for etype in query.event_type_ids if etype in monitored_ids])
+        if etypes:
+            self.device._addEventListener(self,list(etypes))
+
+    def _handleEvent(self,e):
+        fired_time=None
+        for trigger_id,(query,address) in self.triggers.items():
+            if query.matches(e):
+                if fired_time is None:
+                    fired_time=Computer.getTime()
+                self.udpService.sendResponse(('TRIGGER_FIRED',trigger_id,e,fired_time),address)
+
+    def _handleEvents(self,events):
+        for e in events:
+            self._handleEvent(e)
 
         
 class ioServer(object):
     eventBuffer=None
     deviceDict={}
     _logMessageBuffer=deque(maxlen=128)
-    def __init__(self, rootScriptPathDir, config=None):
+    # Devices with fewer native events than this waiting to be processed
+    # have them dispatched to listeners one at a time instead of in batches.
+    BATCH_DISPATCH_MIN_EVENTS=4
+    def __init__(self, rootScriptPathDir, config=None, startup_times=None):
         self._session_id=None
         self._experiment_id=None
 
+        # sec.msec duration of each ioHub Server startup phase, in the order
+        # the phases were run.
+        self._startupTimes=startup_times
+        if self._startupTimes is None:
+            self._startupTimes=OrderedDict()
+
         self.log("Server Time Offset: {0}".format(Computer.globalClock.getLastResetTime()))
 
         self._hookManager=None
@@ -432,6 +678,23 @@ class ioServer(object):
         self.filterLookupByName={}  
         self._hookDevice=None
 
+        # Experiment Process addresses that have subscribed to have events
+        # pushed to them as they are received, instead of polling for them
+        # using GET_EVENTS. The value is True if events for the subscriber
+        # are coalesced and sent once per event processing iteration.
+        self._eventStreamSubscribers=OrderedDict()
+        self._coalescedStreamEvents=[]
+
+        # Event triggers registered by the Experiment Process: device name ->
+        # DeviceEventTriggers listener, and trigger_id -> DeviceEventTriggers.
+        self._eventTriggersByDevice=dict()
+        self._eventTriggersByID=dict()
+        self._lastTriggerID=0
+
+        # Events received by _handleEvent(s)() during the current device event
+        # processing iteration.
+        self._pendingEvents=[]
+
         import iohub        
         ioServer.eventBuffer=deque(maxlen=config.get('global_event_buffer',2048))
 
@@ -453,17 +716,18 @@ class ioServer(object):
             pass
 
 
+        phase_start_time=currentSec()
         try:
             # initial dataStore setup
             if 'data_store' in config:
                 experiment_datastore_config=config.get('data_store')
 
-                default_datastore_config_path=os.path.join(iohub.IO_HUB_DIRECTORY,'dataStore','default_datastore.yaml')
-                _dslabel,default_datastore_config=load(file(default_datastore_config_path,'r'), Loader=Loader).popitem()
+                default_datastore_config_path=os.path.join(iohub.IO_HUB_DIRECTORY,'datastore','default_datastore.yaml')
+                _dslabel,default_datastore_config=getConfigCache().loadYamlFile(default_datastore_config_path).popitem()
 
-                for default_key,default_value in default_datastore_config.iteritems():
-                    if default_key not in experiment_datastore_config:
-                        experiment_datastore_config[default_key]=default_value
+                # nested settings, i.e. table_storage, get the default
+                # values of the keys the experiment config does not set.
+                updateDict(experiment_datastore_config,default_datastore_config)
                                 
                 if experiment_datastore_config.get('enable', True):
                     #print2err("Creating ioDataStore....")
@@ -478,7 +742,7 @@ class ioServer(object):
         except:
             print2err("Error during ioDataStore creation....")
             printExceptionDetailsToStdErr()
-
+        self._addStartupTime('datastore',phase_start_time)
 
         #built device list and config from initial yaml config settings
         try:
@@ -486,12 +750,38 @@ class ioServer(object):
                 for device_class_name,deviceConfig in iodevice.iteritems():
                     #print2err("======================================================")
                     #print2err("Started load process for: {0}".format(device_class_name))
+                    phase_start_time=currentSec()
                     self.createNewMonitoredDevice(device_class_name,deviceConfig)
+                    self._addStartupTime('device.%s'%(device_class_name),phase_start_time)
         except:
             print2err("Error during device creation ....")
             printExceptionDetailsToStdErr()
             raise ioHubError("Error during device creation ....")
 
+        # device event filter setup
+        phase_start_time=currentSec()
+        try:
+            self.createEventFilters(config.get('event_filters',{}))
+        except:
+            print2err("Error during event filter creation ....")
+            printExceptionDetailsToStdErr()
+            raise ioHubError("Error during event filter creation ....")
+        self._addStartupTime('event_filters',phase_start_time)
+
+        # shared memory event transport setup
+        phase_start_time=currentSec()
+        self._sharedEventBuffers=dict()
+        self._sharedEventBufferDir=None
+        self._sharedEventBuffersActive=False
+        shm_config=config.get('shared_memory_transport',{})
+        if shm_config.get('enable',False) is True:
+            self.createSharedEventBuffers(shm_config.get('event_buffer_length',2048))
+        self._addStartupTime('shared_event_buffers',phase_start_time)
+
+        # save any config files and device configs that were not cached yet.
+        phase_start_time=currentSec()
+        getConfigCache().save()
+        self._addStartupTime('config_cache_save',phase_start_time)
 
         # initial time offset
         #print2err("-- ioServer Init Complete -- ")
@@ -680,14 +970,14 @@ class ioServer(object):
                     
                 if  device_class_name == 'Mouse' and 'Mouse' not in self._hookDevice:
                     #print2err("Hooking OSX Mouse.....")
-                    mouseHookMonitor=DeviceMonitor(deviceDict['Mouse'],0.004)
+                    mouseHookMonitor=DeviceMonitor(deviceDict['Mouse'],0.004,0.008)
                     self.deviceMonitors.append(mouseHookMonitor)
                     deviceDict['Mouse']._CGEventTapEnable(deviceDict['Mouse']._tap, True)
                     self._hookDevice.append('Mouse')
                     #print2err("Done Hooking OSX Mouse.....")
                 if device_class_name == 'Keyboard'  and 'Keyboard' not in self._hookDevice:
                     #print2err("Hooking OSX Keyboard.....")
-                    kbHookMonitor=DeviceMonitor(deviceDict['Keyboard'],0.004)
+                    kbHookMonitor=DeviceMonitor(deviceDict['Keyboard'],0.004,0.008)
                     self.deviceMonitors.append(kbHookMonitor)
                     deviceDict['Keyboard']._CGEventTapEnable(deviceDict['Keyboard']._tap, True)
                     self._hookDevice.append('Keyboard')
@@ -716,14 +1006,31 @@ class ioServer(object):
          
         dconfigPath=os.path.join(iohub.IO_HUB_DIRECTORY,device_module_path[6:].replace('.',os.path.sep),"default_%s.yaml"%(device_class_name.lower()))
 
-        #print2err("Loading Device Defaults file:\n\tdevice_class: {0}\n\tdeviceConfigFile:{1}\n".format(device_class_name,dconfigPath))
-        self.log("Loading Device Defaults file: %s"%(device_class_name,))
+        # The merged and validated device config is cached, keyed by the
+        # device config given in the experiment's ioHub config, so the device
+        # defaults only need to be merged and validated when one of them, or
+        # the device's default or supported settings files, have changed.
+        config_cache=getConfigCache()
+        device_key=config_cache.getDeviceKey(device_module_path,device_class_name,device_config)
+        cached_config=config_cache.getDeviceConfig(device_key)
+        if cached_config:
+            self.log("Using Cached Device Config: %s"%(device_class_name,))
+            merged_device_config,device_config_errors=cached_config
+            device_config.clear()
+            device_config.update(merged_device_config)
+            if device_config_errors:
+                self._all_device_config_errors[device_module_path]=device_config_errors
+        else:
+            #print2err("Loading Device Defaults file:\n\tdevice_class: {0}\n\tdeviceConfigFile:{1}\n".format(device_class_name,dconfigPath))
+            self.log("Loading Device Defaults file: %s"%(device_class_name,))
 
-        _dclass,default_device_config=load(file(dconfigPath,'r'), Loader=Loader).popitem()
+            _dclass,default_device_config=config_cache.loadYamlFile(dconfigPath).popitem()
 
-        #print2err("Device Defaults:\n\tdevice_class: {0}\n\tdefault_device_config:{1}\n".format(device_class_name,default_device_config))
-        
-        self.processDeviceConfigDictionary(device_module_path, device_class_name, device_config,default_device_config)
+            #print2err("Device Defaults:\n\tdevice_class: {0}\n\tdefault_device_config:{1}\n".format(device_class_name,default_device_config))
+
+            self.processDeviceConfigDictionary(device_module_path, device_class_name, device_config,default_device_config)
+            config_cache.setDeviceConfig(device_key,(dconfigPath,getDeviceValidationFilePath(device_module_path)),
+                                         device_config,self._all_device_config_errors.get(device_module_path))
 
         if device_module_path in self._all_device_config_errors:
             # Complete device config verification.
@@ -760,8 +1067,9 @@ class ioServer(object):
 
             if 'device_timer' in device_config:
                 interval = device_config['device_timer']['interval']
-                self.log("%s has requested a timer with period %.5f"%(device_class_name, interval))
-                dPoller=DeviceMonitor(deviceInstance,interval)
+                max_interval = device_config['device_timer'].get('max_interval',max(interval,min(interval*4,0.02)))
+                self.log("%s has requested a timer with period %.5f, max. period %.5f"%(device_class_name, interval, max_interval))
+                dPoller=DeviceMonitor(deviceInstance,interval,max_interval)
                 self.deviceMonitors.append(dPoller)
 
             eventIDs=[]
@@ -788,6 +1096,13 @@ class ioServer(object):
             return deviceInstance,device_config,eventIDs,event_classes
 
 
+    def _addStartupTime(self,phase,start_time):
+        self._startupTimes[phase]=currentSec()-start_time
+        self.log("Startup phase %s: %.3f msec"%(phase,self._startupTimes[phase]*1000.0))
+
+    def getStartupTimes(self):
+        return self._startupTimes
+
     def log(self,text,level=None):
         try:
             log_time=currentSec()
@@ -818,31 +1133,283 @@ class ioServer(object):
             pytablesfile.close()
             
     def processDeviceEvents(self,sleep_interval):
+        # The devices are only walked when a device has added native events
+        # since the last iteration, or an event filter is holding events.
+        last_event_count=None
+        filter_chains=self.filterLookupByInput.values()
         while self._running:
-            self._processDeviceEventIteration()
+            event_count=Device._all_native_event_count
+            if event_count != last_event_count or [fc for fc in filter_chains if fc.hasHeldEvents()]:
+                last_event_count=event_count
+                self._processDeviceEventIteration()
             gevent.sleep(sleep_interval)
 
     def _processDeviceEventIteration(self):
         for device in self.devices:
+            events=device._getNativeEventBuffer()
+            filter_chain=device._filter_chain
+            if not events:
+                if filter_chain is not None and filter_chain.hasHeldEvents():
+                    self._dispatchEventBatch(device,filter_chain.flushStale(Computer.getTime()))
+                continue
             try:
-                events=device._getNativeEventBuffer()
-                #if events and len(events)>0:
-                #    ioHub.print2err("_processDeviceEventIteration.....", device._event_listeners)
-                while len(events)>0:
-                    evt=events.popleft()
-                    e=device._getIOHubEventObject(evt)
-                    if e is not None:
-                        for l in device._getEventListeners(e[DeviceEvent.EVENT_TYPE_ID_INDEX]):
-                            l._handleEvent(e)
+                if filter_chain is None and len(events)<self.BATCH_DISPATCH_MIN_EVENTS:
+                    # grouping a handful of events costs more than it saves.
+                    while len(events)>0:
+                        e=device._getIOHubEventObject(events.popleft())
+                        if e is not None:
+                            for l in device._getEventListeners(e[DeviceEvent.EVENT_TYPE_ID_INDEX]):
+                                l._handleEvent(e)
+                    continue
+
+                # Drain only the events present at the start of the iteration;
+                # events a listener adds to the native buffer while handling
+                # this batch (i.e. keyboard char events) are routed next time.
+                getIOHubEventObject=device._getIOHubEventObject
+                popleft=events.popleft
+                iohub_events=[getIOHubEventObject(popleft()) for i in xrange(len(events))]
+                if filter_chain is not None:
+                    iohub_events=filter_chain.filterEvents([e for e in iohub_events if e is not None],Computer.getTime())
+                    if filter_chain.raw_events:
+                        self._saveRawEvents(device,filter_chain.raw_events)
+                        filter_chain.raw_events=[]
+                self._dispatchEventBatch(device,iohub_events)
             except:
                 printExceptionDetailsToStdErr()
-                print2err("Error in processDeviceEvents: ", device, " : ", len(events), " : ", e)
-                print2err("Event type ID: ",e[DeviceEvent.EVENT_TYPE_ID_INDEX], " : " , EventConstants.getName(e[DeviceEvent.EVENT_TYPE_ID_INDEX]))
+                print2err("Error in processDeviceEvents: ", device, " : ", len(events))
                 print2err("--------------------------------------")
 
+        if self._pendingEvents:
+            self._routePendingEvents()
+
+        if self._coalescedStreamEvents:
+            self._sendCoalescedStreamEvents()
+
+    def _dispatchEventBatch(self,device,iohub_events):
+        """
+        Groups a device's ioHub events by event type and gives each group to
+        the event listeners of that type. A device with ORDERED_EVENT_HANDLING
+        is given its own events one at a time, in event_id order.
+        """
+        ordered_listener=None
+        if device.ORDERED_EVENT_HANDLING:
+            ordered_listener=device
+        events_by_type=dict()
+        etype_order=[]
+        for e in iohub_events:
+            if e is not None:
+                etype_events=events_by_type.get(e[DeviceEvent.EVENT_TYPE_ID_INDEX])
+                if etype_events is None:
+                    events_by_type[e[DeviceEvent.EVENT_TYPE_ID_INDEX]]=[e,]
+                    etype_order.append(e[DeviceEvent.EVENT_TYPE_ID_INDEX])
+                else:
+                    etype_events.append(e)
+
+        for etype in etype_order:
+            etype_events=events_by_type[etype]
+            for l in device._getEventListeners(etype):
+                if l is ordered_listener:
+                    continue
+                handleEvents=getattr(l,'_handleEvents',None)
+                if handleEvents:
+                    handleEvents(etype_events)
+                else:
+                    for e in etype_events:
+                        l._handleEvent(e)
+
+        if ordered_listener is not None:
+            ordered_events=[e for e in iohub_events if e is not None and 
+                            ordered_listener in device._getEventListeners(e[DeviceEvent.EVENT_TYPE_ID_INDEX])]
+            ordered_events.sort(key=itemgetter(DeviceEvent.EVENT_ID_INDEX))
+            for e in ordered_events:
+                ordered_listener._handleEvent(e)
+
+    def _saveRawEvents(self,device,raw_events):
+        # unfiltered copies of filtered events are only given to the DataStore.
+        emrt_file=self.emrt_file
+        if emrt_file is None:
+            return
+        events_by_type=dict()
+        for e in raw_events:
+            events_by_type.setdefault(e[DeviceEvent.EVENT_TYPE_ID_INDEX],[]).append(e)
+        for etype,etype_events in events_by_type.iteritems():
+            if emrt_file in device._getEventListeners(etype):
+                emrt_file._handleEvents(etype_events)
+
+    def createEventFilters(self,event_filters_config):
+        """
+        Creates the EventFilterChain of each device that has event_filters
+        given in the ioHub config. Each filter is given the next free
+        filter_id bit.
+        """
+        from iohub.devices.filters import EventFilterChain, EVENT_FILTER_TYPES, MAX_FILTER_COUNT
+        for device in self.devices:
+            device_filters_config=event_filters_config.get(device.name)
+            if not device_filters_config:
+                continue
+            filters=[]
+            for i,filter_config in enumerate(device_filters_config.get('chain',[])):
+                filter_config=dict(filter_config)
+                filter_type=filter_config.pop('filter')
+                filter_name=filter_config.pop('name','%s.%s_%d'%(device.name,filter_type.lower(),i))
+                if filter_type not in EVENT_FILTER_TYPES:
+                    raise ioHubError("Unknown event filter type: %s"%(filter_type))
+                if filter_name in self.filterLookupByName:
+                    raise ioHubError("Duplicate event filter name: %s"%(filter_name))
+                if len(self.filterLookupByOutput) >= MAX_FILTER_COUNT:
+                    raise ioHubError("No more than %d event filters can be created."%(MAX_FILTER_COUNT))
+                filter_id=1<<len(self.filterLookupByOutput)
+                event_filter=EVENT_FILTER_TYPES[filter_type](device,filter_id,filter_name,**filter_config)
+                self.filterLookupByOutput[filter_id]=event_filter
+                self.filterLookupByName[filter_name]=event_filter
+                filters.append(event_filter)
+                self.log("Event filter created: %s filter_id: %d"%(filter_name,filter_id))
+            device._filter_chain=EventFilterChain(filters,device_filters_config.get('save_raw_events',False),
+                                                  device_filters_config.get('hold_timeout',0.05))
+            self.filterLookupByInput[device.name]=device._filter_chain
+
+    def createSharedEventBuffers(self,event_buffer_length):
+        import tempfile
+        # The ring files are created in a new directory that only the user
+        # can access, so other users can not read the session's events, or
+        # replace the ring files.
+        self._sharedEventBufferDir=tempfile.mkdtemp(prefix='iohub_%d_'%(os.getpid()))
+        for event_type_id,event_class in (EventConstants._classes or {}).iteritems():
+            # _classes maps event ids to event classes, and event classes
+            # to event ids; only the event id keys are used.
+            if not isinstance(event_type_id,(int,long)):
+                continue
+            if event_class.NUMPY_DTYPE.hasobject:
+                # records with object fields (block events) can not be
+                # shared; those events are sent as usual.
+                continue
+            try:
+                file_path=os.path.join(self._sharedEventBufferDir,'%d.evtbuf'%(event_type_id))
+                self._sharedEventBuffers[event_type_id]=SharedEventRingBuffer(file_path,event_class.NUMPY_DTYPE,event_buffer_length,create=True)
+            except:
+                print2err("Error creating shared memory event buffer for: ",event_class)
+                printExceptionDetailsToStdErr()
+        self.log("Shared memory event buffers created for event ids %s"%(str(self._sharedEventBuffers.keys()),))
+
+    def getSharedEventBufferInfo(self):
+        # Events are only written to the shared buffers once the Experiment
+        # Process has asked for them; until then they are held in the
+        # global event buffer as usual.
+        # The event types that are added to the global event buffer, but
+        # have no shared buffer, are returned as well, so the Experiment
+        # Process still requests them.
+        self._sharedEventBuffersActive=len(self._sharedEventBuffers)>0
+        unshared_event_types=set()
+        for device in self.devices:
+            for event_type_id,listeners in device._event_listeners.iteritems():
+                if self in listeners and event_type_id not in self._sharedEventBuffers:
+                    unshared_event_types.add(event_type_id)
+        return ([(event_type_id,ring.file_path) for event_type_id,ring in self._sharedEventBuffers.iteritems()],
+                sorted(unshared_event_types))
+
+    def closeSharedEventBuffers(self):
+        self._sharedEventBuffersActive=False
+        while self._sharedEventBuffers:
+            event_type_id,ring=self._sharedEventBuffers.popitem()
+            ring.close(remove_file=True)
+        if self._sharedEventBufferDir:
+            try:
+                os.rmdir(self._sharedEventBufferDir)
+            except OSError:
+                pass
+            self._sharedEventBufferDir=None
+
+    def registerEventTrigger(self,device_name,query,notify_address):
+        """
+        Registers an event trigger for the named device. Each device event that
+        matches the query dict (see iohub.devices.EventQuery) is sent to
+        notify_address as soon as it has been processed by the ioHub Server.
+        Returns the trigger_id of the new trigger.
+        """
+        device_triggers=self._eventTriggersByDevice.get(device_name)
+        if device_triggers is None:
+            for device in self.devices:
+                if device.name == device_name:
+                    device_triggers=DeviceEventTriggers(device,self.udpService)
+                    self._eventTriggersByDevice[device_name]=device_triggers
+                    break
+            else:
+                raise ioHubError("Event trigger device not found: %s"%(device_name))
+
+        self._lastTriggerID+=1
+        trigger_id=self._lastTriggerID
+        device_triggers.addTrigger(trigger_id,EventQuery(query),tuple(notify_address))
+        self._eventTriggersByID[trigger_id]=device_triggers
+        return trigger_id
+
+    def unregisterEventTrigger(self,trigger_id):
+        device_triggers=self._eventTriggersByID.pop(trigger_id,None)
+        if device_triggers is None:
+            return False
+        device_triggers.removeTrigger(trigger_id)
+        return True
+
     def _handleEvent(self,event):
-        #ioHub.print2err("ioServer Handle event: ",event)
-        self.eventBuffer.append(event)
+        self._pendingEvents.append(event)
+
+    def _handleEvents(self,events):
+        # Events are handed to the server grouped by type, so they are held
+        # until the end of the iteration and routed in event_id order.
+        self._pendingEvents.extend(events)
+
+    def _routePendingEvents(self):
+        events=self._pendingEvents
+        self._pendingEvents=[]
+        if len(events)>1:
+            events.sort(key=itemgetter(DeviceEvent.EVENT_ID_INDEX))
+        if self._sharedEventBuffersActive:
+            unshared_events=[]
+            for event in events:
+                ring=self._sharedEventBuffers.get(event[DeviceEvent.EVENT_TYPE_ID_INDEX])
+                if ring:
+                    ring.append(event)
+                else:
+                    unshared_events.append(event)
+            events=unshared_events
+        if self._eventStreamSubscribers:
+            for event in events:
+                self._streamEvent(event)
+        else:
+            self.eventBuffer.extend(events)
+
+    def addEventStreamSubscriber(self,address,coalesce=True):
+        self._eventStreamSubscribers[address]=coalesce
+        self.log("Event stream subscriber added: %s coalesce: %s"%(str(address),str(coalesce)))
+        # push any events that were buffered before the subscription was made.
+        if len(self.eventBuffer)>0:
+            currentEvents=list(self.eventBuffer)
+            self.eventBuffer.clear()
+            if self.udpService.sendStreamedEvents(currentEvents,address) is False:
+                self.removeEventStreamSubscriber(address)
+
+    def removeEventStreamSubscriber(self,address):
+        if address in self._eventStreamSubscribers:
+            del self._eventStreamSubscribers[address]
+            self.log("Event stream subscriber removed: %s"%(str(address),))
+        if len(self._eventStreamSubscribers)==0:
+            self._coalescedStreamEvents=[]
+
+    def _streamEvent(self,event):
+        coalesced=False
+        for address,coalesce in self._eventStreamSubscribers.items():
+            if coalesce:
+                coalesced=True
+            elif self.udpService.sendStreamedEvents([event,],address) is False:
+                self.removeEventStreamSubscriber(address)
+        if coalesced:
+            self._coalescedStreamEvents.append(event)
+
+    def _sendCoalescedStreamEvents(self):
+        events=self._coalescedStreamEvents
+        self._coalescedStreamEvents=[]
+        for address,coalesce in self._eventStreamSubscribers.items():
+            if coalesce and self.udpService.sendStreamedEvents(events,address) is False:
+                self.removeEventStreamSubscriber(address)
 
     def clearEventBuffer(self):
         l= len(self.eventBuffer)
@@ -862,6 +1429,7 @@ class ioServer(object):
                 m.running=False
             if self.eventBuffer:
                 self.clearEventBuffer()
+            self.closeSharedEventBuffers()
             try:
                 self.closeDataStoreFile()
             except:
@@ -886,10 +1454,29 @@ class ioServer(object):
 # ------------------ Main / Quickstart testing -------------------------
 
 
-def run(rootScriptPathDir,configFilePath):
+def sendReadyState(ready_state,ready_port=None):
+    """
+    Tells the process that started the ioHub Server whether the server
+    started (ready_state 'IOHUB_READY') or not ('IOHUB_FAILED'). The state
+    is sent to the localhost UDP ready_port the starting process gave, or is
+    written to stdout if no ready_port was given.
+    """
+    if ready_port is None:
+        sys.stdout.write("%s\n\r\n\r"%(ready_state))
+        sys.stdout.flush()
+        return
+    ready_socket=socket.socket(socket.AF_INET,socket.SOCK_DGRAM)
+    try:
+        ready_socket.sendto(ready_state,('127.0.0.1',ready_port))
+    finally:
+        ready_socket.close()
+
+def run(rootScriptPathDir,configFilePath,ready_port=None):
     import tempfile
     from iohub import IO_HUB_DIRECTORY
     from iohub.util import updateDict
+    run_start_time=currentSec()
+    startup_times=OrderedDict()
     tdir=tempfile.gettempdir()
     cdir,cfile=os.path.split(configFilePath)
 
@@ -899,16 +1486,16 @@ def run(rootScriptPathDir,configFilePath):
         tf.close()
         os.remove(configFilePath)
     else:
-        ioHubConfig=load(file(configFilePath,'r'), Loader=Loader)
+        ioHubConfig=getConfigCache().loadYamlFile(configFilePath)
 
  
 
-    hub_defaults_config=load(file(os.path.join(IO_HUB_DIRECTORY,'default_config.yaml'),'r'), Loader=Loader)
+    hub_defaults_config=getConfigCache().loadYamlFile(os.path.join(IO_HUB_DIRECTORY,'default_config.yaml'))
     updateDict(ioHubConfig,hub_defaults_config)
-
+    startup_times['config']=currentSec()-run_start_time
 
     try:
-        s = ioServer(rootScriptPathDir, ioHubConfig)
+        s = ioServer(rootScriptPathDir, ioHubConfig, startup_times)
     except Exception,e:
         printExceptionDetailsToStdErr()
         sys.stdout.flush()
@@ -917,10 +1504,16 @@ def run(rootScriptPathDir,configFilePath):
             s.shutdown()
         except:
             pass
-        
+
+        try:
+            sendReadyState("IOHUB_FAILED",ready_port)
+        except:
+            printExceptionDetailsToStdErr()
+
         return -1
     
     try:
+        phase_start_time=currentSec()
         s.log('Receiving datagrams on :9000')
         s.udpService.start()
 
@@ -928,9 +1521,10 @@ def run(rootScriptPathDir,configFilePath):
             m.start()
 
         gevent.spawn(s.processDeviceEvents,0.001)
+        s._addStartupTime('start_services',phase_start_time)
+        startup_times['total']=currentSec()-run_start_time
 
-        sys.stdout.write("IOHUB_READY\n\r\n\r")
-        sys.stdout.flush()
+        sendReadyState("IOHUB_READY",ready_port)
         
         gevent.run()
 
@@ -941,8 +1535,7 @@ def run(rootScriptPathDir,configFilePath):
         printExceptionDetailsToStdErr()
         print2err("------------------------------")
 
-        sys.stdout.write("IOHUB_FAILED\n\r\n\r")
-        sys.stdout.flush()
+        sendReadyState("IOHUB_FAILED",ready_port)
         
         try:
             s.shutdown()
@@ -960,6 +1553,9 @@ if __name__ == '__main__':
     if len(sys.argv)>=4:        
         configFileName=sys.argv[3]        
         #ioHub.print2err("ioServer initial_offset: ",initial_offset)
+    ready_port=None
+    if len(sys.argv)>=5:
+        ready_port=int(sys.argv[4])
     if len(sys.argv)<2:
         configFileName=None
         rootScriptPathDir=None
@@ -968,4 +1564,4 @@ if __name__ == '__main__':
     Computer.isIoHubProcess=True
     Computer.globalClock=MonotonicClock(initial_offset)        
 
-    run(rootScriptPathDir=rootScriptPathDir, configFilePath=configFileName)
+    run(rootScriptPathDir=rootScriptPathDir, configFilePath=configFileName, ready_port=ready_port)
@@ -2,15 +2,14 @@
 from __future__ import division
 import datetime
 import warnings
-import scipy, numpy
+import numpy
 import sys
 
 from exception_tools import ioHubConnectionException, ioHubServerError, printExceptionDetailsToStdErr, print2err, createErrorResult, ioHubError
 from ..timebase import MonotonicClock, monotonicClock
 getTime = monotonicClock.getTime
 
-from dialogs import ProgressBarDialog, MessageDialog, FileDialog, ioHubDialog
-
+from lazy_import import installLazyImportModule
  
 if sys.platform == 'win32':
     import pythoncom
@@ -63,11 +62,6 @@ if  sys.version_info[0] != 2 or sys.version_info[1] < 7:
 else:
     from collections import OrderedDict
 
-from variableProvider import ExperimentVariableProvider
-
-from visualUtil import FullScreenWindow, SinusoidalMotion
-from visualUtil import TimeTrigger,DeviceEventTrigger
-from visualUtil import ScreenState,ClearScreen,InstructionScreen,ImageScreen
 #
 ## Windows Message Pumping
 #
@@ -75,18 +69,18 @@ from visualUtil import ScreenState,ClearScreen,InstructionScreen,ImageScreen
 
 ###############################################################################
 #
-## Some commonly used math functions pulled from scipy as (I am told) they run
+## Some commonly used math functions pulled from numpy as (I am told) they run
 ## faster than the std python equiv's.
 #
 
-pi     = scipy.pi
-dot    = scipy.dot
-sin    = scipy.sin
-cos    = scipy.cos
-ar     = scipy.array
-rand   = scipy.rand
-arange = scipy.arange
-rad    = scipy.deg2rad
+pi     = numpy.pi
+dot    = numpy.dot
+sin    = numpy.sin
+cos    = numpy.cos
+ar     = numpy.array
+rand   = numpy.random.rand
+arange = numpy.arange
+rad    = numpy.deg2rad
 
 ###############################################################################
 #
@@ -167,6 +161,37 @@ class NumPyRingBuffer(object):
         self._npa[(i%self.max_size)+self.max_size]=element
         self._index+=1
 
+    def extend(self, elements):
+        """
+        Add each element of the elements array to the end of the RingBuffer,
+        as if append() was called for each element, using at most two slice
+        assignments to each half of the backing array.
+        
+        :param numpy.array elements: The elements to add to the RingBuffer.
+        :returns None:
+        """
+        element_count=len(elements)
+        elements=elements[-self.max_size:]
+        n=len(elements)
+        i=(self._index+element_count-n)%self.max_size
+        first=min(n,self.max_size-i)
+        self._npa[i:i+first]=elements[:first]
+        self._npa[i+self.max_size:i+self.max_size+first]=elements[:first]
+        if first < n:
+            self._npa[:n-first]=elements[first:]
+            self._npa[self.max_size:self.max_size+n-first]=elements[first:]
+        self._index+=element_count
+
+    def getLength(self):
+        """
+        Return the number of elements in the RingBuffer, which is the number
+        of elements added to the buffer, up to max_size.
+        
+        :param None:
+        :returns int: The number of elements in the RingBuffer.
+        """
+        return min(self._index,self.max_size)
+
     def getElements(self):
         """
         Return the numpy array being used by the RingBuffer, the length of 
@@ -268,14 +293,11 @@ def rotate2D(pts,origin,ang=pi/4):
 #
 ## Import utils sub modules
 #    
+## The visualUtil (psychopy.visual) and dialogs (wx) classes are imported
+## the first time they are accessed; see the end of this module.
 
 from variableProvider import ExperimentVariableProvider
 
-from visualUtil import FullScreenWindow, SinusoidalMotion
-from visualUtil import TimeTrigger,DeviceEventTrigger
-from visualUtil import ScreenState,ClearScreen,InstructionScreen,ImageScreen
-from dialogs import ProgressBarDialog, MessageDialog, FileDialog, ioHubDialog
-
 
 
 ###############################################################################
@@ -310,6 +332,22 @@ except:
     validate_version=lambda version: version
 
 
+###############################################################################
+#
+## Lazily imported utils sub module classes
+#
+
+_LAZY_ATTRIBUTES=dict()
+for _name in ('FullScreenWindow','SinusoidalMotion','TimeTrigger','DeviceEventTrigger',
+              'ScreenState','ClearScreen','InstructionScreen','ImageScreen'):
+    _LAZY_ATTRIBUTES[_name]='iohub.util.visualUtil'
+for _name in ('ProgressBarDialog','MessageDialog','FileDialog','ioHubDialog'):
+    _LAZY_ATTRIBUTES[_name]='iohub.util.dialogs'
+
+if __name__ != '__main__':
+    installLazyImportModule(__name__,_LAZY_ATTRIBUTES)
+
+
 
 ###############################################################################
 #
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+ioHub
+.. file: ioHub/util/lazy_import.py
+
+Copyright (C) 2012-2013 iSolver Software Solutions
+Distributed under the terms of the GNU General Public License (GPL version 3 or any later version).
+
+.. fileauthor:: Sol Simpson <sol@isolver-software.com>
+"""
+import sys
+import types
+import importlib
+
+class LazyImportModule(types.ModuleType):
+    """
+    Stands in for a package module in sys.modules, importing some of the
+    package's attributes from their modules the first time they are accessed,
+    so importing the package does not import them. Used by the iohub and
+    iohub.util packages, so importing them does not also import the ioHub
+    client, psychopy.visual, or wx.
+
+    lazy_attributes maps each lazily imported attribute name to the name of
+    the module it is imported from. An attribute with the same name as the
+    last part of its module name is the module itself (i.e. 'client' ->
+    'iohub.client').
+
+    Use installLazyImportModule() at the end of the package __init__ to
+    create one.
+    """
+    def __init__(self,module,lazy_attributes):
+        types.ModuleType.__init__(self,module.__name__,module.__doc__)
+        self.__dict__.update(module.__dict__)
+        # The functions of the package keep using the globals of the
+        # original module, so it is kept alive and given each attribute that
+        # is imported.
+        self.__dict__['_lazy_import_module']=module
+        self.__dict__['_lazy_attributes']=dict(lazy_attributes)
+
+    def __getattr__(self,name):
+        module_name=self._lazy_attributes.get(name)
+        if module_name is None:
+            raise AttributeError("'module' object has no attribute '%s'"%(name))
+        module=importlib.import_module(module_name)
+        if module_name.rsplit('.',1)[-1] == name:
+            value=module
+        else:
+            value=getattr(module,name)
+        setattr(self,name,value)
+        setattr(self._lazy_import_module,name,value)
+        return value
+
+    def __dir__(self):
+        return sorted(set(self.__dict__.keys())|set(self._lazy_attributes.keys()))
+
+def installLazyImportModule(module_name,lazy_attributes):
+    """
+    Replaces the module_name module in sys.modules with a LazyImportModule
+    for lazy_attributes, and returns it. Must be called at the end of the
+    module's own code.
+    """
+    lazy_module=LazyImportModule(sys.modules[module_name],lazy_attributes)
+    sys.modules[module_name]=lazy_module
+    return lazy_module
@@ -144,6 +144,7 @@ class ScreenState(object):
             #. If 1 - N DeviceEventTriggers have been set with the ScreenState, they are monitored to determine if any have triggered. 
                If a DeviceEventTrigger has triggered, the triggering event and the triggers callback function are retrieved. 
                The deviceEventTrigger is then reset, and the callback is called.
+               DeviceEventTriggers are evaluated by the ioHub Server as events are received, so checking them does not send any requests to the ioHub Server.
             
         If a callback returns True, the ScreenState is exited, returning (stateStartTime, stateDuration, exitTriggeringEvent), where:
 
@@ -169,6 +170,9 @@ class ScreenState(object):
         self._start_time=self.flip(text=msg)
         endTime=self._start_time+self.timeout
         localClearEvents('all')
+        if clearEvents is not False:
+            for trigger in event_triggers:
+                trigger.discardTriggeredEvents(self._start_time)
 
         if event_triggers and len(event_triggers)>0:
             while currentSec()+0.002<endTime:
@@ -369,6 +373,14 @@ class Trigger(object):
         self.resetLastTriggeredInfo()
         self.triggerred_count=0
 
+    def discardTriggeredEvents(self,before_time=None):
+        """
+        Discards any events that have fired the trigger but not been returned
+        by triggered() yet; only events with a time before before_time are 
+        discarded if it is given.
+        """
+        pass
+
     @classmethod
     def clearEventHistory(cls):
         pass
@@ -381,9 +393,17 @@ class DeviceEventTrigger(Trigger):
     DeviceEventTrigger are used by SCreenState objects. A DeviceEventTrigger
     associates a set of conditions for a DeviceEvent that must be met before
     the classes triggered() method returns True. 
+
+    The event type and attribute conditions are registered with the ioHub 
+    Server as an event trigger the first time the trigger is reset or checked.
+    The ioHub Server checks the device's events against the conditions as 
+    they are received, and notifies the PsychoPy Process of each matching
+    event, so triggered() does not send any requests to the ioHub Server.
+    Registering the trigger does not remove any events from the device or
+    global event buffers.
     """
-    _lastEventsByDevice=dict()
-    __slots__=['device','event_type','event_attribute_conditions']
+    __slots__=['device','event_type','event_attribute_conditions','_query',
+               '_trigger_id','_triggered_events','_last_fired_time']
     def __init__(self, device, event_type, event_attribute_conditions={}, repeat_count=-1,
                      trigger_function = lambda a,b,c: True==True, user_kwargs={} ):
         Trigger.__init__(self,trigger_function,user_kwargs,repeat_count)
@@ -391,62 +411,70 @@ class DeviceEventTrigger(Trigger):
         self.device=device
         self.event_type=event_type
         self.event_attribute_conditions=event_attribute_conditions
+        self._query=dict(event_types=[event_type,],attributes=dict(event_attribute_conditions))
+        self._trigger_id=None
+        self._triggered_events=[]
+        self._last_fired_time=None
 
     def triggered(self):
         if Trigger.triggered(self) is False:
             return False
-            
-        events=self.device.getEvents()
 
-        if events is None:
-            events=[]
-        newEventCount=len(events)
+        if self._trigger_id is None:
+            self.register()
 
-        unhandledEvents=[]
+        triggered_events=self._triggered_events
+        if not triggered_events:
+            triggered_events.extend(self.device.hubClient.getTriggeredEvents(self._trigger_id))
+            if not triggered_events:
+                return False
 
-        if newEventCount > 0:
-            if self.device in self._lastEventsByDevice:
-                self._lastEventsByDevice[self.device].extend(events)
-            else:
-                self._lastEventsByDevice[self.device]=events
-            unhandledEvents=self._lastEventsByDevice[self.device]
-
-        elif self.device in self._lastEventsByDevice:
-            unhandledEvents=self._lastEventsByDevice[self.device]
-
-
-        for event in unhandledEvents:
-            foundEvent=True
+        self._last_triggered_event,self._last_fired_time=triggered_events.pop(0)
+        self.triggerred_count+=1
+        return True
 
-            if event.type != self.event_type:
-                foundEvent=False
-            else:
-                for attrib_name,the_conditions in self.event_attribute_conditions.iteritems():
-                    if isinstance(the_conditions,(list,tuple)) and getattr(event,attrib_name) in the_conditions:
-                        # event_value is a list or tuple of possible values that are OK
-                        pass
-                    elif getattr(event,attrib_name) is the_conditions or getattr(event,attrib_name) == the_conditions:
-                        # event_value is a single value
-                        pass
-                    else:
-                        foundEvent=False
-                        
-            if foundEvent is True:
-                self._last_triggered_event=event
-                self.triggerred_count+=1
-                return True
+    def register(self):
+        """
+        Registers the trigger with the ioHub Server, if it is not already
+        registered. Returns the trigger id.
+        """
+        if self._trigger_id is None:
+            self._trigger_id=self.device.hubClient.registerEventTrigger(self.device.name,self._query)
+        return self._trigger_id
 
-        return False
+    def unregister(self):
+        """
+        Removes the trigger from the ioHub Server. The trigger is registered
+        again if it is used after being unregistered.
+        """
+        if self._trigger_id is not None:
+            self.device.hubClient.unregisterEventTrigger(self._trigger_id)
+            self._trigger_id=None
+        self._triggered_events=[]
 
-    @classmethod
-    def clearEventHistory(cls):
-        cls._lastEventsByDevice.clear()
+    def getTriggeredTime(self):
+        """
+        Returns the ioHub time the ioHub Server found that the triggering
+        event matched the trigger conditions, or None.
+        """
+        return self._last_fired_time
+
+    def discardTriggeredEvents(self,before_time=None):
+        if self._trigger_id is None:
+            return
+        self._triggered_events.extend(self.device.hubClient.getTriggeredEvents(self._trigger_id))
+        if before_time is None:
+            self._triggered_events=[]
+        else:
+            self._triggered_events=[(e,t) for e,t in self._triggered_events if e.time >= before_time]
 
     def resetLastTriggeredInfo(self):
         Trigger.resetLastTriggeredInfo(self)
-        if self.device in self._lastEventsByDevice:
-            self._lastEventsByDevice[self.device]=None
-            del self._lastEventsByDevice[self.device]
+        self._last_fired_time=None
+
+    def resetTrigger(self):
+        Trigger.resetTrigger(self)
+        self.register()
 
 
    